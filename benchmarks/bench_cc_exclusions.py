@@ -0,0 +1,78 @@
+"""
+Benchmark: indexed CC exclusion checks vs the linear prefix scan, on high-SDx cases
+
+Usage:
+    python benchmarks/bench_cc_exclusions.py [--cases 2000] [--sdx 25]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from bench_group_many import DEFAULT_PATH  # noqa: E402
+
+from thai_drg_grouper import ThaiDRGGrouper  # noqa: E402
+
+
+def linear_scan(grouper: ThaiDRGGrouper):
+    """The pre-index exclusion check: scan every exclusion code of the CC"""
+
+    def is_excluded(maincc: str, pdx_norm: str) -> bool:
+        for excl in grouper._cc_exclusions.get(maincc, ()):
+            if pdx_norm.startswith(excl) or excl.startswith(pdx_norm[:3]):
+                return True
+        return False
+
+    return is_excluded
+
+
+def make_cases(grouper: ThaiDRGGrouper, n: int, sdx_count: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    cc_codes = sorted(c for c, info in grouper._icd10_data.items() if info["cc"])
+    codes = sorted(grouper._icd10_data)
+    return [
+        dict(
+            pdx=rng.choice(codes),
+            sdx=rng.sample(cc_codes, sdx_count),
+            age=rng.randint(18, 90),
+            sex=rng.choice("MF"),
+            los=rng.randint(1, 20),
+        )
+        for _ in range(n)
+    ]
+
+
+def run(grouper: ThaiDRGGrouper, cases: list) -> float:
+    start = time.perf_counter()
+    for case in cases:
+        grouper.group(**case)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", type=int, default=2000)
+    parser.add_argument("--sdx", type=int, default=25, help="Secondary diagnoses per case")
+    parser.add_argument("--version-path", default=DEFAULT_PATH)
+    args = parser.parse_args()
+
+    for backend in ThaiDRGGrouper.BACKENDS:
+        grouper = ThaiDRGGrouper(args.version_path, "bench", backend=backend)
+        cases = make_cases(grouper, args.cases, args.sdx)
+        indexed = run(grouper, cases)
+        grouper._is_excluded = linear_scan(grouper)
+        scanned = run(grouper, cases)
+
+        print(f"[{backend}] {args.cases} cases x {args.sdx} SDx")
+        print(f"  linear scan: {scanned / args.cases * 1e6:10.1f} us/case")
+        print(f"  indexed:     {indexed / args.cases * 1e6:10.1f} us/case")
+        print(f"  speedup:     {scanned / indexed:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
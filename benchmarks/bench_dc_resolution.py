@@ -0,0 +1,73 @@
+"""
+Benchmark: precomputed DC/DRG resolution vs the per-case search and sort
+
+Usage:
+    python benchmarks/bench_dc_resolution.py [--cases 20000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from bench_group_many import DEFAULT_PATH  # noqa: E402
+
+from thai_drg_grouper import ThaiDRGGrouper  # noqa: E402
+from thai_drg_grouper.grouper import _UNGROUPABLE_DRG  # noqa: E402
+
+
+def searched(grouper: ThaiDRGGrouper):
+    """The pre-table resolution: search the DCs and sort the DRG list on every call"""
+
+    def resolve_dc(pdx_info, has_or):
+        if not pdx_info:
+            return "2650"
+        return grouper._search_dc(pdx_info["mdc"], pdx_info["pdc"], has_or)
+
+    def find_drg(dc, pcl):
+        if dc not in grouper._drg_data:
+            return dict(_UNGROUPABLE_DRG)
+        drgs = sorted(grouper._drg_data[dc], key=lambda x: x["drg"])
+        return drgs[min(pcl, len(drgs) - 1)]
+
+    return resolve_dc, find_drg
+
+
+def make_cases(grouper: ThaiDRGGrouper, n: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    infos = list(grouper._icd10_data.values())
+    return [(rng.choice(infos), rng.random() < 0.3, rng.randint(0, 4)) for _ in range(n)]
+
+
+def run(resolve_dc, find_drg, cases: list) -> float:
+    start = time.perf_counter()
+    for info, has_or, pcl in cases:
+        find_drg(resolve_dc(info, has_or), pcl)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", type=int, default=20000)
+    parser.add_argument("--version-path", default=DEFAULT_PATH)
+    args = parser.parse_args()
+
+    for backend in ThaiDRGGrouper.BACKENDS:
+        grouper = ThaiDRGGrouper(args.version_path, "bench", backend=backend)
+        cases = make_cases(grouper, args.cases)
+        run(grouper._resolve_dc, grouper._find_drg, cases)  # warm the DC table
+        precomputed = run(grouper._resolve_dc, grouper._find_drg, cases)
+        search = run(*searched(grouper), cases)
+
+        print(f"[{backend}] {args.cases} DC/DRG resolutions")
+        print(f"  search + sort: {search / args.cases * 1e6:8.2f} us/case")
+        print(f"  precomputed:   {precomputed / args.cases * 1e6:8.2f} us/case")
+        print(f"  speedup:       {search / precomputed:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark: ThaiDRGGrouper.group_many vs a per-case group() loop
+
+Usage:
+    python benchmarks/bench_group_many.py [--cases 100000] [--version-path data/versions/6.3/data]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from thai_drg_grouper import ThaiDRGGrouper  # noqa: E402
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "versions", "6.3", "data")
+
+
+def make_cases(grouper: ThaiDRGGrouper, n: int, seed: int = 42) -> dict:
+    """Synthetic columnar cases drawn from a small pool of common codes"""
+    rng = random.Random(seed)
+    codes = sorted(grouper._icd10_data)
+    procs = sorted(grouper._proc_data)
+    common_dx = rng.sample(codes, 300)
+    common_proc = rng.sample(procs, 100)
+    return {
+        "pdx": [rng.choice(common_dx) for _ in range(n)],
+        "sdx": [rng.sample(common_dx, rng.randint(0, 6)) for _ in range(n)],
+        "procedures": [rng.sample(common_proc, rng.randint(0, 2)) for _ in range(n)],
+        "age": [rng.randint(0, 90) for _ in range(n)],
+        "sex": [rng.choice("MF") for _ in range(n)],
+        "los": [rng.randint(0, 30) for _ in range(n)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", type=int, default=100_000)
+    parser.add_argument("--version-path", default=DEFAULT_PATH)
+    args = parser.parse_args()
+
+    grouper = ThaiDRGGrouper(args.version_path, "bench")
+    cases = make_cases(grouper, args.cases)
+    rows = [dict(zip(cases, values)) for values in zip(*cases.values())]
+
+    start = time.perf_counter()
+    for row in rows:
+        grouper.group(**row)
+    loop = time.perf_counter() - start
+
+    start = time.perf_counter()
+    grouper.group_many(cases)
+    batch = time.perf_counter() - start
+
+    print(f"cases:        {args.cases}")
+    print(f"group() loop: {args.cases / loop:12,.0f} cases/sec ({loop:.2f}s)")
+    print(f"group_many(): {args.cases / batch:12,.0f} cases/sec ({batch:.2f}s)")
+    print(f"speedup:      {loop / batch:12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark: code normalization work per group() call, and the fast-path
+normalizer vs the replace/replace/upper/strip chain and str.translate
+
+Counts how many codes group() normalizes per case (wrapping the grouper's
+normalizers, so it runs against any version of the package) and the string
+objects each normalizer allocates per code.
+
+Usage:
+    python benchmarks/bench_normalization.py [--cases 20000] [--cache-size 0]
+"""
+
+import argparse
+import os
+import string
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from bench_group_many import DEFAULT_PATH  # noqa: E402
+from synthetic import CaseGenerator  # noqa: E402
+
+from thai_drg_grouper import ThaiDRGGrouper  # noqa: E402
+from thai_drg_grouper.grouper import normalize_icd  # noqa: E402
+
+_TRANSLATION = str.maketrans(string.ascii_lowercase, string.ascii_uppercase, ". ")
+
+
+def chain_steps(code: str) -> list:
+    """The replace/upper/strip chain, step by step"""
+    steps = [code]
+    for step in (
+        lambda s: s.replace(".", ""),
+        lambda s: s.replace(" ", ""),
+        str.upper,
+        str.strip,
+    ):
+        steps.append(step(steps[-1]))
+    return steps
+
+
+def translate_steps(code: str) -> list:
+    """A single str.translate pass, finished by upper/strip for unusual codes"""
+    steps = [code, code.translate(_TRANSLATION)]
+    if not (steps[-1].isascii() and steps[-1].isalnum()):
+        steps.append(steps[-1].upper())
+        steps.append(steps[-1].strip())
+    return steps
+
+
+def fast_path_steps(code: str) -> list:
+    """normalize_icd: already normalized codes pass through, others take the chain"""
+    return [code, code] if normalize_icd(code) is code else chain_steps(code)
+
+
+def translate(code: str) -> str:
+    return translate_steps(code)[-1]
+
+
+def chain(code: str) -> str:
+    return code.replace(".", "").replace(" ", "").upper().strip()
+
+
+def allocations(steps: list) -> int:
+    """New string objects created along a chain of steps"""
+    return sum(b is not a for a, b in zip(steps, steps[1:]))
+
+
+def count_normalizations(grouper: ThaiDRGGrouper) -> dict:
+    """Wrap the grouper's normalizers with call counters"""
+    counts = {"icd": 0, "proc": 0}
+    for kind in counts:
+        normalize = getattr(grouper, f"_normalize_{kind}")
+
+        def counted(code, normalize=normalize, kind=kind):
+            counts[kind] += 1
+            return normalize(code)
+
+        setattr(grouper, f"_normalize_{kind}", counted)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", type=int, default=20000)
+    parser.add_argument("--cache-size", type=int, default=0)
+    parser.add_argument("--version-path", default=DEFAULT_PATH)
+    args = parser.parse_args()
+
+    grouper = ThaiDRGGrouper(args.version_path, "bench", cache_size=args.cache_size)
+    cases = CaseGenerator(grouper, seed=4).mixed(args.cases)
+    codes = [c for case in cases for c in [case["pdx"], *case["sdx"]]]
+    codes += [c.lower() for c in codes[:1000]] + [f" {c[:3]}.{c[3:]} " for c in codes[:1000]]
+    input_codes = sum(1 + len(case["sdx"]) + len(case.get("procedures", [])) for case in cases)
+
+    start = time.perf_counter()
+    for case in cases:
+        grouper.group(**case)
+    elapsed = time.perf_counter() - start
+
+    counts = count_normalizations(grouper)
+    for case in cases:
+        grouper.group(**case)
+    calls = counts["icd"] + counts["proc"]
+
+    print(f"{args.cases} synthetic cases, result cache size {args.cache_size}")
+    print(f"  group()                   {elapsed / args.cases * 1e6:8.2f} us/case")
+    print(f"  codes in the input        {input_codes / args.cases:8.2f} /case")
+    print(f"  normalizer calls          {calls / args.cases:8.2f} /case")
+    print(f"{len(codes)} codes (plain, lower-case and dotted with spaces)")
+    for name, steps, fn in (
+        ("replace chain", chain_steps, chain),
+        ("str.translate", translate_steps, translate),
+        ("fast path", fast_path_steps, normalize_icd),
+    ):
+        per_code = sum(allocations(steps(c)) for c in codes) / len(codes)
+        seconds = min(timeit.repeat(lambda: list(map(fn, codes)), number=5, repeat=3)) / 5
+        print(
+            f"  {name:14s} {seconds / len(codes) * 1e9:8.0f} ns/code"
+            f" {per_code:6.2f} str/code {per_code * calls / args.cases:8.2f} str/case"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Benchmark: ParallelGrouper throughput by worker count
+
+Usage:
+    python benchmarks/bench_parallel.py [--cases 200000] [--workers 1,2,4,8]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from bench_group_many import DEFAULT_PATH, make_cases  # noqa: E402
+
+from thai_drg_grouper import ThaiDRGGrouper  # noqa: E402
+from thai_drg_grouper.parallel import ParallelGrouper  # noqa: E402
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", type=int, default=200_000)
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument(
+        "--workers",
+        default=",".join(str(w) for w in (1, 2, 4, 8, 16, 32) if w <= cpus),
+        help="Comma-separated worker counts",
+    )
+    parser.add_argument("--version-path", default=DEFAULT_PATH)
+    args = parser.parse_args()
+
+    cases = make_cases(ThaiDRGGrouper(args.version_path, "bench"), args.cases)
+    rows = [dict(zip(cases, values)) for values in zip(*cases.values())]
+
+    print(f"cases: {args.cases}, chunk size: {args.chunk_size}, cpus: {cpus}")
+    baseline = None
+    for workers in (int(w) for w in args.workers.split(",")):
+        with ParallelGrouper(
+            args.version_path, "bench", workers=workers, chunk_size=args.chunk_size
+        ) as engine:
+            start = time.perf_counter()
+            for _ in engine.imap_columns(rows):
+                pass
+            elapsed = time.perf_counter() - start
+        rate = args.cases / elapsed
+        baseline = baseline or rate
+        print(f"workers={workers:<3} {rate:12,.0f} cases/sec  scaling {rate / baseline:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
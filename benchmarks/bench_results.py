@@ -0,0 +1,77 @@
+"""
+Benchmark: slotted GrouperResult memory and serialization vs a plain dataclass with asdict()
+
+Usage:
+    python benchmarks/bench_results.py [--results 100000]
+"""
+
+import argparse
+import dataclasses
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from bench_group_many import DEFAULT_PATH, make_cases  # noqa: E402
+
+from thai_drg_grouper import GrouperResult, ThaiDRGGrouper  # noqa: E402
+from thai_drg_grouper.types import RESULT_FIELDS  # noqa: E402
+
+# The pre-slots GrouperResult: same fields, per-instance __dict__, asdict() serialization
+PlainResult = dataclasses.make_dataclass(
+    "PlainResult",
+    [(f.name, f.type, f) for f in dataclasses.fields(GrouperResult)],
+)
+
+
+def build(cls, rows: list) -> float:
+    """Bytes allocated per result when building len(rows) instances"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    results = [cls(*row) for row in rows]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del results
+    return used / len(rows)
+
+
+def throughput(fn, results: list) -> float:
+    start = time.perf_counter()
+    for result in results:
+        fn(result)
+    return len(results) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--results", type=int, default=100000)
+    parser.add_argument("--version-path", default=DEFAULT_PATH)
+    args = parser.parse_args()
+
+    grouper = ThaiDRGGrouper(args.version_path, "bench")
+    out = grouper.group_many(make_cases(grouper, min(args.results, 10000)))
+    rows = list(zip(*(out[name] for name in RESULT_FIELDS)))
+    rows = (rows * (args.results // len(rows) + 1))[: args.results]
+
+    print(f"{args.results} results")
+    print(f"  memory/result   plain: {build(PlainResult, rows):8.0f} B")
+    print(f"  memory/result slotted: {build(GrouperResult, rows):8.0f} B")
+
+    plain = [PlainResult(*row) for row in rows]
+    slotted = [GrouperResult(*row) for row in rows]
+    for label, fn, items in (
+        ("asdict()          ", dataclasses.asdict, plain),
+        ("to_dict()         ", GrouperResult.to_dict, slotted),
+        ("json(asdict())    ", lambda r: json.dumps(dataclasses.asdict(r), indent=2), plain),
+        ("to_json()         ", GrouperResult.to_json, slotted),
+        ("to_json(indent=None)", lambda r: r.to_json(indent=None), slotted),
+    ):
+        print(f"  {label:20s} {throughput(fn, items):10.0f} results/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Benchmark suite: load time, latency, throughput, memory and API requests
+
+Writes one JSON document of metrics, each with a value, a unit and which
+direction is better, so runs can be compared against a stored baseline.
+
+Usage:
+    python benchmarks/suite.py [--quick] [--only load,latency] [-o baseline.json]
+    python benchmarks/suite.py --compare baseline.json [--threshold 0.25]
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from synthetic import PROFILES, CaseGenerator, to_columns  # noqa: E402
+
+import thai_drg_grouper  # noqa: E402
+from thai_drg_grouper import ThaiDRGGrouper, ThaiDRGGrouperManager  # noqa: E402
+from thai_drg_grouper.parallel import ParallelGrouper  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+VERSIONS_PATH = os.path.join(ROOT, "data", "versions")
+DEFAULT_VERSION = "6.3"
+
+GROUPS = ("load", "latency", "throughput", "memory", "api")
+
+# name -> scale for --quick runs
+SIZES = {
+    "load_repeats": (5, 2),
+    "latency_cases": (2000, 200),
+    "throughput_cases": (50000, 5000),
+    "api_requests": (1000, 100),
+}
+
+
+def metric(value: float, unit: str, better: str) -> dict:
+    return {"value": round(value, 6), "unit": unit, "better": better}
+
+
+def percentiles(samples: list, unit_scale: float, unit: str, prefix: str) -> dict:
+    samples = sorted(samples)
+
+    def pct(p: float) -> float:
+        return samples[min(len(samples) - 1, int(p * len(samples)))] * unit_scale
+
+    return {
+        f"{prefix}.p50": metric(pct(0.50), unit, "lower"),
+        f"{prefix}.p90": metric(pct(0.90), unit, "lower"),
+        f"{prefix}.p99": metric(pct(0.99), unit, "lower"),
+        f"{prefix}.mean": metric(statistics.fmean(samples) * unit_scale, unit, "lower"),
+    }
+
+
+def bench_load(dbf_path: str, repeats: int) -> dict:
+    """Cold load of one version per backend and source"""
+    ThaiDRGGrouper(dbf_path, DEFAULT_VERSION)  # make sure the snapshot exists
+    variants = {
+        "snapshot": dict(backend="memory"),
+        "dbf": dict(backend="memory", use_snapshot=False),
+        "mmap": dict(backend="mmap"),
+    }
+    results = {}
+    for name, kwargs in variants.items():
+        times = []
+        for _ in range(repeats):
+            gc.collect()
+            start = time.perf_counter()
+            ThaiDRGGrouper(dbf_path, DEFAULT_VERSION, **kwargs)
+            times.append(time.perf_counter() - start)
+        results[f"load.{name}.median"] = metric(statistics.median(times), "s", "lower")
+        results[f"load.{name}.min"] = metric(min(times), "s", "lower")
+    return results
+
+
+def bench_latency(grouper: ThaiDRGGrouper, n: int) -> dict:
+    """Per-case group() latency distribution for each case profile"""
+    generator = CaseGenerator(grouper, seed=1)
+    results = {}
+    for profile in PROFILES:
+        cases = generator.cases(profile, n)
+        for case in cases[:50]:
+            grouper.group(**case)  # warm up
+        samples = []
+        clock = time.perf_counter_ns
+        for case in cases:
+            start = clock()
+            grouper.group(**case)
+            samples.append(clock() - start)
+        results.update(percentiles(samples, 1e-3, "us", f"latency.{profile}"))
+    return results
+
+
+def bench_throughput(grouper: ThaiDRGGrouper, dbf_path: str, n: int) -> dict:
+    """Cases per second through group(), group_many() and ParallelGrouper"""
+    cases = CaseGenerator(grouper, seed=2).mixed(n)
+    columns = to_columns(cases)
+    results = {}
+
+    start = time.perf_counter()
+    for case in cases:
+        grouper.group(**case)
+    results["throughput.group"] = metric(n / (time.perf_counter() - start), "cases/s", "higher")
+
+    start = time.perf_counter()
+    grouper.group_many(columns)
+    elapsed = time.perf_counter() - start
+    results["throughput.group_many"] = metric(n / elapsed, "cases/s", "higher")
+
+    workers = os.cpu_count() or 1
+    with ParallelGrouper(dbf_path, DEFAULT_VERSION, workers=workers, chunk_size=2000) as engine:
+        engine.group(cases[:workers])  # start the pool outside the timing
+        start = time.perf_counter()
+        for _ in engine.imap_columns(cases):
+            pass
+        elapsed = time.perf_counter() - start
+    results["throughput.parallel"] = metric(n / elapsed, "cases/s", "higher")
+    return results
+
+
+def bench_memory(dbf_path: str) -> dict:
+    """Table memory per loaded version and allocation peak while loading"""
+    results = {}
+    for backend in ThaiDRGGrouper.BACKENDS:
+        gc.collect()
+        tracemalloc.start()
+        grouper = ThaiDRGGrouper(dbf_path, DEFAULT_VERSION, backend=backend)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        usage = grouper.memory_usage()
+        results[f"memory.{backend}.heap"] = metric(usage["heap"] / 2**20, "MiB", "lower")
+        results[f"memory.{backend}.mapped"] = metric(usage["mapped"] / 2**20, "MiB", "lower")
+        results[f"memory.{backend}.load_peak"] = metric(peak / 2**20, "MiB", "lower")
+    return results
+
+
+def bench_api(grouper: ThaiDRGGrouper, n: int) -> dict:
+    """In-process API request throughput and latency (needs fastapi and httpx)"""
+    try:
+        from fastapi.testclient import TestClient
+
+        from thai_drg_grouper.api import create_api
+    except ImportError as e:
+        return {"api.skipped": str(e)}
+
+    cases = CaseGenerator(grouper, seed=3).mixed(n)
+    manager = ThaiDRGGrouperManager(VERSIONS_PATH)
+    results = {}
+    with TestClient(create_api(manager, preload=[DEFAULT_VERSION])) as client:
+        client.post(f"/group/{DEFAULT_VERSION}", json=cases[0])  # load and warm up
+        samples = []
+        start = time.perf_counter()
+        for case in cases:
+            t = time.perf_counter()
+            client.post(f"/group/{DEFAULT_VERSION}", json=case)
+            samples.append(time.perf_counter() - t)
+        elapsed = time.perf_counter() - start
+        results["api.group.throughput"] = metric(n / elapsed, "req/s", "higher")
+        results.update(percentiles(samples, 1e3, "ms", "api.group"))
+
+        batch = {"cases": cases[:100]}
+        rounds = max(1, n // 100)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            client.post(f"/group/batch?version={DEFAULT_VERSION}", json=batch)
+        elapsed = time.perf_counter() - start
+        results["api.batch.throughput"] = metric(rounds * 100 / elapsed, "cases/s", "higher")
+    return results
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "package_version": thai_drg_grouper.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def run(groups, quick: bool) -> dict:
+    sizes = {name: sizes[1] if quick else sizes[0] for name, sizes in SIZES.items()}
+    dbf_path = ThaiDRGGrouperManager(VERSIONS_PATH).get_version_info(DEFAULT_VERSION).dbf_path
+    grouper = ThaiDRGGrouper(dbf_path, DEFAULT_VERSION)
+
+    metrics = {}
+    for group in groups:
+        print(f"running {group}...", file=sys.stderr)
+        if group == "load":
+            metrics.update(bench_load(dbf_path, sizes["load_repeats"]))
+        elif group == "latency":
+            metrics.update(bench_latency(grouper, sizes["latency_cases"]))
+        elif group == "throughput":
+            metrics.update(bench_throughput(grouper, dbf_path, sizes["throughput_cases"]))
+        elif group == "memory":
+            metrics.update(bench_memory(dbf_path))
+        elif group == "api":
+            metrics.update(bench_api(grouper, sizes["api_requests"]))
+    return {"environment": environment(), "sizes": sizes, "metrics": metrics}
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """
+    Metrics that got worse than the baseline by more than ``threshold``
+
+    Returns rows of (name, baseline value, current value, relative change,
+    regressed), where a positive change is always an improvement.
+    """
+    rows = []
+    for name, base in sorted(baseline["metrics"].items()):
+        now = current["metrics"].get(name)
+        if not isinstance(base, dict) or not isinstance(now, dict) or not base["value"]:
+            continue
+        change = (now["value"] - base["value"]) / base["value"]
+        if base["better"] == "lower":
+            change = -change
+        rows.append((name, base["value"], now["value"], change, change < -threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", help=f"Comma-separated groups (default: all of {GROUPS})")
+    parser.add_argument("--quick", action="store_true", help="Small sizes for a smoke run")
+    parser.add_argument("--output", "-o", help="Write the JSON results to a file")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    groups = args.only.split(",") if args.only else list(GROUPS)
+    unknown = [g for g in groups if g not in GROUPS]
+    if unknown:
+        parser.error(f"unknown groups {unknown}, available: {list(GROUPS)}")
+
+    results = run(groups, args.quick)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    elif not args.compare:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("sizes") != results["sizes"]:
+            print("warning: baseline was run with different sizes", file=sys.stderr)
+        rows = compare(results, baseline, args.threshold)
+        for name, base, now, change, regressed in rows:
+            flag = "REGRESSION" if regressed else ""
+            print(f"{name:32s} {base:14.3f} -> {now:14.3f}  {change:+7.1%}  {flag}")
+        regressions = sum(row[4] for row in rows)
+        print(f"{len(rows)} metrics compared, {regressions} regressed beyond {args.threshold:.0%}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
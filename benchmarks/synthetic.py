@@ -0,0 +1,72 @@
+"""
+Synthetic case generator for benchmarks, drawn from a version's own tables
+
+Profiles:
+    simple       valid PDx, up to 2 SDx, no procedures
+    high_sdx     valid PDx with 20-30 SDx, most of them CC codes
+    surgical     valid PDx with 1-3 OR procedures
+    invalid_pdx  PDx codes that are not in the ICD-10 table
+"""
+
+import random
+from typing import Dict, List
+
+from thai_drg_grouper import ThaiDRGGrouper
+
+PROFILES = ("simple", "high_sdx", "surgical", "invalid_pdx")
+
+
+class CaseGenerator:
+    """
+    Reproducible synthetic cases for one loaded grouper
+
+    Args:
+        grouper: Grouper whose ICD-10 and procedure tables the codes come from
+        seed: Random seed; the same seed gives the same cases
+    """
+
+    def __init__(self, grouper: ThaiDRGGrouper, seed: int = 42):
+        self.rng = random.Random(seed)
+        icd10 = grouper._icd10_data
+        self.dx = sorted(code for code in icd10 if icd10[code]["mdc"] != "26")
+        self.cc = sorted(code for code in self.dx if icd10[code]["cc"])
+        self.or_procs = sorted(code for code, info in grouper._proc_data.items() if info["orp"])
+        self.procs = sorted(grouper._proc_data)
+
+    def _demographics(self) -> dict:
+        rng = self.rng
+        return {"age": rng.randint(0, 90), "sex": rng.choice("MF"), "los": rng.randint(0, 30)}
+
+    def case(self, profile: str) -> dict:
+        rng = self.rng
+        if profile == "simple":
+            case = {"pdx": rng.choice(self.dx), "sdx": rng.sample(self.dx, rng.randint(0, 2))}
+        elif profile == "high_sdx":
+            count = rng.randint(20, 30)
+            sdx = rng.sample(self.cc, count - count // 5) + rng.sample(self.dx, count // 5)
+            case = {"pdx": rng.choice(self.dx), "sdx": sdx}
+        elif profile == "surgical":
+            case = {
+                "pdx": rng.choice(self.dx),
+                "sdx": rng.sample(self.dx, rng.randint(0, 3)),
+                "procedures": rng.sample(self.or_procs, rng.randint(1, 3)),
+            }
+        elif profile == "invalid_pdx":
+            case = {"pdx": f"Z{rng.randint(0, 99):02d}X{rng.randint(0, 9)}Q", "sdx": []}
+        else:
+            raise ValueError(f"Unknown profile {profile!r}. Available: {list(PROFILES)}")
+        case.update(self._demographics())
+        return case
+
+    def cases(self, profile: str, n: int) -> List[dict]:
+        return [self.case(profile) for _ in range(n)]
+
+    def mixed(self, n: int) -> List[dict]:
+        """Cases cycling through all profiles"""
+        return [self.case(PROFILES[i % len(PROFILES)]) for i in range(n)]
+
+
+def to_columns(cases: List[dict]) -> Dict[str, list]:
+    """Case dicts -> group_many() columns"""
+    names = ("pdx", "sdx", "procedures", "age", "sex", "los")
+    return {name: [case.get(name) for case in cases] for name in names}
@@ -0,0 +1,260 @@
+"""
+Thai DRG Grouper - Async Grouping Front-End
+
+Runs grouping for async callers (the FastAPI app) without blocking the event
+loop. Work is offloaded to a thread pool, or to per-version worker processes
+(``ParallelGrouper``) with ``executor="process"``. Version loading is
+single-flight, and two limits keep single-case latency flat while batches run:
+``max_concurrency`` bounds grouping jobs in flight, and ``max_batches`` bounds
+batches in flight. Batches go through the executor chunk by chunk, so waiting
+single cases get a slot between chunks.
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Mapping, Optional, Sequence, Set
+
+from .compare import SharedCase, VersionComparison
+from .grouper import ThaiDRGGrouper
+from .manager import ThaiDRGGrouperManager
+from .parallel import ParallelGrouper
+from .regroup import CaseDiff, RegroupResult
+from .types import GrouperResult
+
+EXECUTORS = ("thread", "process")
+
+
+def _group_cases(grouper: ThaiDRGGrouper, cases: List[Mapping]) -> List[GrouperResult]:
+    return [grouper.group(**case) for case in cases]
+
+
+class AsyncGrouper:
+    """
+    Non-blocking grouping over a ThaiDRGGrouperManager
+
+    Args:
+        manager: Manager whose versions are served
+        executor: 'thread' groups in a thread pool; 'process' groups in
+            per-version worker processes (CPU-parallel, per-call IPC cost)
+        workers: Threads or worker processes (default: CPU count)
+        max_concurrency: Grouping jobs (single cases or batch chunks) in
+            flight at once (default: workers)
+        max_batches: Batches in flight at once (default: half of
+            max_concurrency, at least 1)
+        chunk_size: Cases per executor job when grouping a batch
+
+    Example:
+        service = AsyncGrouper(manager, workers=4)
+        result = await service.group('6.3', {'pdx': 'J189', 'age': 65, 'los': 7})
+    """
+
+    def __init__(
+        self,
+        manager: ThaiDRGGrouperManager,
+        executor: str = "thread",
+        workers: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        max_batches: Optional[int] = None,
+        chunk_size: int = 200,
+    ):
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor {executor!r}. Available: {list(EXECUTORS)}")
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        self.manager = manager
+        self.executor = executor
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.max_concurrency = max(1, max_concurrency or self.workers)
+        self.max_batches = max(1, max_batches or self.max_concurrency // 2)
+        self.chunk_size = chunk_size
+
+        self._threads = ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix="drg-group"
+        )
+        self._engines: Dict[str, ParallelGrouper] = {}
+        self._engines_lock = threading.Lock()
+        # Engines in use by running chunks, and replaced engines closed once idle
+        self._users: Dict[ParallelGrouper, int] = {}
+        self._retired: Set[ParallelGrouper] = set()
+        # Event-loop bound state, created for the running loop on first use
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._jobs: Optional[asyncio.Semaphore] = None
+        self._batches: Optional[asyncio.Semaphore] = None
+
+    def _bind_loop(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._loading = {}
+            self._jobs = asyncio.Semaphore(self.max_concurrency)
+            self._batches = asyncio.Semaphore(self.max_batches)
+        return loop
+
+    async def _run(self, fn, *args):
+        return await self._bind_loop().run_in_executor(self._threads, fn, *args)
+
+    async def get_grouper(self, version: str) -> Optional[ThaiDRGGrouper]:
+        """Loaded grouper for a version (None if unknown); loads at most once"""
+        grouper = self.manager._resident(version)
+        if grouper is not None or version not in self.manager._versions:
+            return grouper
+        loop = self._bind_loop()
+        future = self._loading.get(version)
+        if future is None:
+            future = loop.run_in_executor(None, self.manager._get_grouper, version)
+            self._loading[version] = future
+            future.add_done_callback(lambda _: self._loading.pop(version, None))
+        return await asyncio.shield(future)
+
+    def _acquire_engine(self, version: str, grouper: ThaiDRGGrouper) -> ParallelGrouper:
+        """Worker-process engine for the grouper currently served for a version"""
+        stale = None
+        with self._engines_lock:
+            engine = self._engines.get(version)
+            if engine is not None and engine._grouper is not grouper:
+                # The version was reloaded: retire the engine forked from the old tables
+                del self._engines[version]
+                stale = self._retire(engine)
+                engine = None
+            if engine is None:
+                engine = self.manager.parallel_grouper(
+                    version, workers=self.workers, chunk_size=self.chunk_size, grouper=grouper
+                )
+                self._engines[version] = engine
+            self._users[engine] = self._users.get(engine, 0) + 1
+        if stale is not None:
+            stale.close()
+        return engine
+
+    def _release_engine(self, engine: ParallelGrouper):
+        with self._engines_lock:
+            self._users[engine] -= 1
+            if self._users[engine]:
+                return
+            del self._users[engine]
+            if engine not in self._retired:
+                return
+            self._retired.discard(engine)
+        engine.close()
+
+    def _retire(self, engine: ParallelGrouper) -> Optional[ParallelGrouper]:
+        """Mark an engine for closing; returns it if it is idle and can close now"""
+        if self._users.get(engine):
+            self._retired.add(engine)
+            return None
+        return engine
+
+    def _group_chunk(self, version: str, grouper: ThaiDRGGrouper, cases: List[Mapping]):
+        if self.executor == "process":
+            engine = self._acquire_engine(version, grouper)
+            try:
+                return engine.group(cases)
+            finally:
+                self._release_engine(engine)
+        return _group_cases(grouper, cases)
+
+    async def _require(self, version: str) -> ThaiDRGGrouper:
+        self._bind_loop()
+        grouper = await self.get_grouper(version)
+        if grouper is None:
+            raise ValueError(
+                f"Version {version} not found. Available: {list(self.manager._versions.keys())}"
+            )
+        return grouper
+
+    async def group(self, version: str, case: Mapping) -> GrouperResult:
+        """
+        Group one case
+
+        Raises:
+            ValueError: If the version is not found
+        """
+        grouper = await self._require(version)
+        async with self._jobs:
+            results = await self._run(self._group_chunk, version, grouper, [case])
+        return results[0]
+
+    async def _group_shared(self, version: str, shared: SharedCase) -> GrouperResult:
+        if self.executor == "process":
+            return await self.group(version, shared.case)
+        grouper = await self._require(version)
+        async with self._jobs:
+            return await self._run(shared.group, grouper)
+
+    async def regroup(
+        self, version: str, previous: GrouperResult, diff: CaseDiff, verify: bool = False
+    ) -> RegroupResult:
+        """
+        Regroup a corrected case (see ThaiDRGGrouper.regroup) as one grouping job
+
+        Raises:
+            ValueError: If the version is not found
+        """
+        grouper = await self._require(version)
+        async with self._jobs:
+            return await self._run(grouper.regroup, previous, diff, verify)
+
+    async def group_batch(self, version: str, cases: List[Mapping]) -> List[GrouperResult]:
+        """
+        Group a batch chunk by chunk, results in input order
+
+        Raises:
+            ValueError: If the version is not found
+        """
+        grouper = await self._require(version)
+        results: List[GrouperResult] = []
+        async with self._batches:
+            for start in range(0, len(cases), self.chunk_size):
+                chunk = cases[start : start + self.chunk_size]
+                async with self._jobs:
+                    results.extend(await self._run(self._group_chunk, version, grouper, chunk))
+        return results
+
+    async def compare(
+        self, case: Mapping, versions: Optional[Sequence[str]] = None
+    ) -> VersionComparison:
+        """
+        Group one case under several versions (default: all) concurrently
+
+        With the thread executor the case is normalized once for all versions
+        (see SharedCase); worker processes normalize it per version.
+
+        Raises:
+            ValueError: If a version is not found
+        """
+        versions = list(versions or self.manager._versions)
+        unknown = [v for v in versions if v not in self.manager._versions]
+        if unknown:
+            raise ValueError(
+                f"Versions {unknown} not found. Available: {list(self.manager._versions)}"
+            )
+        shared = SharedCase(case)
+        outcomes = await asyncio.gather(
+            *(self._group_shared(version, shared) for version in versions),
+            return_exceptions=True,
+        )
+        comparison = VersionComparison({})
+        for version, outcome in zip(versions, outcomes):
+            if isinstance(outcome, Exception):
+                comparison.results[version] = None
+                comparison.errors[version] = str(outcome) or type(outcome).__name__
+            else:
+                comparison.results[version] = outcome
+        return comparison
+
+    async def group_all_versions(self, case: Mapping) -> Dict[str, Optional[GrouperResult]]:
+        """Group one case with every version concurrently (None where it fails)"""
+        return (await self.compare(case)).results
+
+    def close(self):
+        """Shut down the thread pool and any worker processes"""
+        with self._engines_lock:
+            engines = list(self._engines.values()) + list(self._retired)
+            self._engines.clear()
+            self._retired.clear()
+        for engine in engines:
+            engine.close()
+        self._threads.shutdown(wait=False)
@@ -2,28 +2,160 @@
 Thai DRG Grouper - FastAPI
 """
 
+import asyncio
+import json
 import os
-from typing import List, Optional
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional, Tuple
 
+from . import metrics
+from .aio import AsyncGrouper
 from .manager import ThaiDRGGrouperManager
+from .regroup import CaseDiff
+from .types import RESULT_FIELDS, GrouperResult
 
+# Catalog responses only change when a version's tables do
+CATALOG_CACHE_CONTROL = "public, max-age=300"
 
-def create_api(manager: ThaiDRGGrouperManager):
-    """Create FastAPI app"""
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header covers the given ETag"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+# Longest accepted NDJSON line; longer lines are reported and skipped
+MAX_NDJSON_LINE = 1 << 20
+
+
+async def _ndjson_lines(
+    chunks: AsyncIterator[bytes], max_line: int = MAX_NDJSON_LINE
+) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """
+    Split a streamed body into (line number, line) pairs
+
+    Blank lines are skipped. A line longer than max_line is yielded as None
+    and the rest of it is discarded without being buffered.
+    """
+    buffer = b""
+    line_no = 0
+    skipping = False
+    async for chunk in chunks:
+        buffer += chunk
+        # Scan from an offset and drop the consumed lines once per chunk
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            line = buffer[start:end]
+            start = end + 1
+            line_no += 1
+            if skipping:
+                skipping = False
+            elif len(line) > max_line:
+                yield line_no, None
+            elif line.strip():
+                yield line_no, line
+        buffer = buffer[start:]
+        if not skipping and len(buffer) > max_line:
+            yield line_no + 1, None
+            skipping = True
+        if skipping:
+            buffer = b""
+    if buffer.strip() and not skipping:
+        yield line_no + 1, buffer
+
+
+def create_api(
+    manager: ThaiDRGGrouperManager,
+    executor: str = "thread",
+    workers: Optional[int] = None,
+    max_concurrency: Optional[int] = None,
+    max_batches: Optional[int] = None,
+    preload: Optional[List[str]] = None,
+    watch: Optional[float] = None,
+):
+    """
+    Create FastAPI app
+
+    Grouping and version loading run off the event loop, see AsyncGrouper.
+
+    Args:
+        manager: Versions to serve
+        executor: 'thread' or 'process' grouping executor
+        workers: Executor threads/processes (default: CPU count)
+        max_concurrency: Grouping jobs in flight at once (default: workers)
+        max_batches: Batch requests grouped at once (default: half of max_concurrency)
+        preload: Versions loaded in the background at startup (default: the
+            default version); /ready answers 503 until they are loaded
+        watch: Poll the versions folder every ``watch`` seconds and hot-reload
+            changed versions, see ThaiDRGGrouperManager.watch()
+    """
     try:
-        from fastapi import FastAPI, HTTPException, Query
+        from fastapi import FastAPI, HTTPException, Query, Request, Response
         from fastapi.middleware.cors import CORSMiddleware
+        from fastapi.responses import JSONResponse, StreamingResponse
         from pydantic import BaseModel
     except ImportError:
         raise ImportError("Please install: pip install fastapi")
 
+    class DuplexStreamingResponse(StreamingResponse):
+        """
+        StreamingResponse that leaves receive() to the handler
+
+        StreamingResponse listens for client disconnects on receive(), which
+        would swallow the request body that group_stream is still reading. A
+        gone client shows up as a failing send() instead.
+        """
+
+        async def __call__(self, scope, receive, send):
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": self.status_code,
+                    "headers": self.raw_headers,
+                }
+            )
+            async for chunk in self.body_iterator:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode(self.charset)
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    service = AsyncGrouper(
+        manager,
+        executor=executor,
+        workers=workers,
+        max_concurrency=max_concurrency,
+        max_batches=max_batches,
+    )
+
+    @asynccontextmanager
+    async def lifespan(app):
+        # Without an explicit list, readiness waits for the default version:
+        # start loading it now rather than on the first grouping request
+        manager.preload(preload or None)
+        if watch:
+            manager.watch(watch)
+        yield
+        if watch:
+            manager.stop_watching()
+        service.close()
+
     app = FastAPI(
         title="Thai DRG Grouper API",
         description="Thai DRG Multi-Version Grouper API",
         version="2.0.0",
         docs_url="/docs",
         redoc_url="/redoc",
+        lifespan=lifespan,
     )
+    app.state.grouper = service
+    request_metrics = metrics.RequestMetrics()
+    app.state.metrics = request_metrics
 
     # Add CORS middleware to allow requests from frontend applications
     # Configure via CORS_ORIGINS environment variable (comma-separated list)
@@ -40,6 +172,7 @@ def create_api(manager: ThaiDRGGrouperManager):
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    app.add_middleware(metrics.MetricsMiddleware, metrics=request_metrics)
 
     class GroupRequest(BaseModel):
         pdx: str
@@ -49,9 +182,77 @@ def create_api(manager: ThaiDRGGrouperManager):
         sex: Optional[str] = "M"
         los: Optional[int] = 1
 
+        def to_case(self) -> dict:
+            return {
+                "pdx": self.pdx,
+                "sdx": self.sdx,
+                "procedures": self.procedures,
+                "age": self.age,
+                "sex": self.sex,
+                "los": self.los,
+            }
+
     class BatchRequest(BaseModel):
         cases: List[GroupRequest]
 
+    class CaseDiffRequest(BaseModel):
+        add_sdx: Optional[List[str]] = []
+        remove_sdx: Optional[List[str]] = []
+        add_procedures: Optional[List[str]] = []
+        remove_procedures: Optional[List[str]] = []
+        age: Optional[int] = None
+        sex: Optional[str] = None
+        los: Optional[int] = None
+
+        def to_diff(self) -> CaseDiff:
+            return CaseDiff(
+                add_sdx=self.add_sdx or [],
+                remove_sdx=self.remove_sdx or [],
+                add_procedures=self.add_procedures or [],
+                remove_procedures=self.remove_procedures or [],
+                age=self.age,
+                sex=self.sex,
+                los=self.los,
+            )
+
+    class PreviousResult(BaseModel):
+        """A GrouperResult as returned by /group, type-checked"""
+
+        version: str
+        pdx: str
+        sdx: List[str]
+        procedures: List[str]
+        age: Optional[int]
+        sex: Optional[str]
+        los: int
+        mdc: str
+        mdc_name: str
+        dc: str
+        drg: str
+        drg_name: str
+        rw: float
+        rw0d: float
+        adjrw: float
+        wtlos: float
+        ot: int
+        pcl: int
+        cc_list: List[str]
+        mcc_list: List[str]
+        has_or_procedure: bool
+        is_surgical: bool
+        los_status: str
+        is_valid: bool
+        errors: List[str]
+        warnings: List[str]
+        grouped_at: str = ""
+
+        def to_result(self) -> GrouperResult:
+            return GrouperResult(**{name: getattr(self, name) for name in RESULT_FIELDS})
+
+    class RegroupRequest(BaseModel):
+        previous: PreviousResult
+        diff: CaseDiffRequest
+
     @app.get("/")
     def root():
         return {
@@ -78,18 +279,32 @@ def create_api(manager: ThaiDRGGrouperManager):
             return {"message": f"Default version set to {version}"}
         raise HTTPException(status_code=404, detail=f"Version {version} not found")
 
+    @app.post("/versions/reload")
+    async def refresh_versions():
+        """Rescan the versions folder and hot-reload versions whose .dbf files changed"""
+        return await asyncio.get_running_loop().run_in_executor(None, manager.refresh)
+
+    @app.post("/versions/{version}/reload")
+    async def reload_version(version: str):
+        """Rebuild a loaded version from its .dbf files and swap it in"""
+        if not manager.get_version_info(version):
+            raise HTTPException(status_code=404, detail=f"Version {version} not found")
+        loop = asyncio.get_running_loop()
+        try:
+            status = await loop.run_in_executor(None, manager.reload_version, version)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Reload failed, old tables kept: {e}")
+        return {"version": version, "status": status, **manager.load_status()[version]}
+
     @app.post("/group")
-    def group_default(request: GroupRequest):
+    async def group_default(request: GroupRequest):
         """Group using default version"""
         try:
-            result = manager.group_latest(
-                pdx=request.pdx,
-                sdx=request.sdx,
-                procedures=request.procedures,
-                age=request.age,
-                sex=request.sex,
-                los=request.los,
-            )
+            v = manager.get_default_version()
+            if not v:
+                raise ValueError("No versions available")
+            result = await service.group(v, request.to_case())
+            request_metrics.record_results(v, (result,))
             return result.to_dict()
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
@@ -97,62 +312,134 @@ def create_api(manager: ThaiDRGGrouperManager):
     # NOTE: Specific routes must come BEFORE parameterized routes
     # to avoid /group/{version} catching /group/compare and /group/batch
     @app.post("/group/compare")
-    def group_compare(request: GroupRequest):
-        """Compare across all versions"""
-        results = manager.group_all_versions(
-            pdx=request.pdx,
-            sdx=request.sdx,
-            procedures=request.procedures,
-            age=request.age,
-            sex=request.sex,
-            los=request.los,
-        )
+    async def group_compare(
+        request: GroupRequest,
+        versions: Optional[str] = Query(None, description="Comma-separated versions"),
+        diff: bool = Query(False, description="Return only the fields that differ"),
+    ):
+        """Compare across versions"""
+        selected = [v.strip() for v in versions.split(",") if v.strip()] if versions else None
+        try:
+            comparison = await service.compare(request.to_case(), selected)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        for version, result in comparison.results.items():
+            if result is not None:
+                request_metrics.record_results(version, (result,))
+        if diff:
+            return {"versions": list(comparison.results), **comparison.to_dict(diff_only=True)}
         return {
-            version: result.to_dict() if result else None for version, result in results.items()
+            version: result.to_dict() if result else None
+            for version, result in comparison.results.items()
         }
 
+    @app.post("/group/regroup")
+    async def group_regroup(
+        request: RegroupRequest,
+        version: Optional[str] = Query(None, description="Version (default: previous result's)"),
+    ):
+        """
+        Regroup a corrected case from its previous result (as returned by
+        /group) and a diff, rerunning only the affected stages. A previous
+        result that does not match the tables is regrouped in full.
+        """
+        previous = request.previous.to_result()
+        v = version or previous.version
+        try:
+            # The previous result comes from the client: check it against its codes
+            update = await service.regroup(v, previous, request.diff.to_diff(), verify=True)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        request_metrics.record_results(v, (update.result,))
+        return update.to_dict()
+
     @app.post("/group/batch")
-    def group_batch(
+    async def group_batch(
         request: BatchRequest, version: Optional[str] = Query(None, description="Version to use")
     ):
         """Batch grouping"""
         v = version or manager.get_default_version()
-        results = []
-        for case in request.cases:
-            result = manager.group(
-                v,
-                pdx=case.pdx,
-                sdx=case.sdx,
-                procedures=case.procedures,
-                age=case.age,
-                sex=case.sex,
-                los=case.los,
-            )
-            results.append(result.to_dict())
+        try:
+            grouped = await service.group_batch(v, [case.to_case() for case in request.cases])
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        request_metrics.observe_batch("/group/batch", len(grouped))
+        request_metrics.record_results(v, grouped)
+        results = [result.to_dict() for result in grouped]
         return {"version": v, "results": results, "count": len(results)}
 
+    @app.post("/group/stream")
+    async def group_stream(
+        request: Request, version: Optional[str] = Query(None, description="Version to use")
+    ):
+        """
+        Stream grouping: NDJSON cases in (one GroupRequest object per line),
+        NDJSON results out as each chunk is grouped
+
+        Every output line carries the input "line" number; lines that cannot be
+        parsed come back as {"line": n, "error": "..."} in their place. The body
+        is read only as fast as results are sent, so memory stays flat.
+        """
+        v = version or manager.get_default_version()
+        if not await service.get_grouper(v):
+            raise HTTPException(status_code=404, detail=f"Version {v} not found")
+
+        def parse(line: Optional[bytes]) -> dict:
+            if line is None:
+                raise ValueError(f"line longer than {MAX_NDJSON_LINE} bytes")
+            obj = json.loads(line)
+            if not isinstance(obj, dict):
+                raise ValueError("line is not a JSON object")
+            return GroupRequest(**obj).to_case()
+
+        async def grouped(rows: list) -> bytes:
+            cases = [case for _, case in rows if not isinstance(case, str)]
+            grouped_results = await service.group_batch(v, cases)
+            request_metrics.record_results(v, grouped_results)
+            results = iter(grouped_results)
+            out = []
+            for line_no, case in rows:
+                if isinstance(case, str):
+                    row = {"line": line_no, "error": case}
+                else:
+                    row = dict(next(results).to_dict(), line=line_no)
+                out.append(json.dumps(row, ensure_ascii=False))
+                out.append("\n")
+            return "".join(out).encode("utf-8")
+
+        async def results():
+            rows, count, total = [], 0, 0
+            async for line_no, line in _ndjson_lines(request.stream()):
+                try:
+                    rows.append((line_no, parse(line)))
+                    count += 1
+                    total += 1
+                except ValueError as e:
+                    rows.append((line_no, str(e)))
+                if count >= service.chunk_size or len(rows) >= 2 * service.chunk_size:
+                    yield await grouped(rows)
+                    rows, count = [], 0
+            if rows:
+                yield await grouped(rows)
+            request_metrics.observe_batch("/group/stream", total)
+
+        return DuplexStreamingResponse(results(), media_type="application/x-ndjson")
+
     @app.post("/group/{version}")
-    def group_version(version: str, request: GroupRequest):
+    async def group_version(version: str, request: GroupRequest):
         """Group using specific version"""
         try:
-            result = manager.group(
-                version,
-                pdx=request.pdx,
-                sdx=request.sdx,
-                procedures=request.procedures,
-                age=request.age,
-                sex=request.sex,
-                los=request.los,
-            )
+            result = await service.group(version, request.to_case())
+            request_metrics.record_results(version, (result,))
             return result.to_dict()
         except ValueError as e:
             raise HTTPException(status_code=404, detail=str(e))
 
     @app.get("/drg/{drg_code}")
-    def get_drg(drg_code: str, version: Optional[str] = None):
+    async def get_drg(drg_code: str, version: Optional[str] = None):
         """Get DRG info"""
         v = version or manager.get_default_version()
-        grouper = manager._get_grouper(v)
+        grouper = await service.get_grouper(v)
         if not grouper:
             raise HTTPException(status_code=404, detail="Version not found")
         info = grouper.get_drg_info(drg_code)
@@ -160,12 +447,64 @@ def create_api(manager: ThaiDRGGrouperManager):
             raise HTTPException(status_code=404, detail="DRG not found")
         return info
 
+    @app.get("/drgs")
+    async def list_drgs(
+        request: Request,
+        version: Optional[str] = None,
+        mdc: Optional[str] = Query(None, description="MDC code, e.g. 04"),
+        dc: Optional[str] = Query(None, description="Disease cluster, e.g. 0450"),
+        rw_min: Optional[float] = Query(None, description="Lowest RW (inclusive)"),
+        rw_max: Optional[float] = Query(None, description="Highest RW (inclusive)"),
+    ):
+        """DRG catalog (names and weights), filterable by MDC, DC and RW range"""
+        v = version or manager.get_default_version()
+        grouper = await service.get_grouper(v)
+        if not grouper:
+            raise HTTPException(status_code=404, detail="Version not found")
+        body, etag = grouper.get_drg_catalog().blob(mdc, dc, rw_min, rw_max)
+        headers = {"ETag": etag, "Cache-Control": CATALOG_CACHE_CONTROL}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
     @app.get("/stats")
-    def get_stats(version: Optional[str] = None):
-        return manager.get_stats(version)
+    async def get_stats(version: Optional[str] = None):
+        if version:
+            grouper = await service.get_grouper(version)
+            return grouper.get_stats() if grouper else {}
+        return await asyncio.get_running_loop().run_in_executor(None, manager.get_stats)
+
+    @app.get("/metrics")
+    def prometheus_metrics():
+        """
+        Prometheus text metrics: request latency, batch sizes, grouped and
+        ungroupable cases, version loads, result cache hit rates, and per-stage
+        grouper timings (with a manager created with profile=True)
+        """
+        body = metrics.render(request_metrics.lines() + metrics.manager_metrics(manager))
+        return Response(content=body, media_type=metrics.CONTENT_TYPE)
+
+    @app.get("/residency")
+    def residency():
+        """Loaded versions, table memory per version, limits and load/eviction counts"""
+        return manager.residency_stats()
 
     @app.get("/health")
     def health():
-        return {"status": "ok", "versions_loaded": len(manager._versions)}
+        return {
+            "status": manager.health(),
+            "versions_loaded": len(manager._groupers),
+            "versions_installed": len(manager._versions),
+            "ready": manager.is_ready(),
+        }
+
+    @app.get("/ready")
+    def ready():
+        """Readiness: 200 once the preloaded (or default) versions are loaded, else 503"""
+        is_ready = manager.is_ready()
+        return JSONResponse(
+            status_code=200 if is_ready else 503,
+            content={"ready": is_ready, "versions": manager.load_status()},
+        )
 
     return app
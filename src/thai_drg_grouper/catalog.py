@@ -0,0 +1,108 @@
+"""
+Thai DRG Grouper - DRG Catalog
+
+A read-only listing of every DRG of one version (code, DC, MDC, name and
+weights), indexed by MDC and DC. Catalog responses are serialized once and
+keyed by a content hash, so the API can answer repeat requests with the cached
+JSON body or a ``304 Not Modified``.
+"""
+
+import hashlib
+import json
+from typing import Dict, List, Mapping, Optional, Tuple
+
+# Field order of a catalog entry
+CATALOG_FIELDS = ("drg", "dc", "mdc", "name", "rw", "rw0d", "wtlos", "ot")
+
+
+class DRGCatalog:
+    """
+    DRG listing of one version with MDC/DC indexes and cached JSON blobs
+
+    Args:
+        version: Version string echoed in every response
+        drg_data: DC -> list of DRG dicts, as loaded by ThaiDRGGrouper
+    """
+
+    def __init__(self, version: str, drg_data: Mapping[str, List[dict]]):
+        self.version = version
+        self.entries: List[dict] = sorted(
+            (
+                {field: dc if field == "dc" else drg[field] for field in CATALOG_FIELDS}
+                for dc, drgs in drg_data.items()
+                for drg in drgs
+            ),
+            key=lambda entry: entry["drg"],
+        )
+        self._by_mdc: Dict[str, List[dict]] = {}
+        self._by_dc: Dict[str, List[dict]] = {}
+        for entry in self.entries:
+            self._by_mdc.setdefault(entry["mdc"], []).append(entry)
+            self._by_dc.setdefault(entry["dc"], []).append(entry)
+        self._blobs: Dict[Tuple, Tuple[bytes, str]] = {}
+
+    @staticmethod
+    def _normalize(mdc: Optional[str], dc: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+        if mdc is not None:
+            mdc = mdc.strip().zfill(2)
+        if dc is not None:
+            dc = dc.strip()
+        return mdc, dc
+
+    def select(
+        self,
+        mdc: Optional[str] = None,
+        dc: Optional[str] = None,
+        rw_min: Optional[float] = None,
+        rw_max: Optional[float] = None,
+    ) -> List[dict]:
+        """
+        DRGs matching all given filters, ordered by DRG code
+
+        Args:
+            mdc: MDC code (e.g. '04' or '4')
+            dc: Disease cluster code (e.g. '0450')
+            rw_min: Lowest relative weight (inclusive)
+            rw_max: Highest relative weight (inclusive)
+        """
+        mdc, dc = self._normalize(mdc, dc)
+        entries = self.entries
+        if mdc is not None:
+            entries = self._by_mdc.get(mdc, [])
+        if dc is not None:
+            entries = [e for e in entries if e["dc"] == dc] if mdc else self._by_dc.get(dc, [])
+        if rw_min is not None or rw_max is not None:
+            low = float("-inf") if rw_min is None else rw_min
+            high = float("inf") if rw_max is None else rw_max
+            entries = [e for e in entries if low <= e["rw"] <= high]
+        return entries
+
+    def blob(
+        self,
+        mdc: Optional[str] = None,
+        dc: Optional[str] = None,
+        rw_min: Optional[float] = None,
+        rw_max: Optional[float] = None,
+    ) -> Tuple[bytes, str]:
+        """
+        Serialized catalog response and its ETag
+
+        Whole-catalog, per-MDC and per-DC responses are kept after the first
+        request; RW range queries and unknown codes are serialized per call.
+        """
+        mdc, dc = self._normalize(mdc, dc)
+        key = (mdc, dc)
+        cached = self._blobs.get(key) if rw_min is None and rw_max is None else None
+        if cached is not None:
+            return cached
+        drgs = self.select(mdc, dc, rw_min, rw_max)
+        body = json.dumps(
+            {"version": self.version, "count": len(drgs), "drgs": drgs},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+        result = body, f'"{hashlib.sha1(body).hexdigest()}"'
+        known = (mdc is None or mdc in self._by_mdc) and (dc is None or dc in self._by_dc)
+        if rw_min is None and rw_max is None and known:
+            self._blobs[key] = result
+        return result
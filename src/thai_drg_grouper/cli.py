@@ -5,8 +5,218 @@ Thai DRG Grouper - CLI
 import argparse
 import json
 import sys
+import urllib.error
+import urllib.request
+from typing import List, Optional
 
+from .compare import COMPARE_FIELDS, CompareWriter, compare_stream
+from .fileio import ResultWriter, detect_format, group_stream, parse_column_map, read_cases
 from .manager import ThaiDRGGrouperManager
+from .profiling import format_profile
+
+
+def _open(path: str, mode: str):
+    if path == "-":
+        return sys.stdin if "r" in mode else sys.stdout
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def _close(stream):
+    if stream is not None and stream not in (sys.stdin, sys.stdout):
+        stream.close()
+
+
+def _group_file(manager: ThaiDRGGrouperManager, args) -> int:
+    in_fmt = args.input_format or detect_format(args.input)
+    out_fmt = args.output_format or detect_format(args.output, default=in_fmt)
+    try:
+        columns = parse_column_map(args.column_map)
+        engine = manager.parallel_grouper(
+            args.version, workers=args.workers, chunk_size=args.chunk_size
+        )
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    bad_records = []
+    source = target = None
+    try:
+        source = _open(args.input, "r")
+        target = _open(args.output, "w")
+        writer = ResultWriter(
+            target,
+            out_fmt,
+            fields=args.fields.split(",") if args.fields else None,
+            keep=args.keep.split(",") if args.keep else (),
+            list_sep=args.list_sep,
+        )
+        cases = read_cases(source, in_fmt, columns, args.list_sep, errors=bad_records)
+        with engine:
+            summary = group_stream(engine, cases, writer)
+    except (ValueError, OSError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    finally:
+        _close(source)
+        _close(target)
+
+    for bad in bad_records[:10]:
+        print(f"⚠️  Skipped {bad}", file=sys.stderr)
+    print(
+        f"✅ Grouped {summary['cases']} cases (v{engine.version}) in {summary['seconds']:.2f}s"
+        f" - {summary['cases_per_sec']:,.0f} cases/sec, {len(bad_records)} skipped",
+        file=sys.stderr,
+    )
+    return 0
+
+
+def _compare_file(manager: ThaiDRGGrouperManager, args) -> int:
+    in_fmt = args.input_format or detect_format(args.input)
+    out_fmt = args.output_format or detect_format(args.output, default=in_fmt)
+    try:
+        columns = parse_column_map(args.column_map)
+        base = manager.parallel_grouper(args.base, workers=args.workers, chunk_size=args.chunk_size)
+        other = manager.parallel_grouper(
+            args.other, workers=args.workers, chunk_size=args.chunk_size
+        )
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    bad_records = []
+    source = target = None
+    try:
+        source = _open(args.input, "r")
+        target = _open(args.output, "w")
+        writer = CompareWriter(
+            target,
+            out_fmt,
+            (base.version, other.version),
+            fields=args.fields.split(",") if args.fields else COMPARE_FIELDS,
+            keep=args.keep.split(",") if args.keep else (),
+            diff_only=args.diff_only,
+            list_sep=args.list_sep,
+        )
+        cases = read_cases(source, in_fmt, columns, args.list_sep, errors=bad_records)
+        with base, other:
+            summary = compare_stream(base, other, cases, writer)
+    except (ValueError, OSError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    finally:
+        _close(source)
+        _close(target)
+
+    for bad in bad_records[:10]:
+        print(f"⚠️  Skipped {bad}", file=sys.stderr)
+    print(
+        f"✅ Compared {summary['cases']} cases (v{base.version} vs v{other.version}) in"
+        f" {summary['seconds']:.2f}s - {summary['changed']} changed, {len(bad_records)} skipped",
+        file=sys.stderr,
+    )
+    return 0
+
+
+def _impact(manager: ThaiDRGGrouperManager, args) -> int:
+    in_fmt = args.input_format or detect_format(args.input)
+    bad_records = []
+    source = None
+    try:
+        source = _open(args.input, "r")
+        columns = parse_column_map(args.column_map)
+        cases = read_cases(source, in_fmt, columns, args.list_sep, errors=bad_records)
+        report = manager.impact(
+            cases, args.other, args.base, workers=args.workers, chunk_size=args.chunk_size
+        )
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(report.to_dict(), f, indent=2, ensure_ascii=False)
+    except (ValueError, OSError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    finally:
+        _close(source)
+
+    if args.json:
+        print(json.dumps(report.to_dict(top=args.top), indent=2, ensure_ascii=False))
+    else:
+        print(report.format_text(top=args.top))
+    for bad in bad_records[:10]:
+        print(f"⚠️  Skipped {bad}", file=sys.stderr)
+    print(
+        f"✅ Analyzed {report.cases} cases in {report.seconds:.2f}s, {len(bad_records)} skipped",
+        file=sys.stderr,
+    )
+    return 0
+
+
+def _profile(manager: ThaiDRGGrouperManager, args) -> int:
+    """Group a case file with stage profiling on and print where the time went"""
+    version = args.version or manager.get_default_version()
+    in_fmt = args.input_format or detect_format(args.input)
+    bad_records = []
+    source = None
+    try:
+        source = _open(args.input, "r")
+        grouper = manager._get_grouper(version) if version else None
+        if grouper is None:
+            raise ValueError(f"Version {version} not found")
+        columns = parse_column_map(args.column_map)
+        cases = list(read_cases(source, in_fmt, columns, args.list_sep, errors=bad_records))
+    except (ValueError, OSError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    finally:
+        _close(source)
+
+    for case in cases:
+        case.pop("_record", None)
+    profiler = grouper.enable_profiling()
+    profiler.reset()
+    try:
+        for _ in range(args.repeat):
+            for case in cases:
+                grouper.group(**case)
+        profile = profiler.snapshot()
+    finally:
+        grouper.disable_profiling()
+
+    if args.json:
+        print(json.dumps(profile, indent=2))
+    else:
+        print(f"\n📈 Stage profile (v{version}, {len(cases)} cases x {args.repeat})")
+        print(format_profile(profile))
+    for bad in bad_records[:10]:
+        print(f"⚠️  Skipped {bad}", file=sys.stderr)
+    return 0
+
+
+def _reload(args) -> int:
+    """POST to a running server's reload endpoint"""
+    endpoint = f"/versions/{args.version}/reload" if args.version else "/versions/reload"
+    request = urllib.request.Request(args.url.rstrip("/") + endpoint, method="POST")
+    try:
+        with urllib.request.urlopen(request) as response:
+            result = json.load(response)
+    except urllib.error.HTTPError as e:
+        print(f"❌ {e.code}: {e.read().decode('utf-8', 'replace')}", file=sys.stderr)
+        return 1
+    except urllib.error.URLError as e:
+        print(f"❌ Cannot reach {args.url}: {e.reason}", file=sys.stderr)
+        return 1
+    print(json.dumps(result, indent=2))
+    return 1 if result.get("failed") else 0
+
+
+def _preload_versions(manager, spec: Optional[str]) -> Optional[List[str]]:
+    """--preload value -> create_api(preload=...)"""
+    if spec is None:
+        return None
+    if spec == "default":
+        return []
+    if spec == "all":
+        return [v.version for v in manager.list_versions()]
+    return [v.strip() for v in spec.split(",") if v.strip()]
 
 
 def main():
@@ -50,6 +260,37 @@ def main():
     group_parser.add_argument("--version", "-v", help="DRG version to use")
     group_parser.add_argument("--json", action="store_true", help="Output as JSON")
     group_parser.add_argument("--path", "-p", default="./data/versions", help="Versions path")
+    group_parser.add_argument(
+        "--backend", choices=["memory", "mmap"], default="memory", help="Table backend"
+    )
+
+    # batch
+    batch_parser = subparsers.add_parser("batch", help="Group a JSON file of cases in parallel")
+    batch_parser.add_argument("input", help='JSON file: list of cases or {"cases": [...]}')
+    batch_parser.add_argument("--output", "-o", help="Output JSON file (default: stdout)")
+    batch_parser.add_argument("--version", "-v", help="DRG version to use")
+    batch_parser.add_argument("--workers", "-w", type=int, help="Worker processes (default: CPUs)")
+    batch_parser.add_argument("--chunk-size", type=int, default=1000, help="Cases per task")
+    batch_parser.add_argument("--path", "-p", default="./data/versions", help="Versions path")
+
+    # group-file
+    gf_parser = subparsers.add_parser("group-file", help="Stream-group a CSV/JSONL file of cases")
+    gf_parser.add_argument("input", help="Input file, or - for stdin")
+    gf_parser.add_argument("--output", "-o", default="-", help="Output file (default: stdout)")
+    gf_parser.add_argument("--input-format", choices=["csv", "jsonl"], help="Default: by extension")
+    gf_parser.add_argument(
+        "--output-format", choices=["csv", "jsonl"], help="Default: by extension or input format"
+    )
+    gf_parser.add_argument(
+        "--map", dest="column_map", help="Column mapping, e.g. pdx=PDX,sdx=SDX1+SDX2,los=LOS"
+    )
+    gf_parser.add_argument("--fields", help="Result fields to write (comma-separated)")
+    gf_parser.add_argument("--keep", help="Input columns copied to the output (comma-separated)")
+    gf_parser.add_argument("--list-sep", default=",", help="Separator for lists in CSV cells")
+    gf_parser.add_argument("--version", "-v", help="DRG version to use")
+    gf_parser.add_argument("--workers", "-w", type=int, default=1, help="Worker processes")
+    gf_parser.add_argument("--chunk-size", type=int, default=1000, help="Cases per chunk")
+    gf_parser.add_argument("--path", "-p", default="./data/versions", help="Versions path")
 
     # compare
     cmp_parser = subparsers.add_parser("compare", help="Compare across versions")
@@ -59,13 +300,145 @@ def main():
     cmp_parser.add_argument("--age", type=int, help="Patient age")
     cmp_parser.add_argument("--sex", help="Patient sex (M/F)")
     cmp_parser.add_argument("--los", type=int, default=1, help="Length of stay")
+    cmp_parser.add_argument(
+        "--versions", help="Versions to compare (comma-separated, default: all)"
+    )
+    cmp_parser.add_argument("--diff", action="store_true", help="Show only the fields that differ")
     cmp_parser.add_argument("--path", "-p", default="./data/versions", help="Versions path")
 
+    # compare-file
+    cf_parser = subparsers.add_parser(
+        "compare-file", help="Stream-compare a CSV/JSONL file of cases between two versions"
+    )
+    cf_parser.add_argument("input", help="Input file, or - for stdin")
+    cf_parser.add_argument("--base", required=True, help="Base version")
+    cf_parser.add_argument("--other", required=True, help="Version compared with the base")
+    cf_parser.add_argument("--output", "-o", default="-", help="Output file (default: stdout)")
+    cf_parser.add_argument("--input-format", choices=["csv", "jsonl"], help="Default: by extension")
+    cf_parser.add_argument(
+        "--output-format", choices=["csv", "jsonl"], help="Default: by extension or input format"
+    )
+    cf_parser.add_argument(
+        "--map", dest="column_map", help="Column mapping, e.g. pdx=PDX,sdx=SDX1+SDX2,los=LOS"
+    )
+    cf_parser.add_argument("--fields", help="Result fields to compare (comma-separated)")
+    cf_parser.add_argument("--keep", help="Input columns copied to the output (comma-separated)")
+    cf_parser.add_argument("--diff-only", action="store_true", help="Write only changed cases")
+    cf_parser.add_argument("--list-sep", default=",", help="Separator for lists in CSV cells")
+    cf_parser.add_argument("--workers", "-w", type=int, default=1, help="Worker processes each")
+    cf_parser.add_argument("--chunk-size", type=int, default=1000, help="Cases per chunk")
+    cf_parser.add_argument("--path", "-p", default="./data/versions", help="Versions path")
+
+    # impact
+    imp_parser = subparsers.add_parser(
+        "impact", help="Aggregate DRG/AdjRW changes of a case file between two versions"
+    )
+    imp_parser.add_argument("input", help="Input file, or - for stdin")
+    imp_parser.add_argument("--other", required=True, help="Candidate version")
+    imp_parser.add_argument("--base", help="Version in use (default: default version)")
+    imp_parser.add_argument(
+        "--input-format", choices=["csv", "jsonl"], help="Default: by extension"
+    )
+    imp_parser.add_argument(
+        "--map", dest="column_map", help="Column mapping, e.g. pdx=PDX,sdx=SDX1+SDX2,los=LOS"
+    )
+    imp_parser.add_argument("--list-sep", default=",", help="Separator for lists in CSV cells")
+    imp_parser.add_argument("--top", type=int, default=20, help="DRG migrations to show")
+    imp_parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    imp_parser.add_argument("--output", "-o", help="Also write the full JSON report to a file")
+    imp_parser.add_argument("--workers", "-w", type=int, help="Worker processes each")
+    imp_parser.add_argument("--chunk-size", type=int, default=1000, help="Cases per chunk")
+    imp_parser.add_argument("--path", "-p", default="./data/versions", help="Versions path")
+
     # serve
     serve_parser = subparsers.add_parser("serve", help="Start API server")
     serve_parser.add_argument("--port", type=int, default=8000, help="Port number")
     serve_parser.add_argument("--host", default="0.0.0.0", help="Host")
     serve_parser.add_argument("--path", "-p", default="./data/versions", help="Versions path")
+    serve_parser.add_argument(
+        "--backend",
+        choices=["memory", "mmap"],
+        default="memory",
+        help="Table backend (mmap shares one copy of the tables across workers)",
+    )
+    serve_parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=0,
+        help="Cache results of up to N distinct cases per version (default: off)",
+    )
+    serve_parser.add_argument(
+        "--max-versions", type=int, help="Loaded versions kept at once (LRU eviction, default: all)"
+    )
+    serve_parser.add_argument(
+        "--max-memory-mb", type=int, help="Table memory kept loaded in MB (LRU eviction)"
+    )
+    serve_parser.add_argument(
+        "--pin", help="Versions never evicted, besides the default (comma-separated)"
+    )
+    serve_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Record per-stage grouper timings, exported on /metrics",
+    )
+    serve_parser.add_argument(
+        "--executor", choices=["thread", "process"], default="thread", help="Grouping executor"
+    )
+    serve_parser.add_argument(
+        "--workers", "-w", type=int, help="Executor threads/processes (default: CPUs)"
+    )
+    serve_parser.add_argument(
+        "--max-concurrency", type=int, help="Grouping jobs in flight (default: workers)"
+    )
+    serve_parser.add_argument(
+        "--watch",
+        nargs="?",
+        type=float,
+        const=2.0,
+        help="Hot-reload versions when their files change (poll interval, default: 2s)",
+    )
+    serve_parser.add_argument(
+        "--preload",
+        nargs="?",
+        const="default",
+        help="Load versions at startup: 'default', 'all' or a comma-separated list",
+    )
+
+    # profile
+    prof_parser = subparsers.add_parser(
+        "profile", help="Group a case file with per-stage timing and lookup counters"
+    )
+    prof_parser.add_argument("input", help="Input file, or - for stdin")
+    prof_parser.add_argument(
+        "--input-format", choices=["csv", "jsonl"], help="Default: by extension"
+    )
+    prof_parser.add_argument(
+        "--map", dest="column_map", help="Column mapping, e.g. pdx=PDX,sdx=SDX1+SDX2,los=LOS"
+    )
+    prof_parser.add_argument("--list-sep", default=",", help="Separator for lists in CSV cells")
+    prof_parser.add_argument("--version", "-v", help="DRG version to use")
+    prof_parser.add_argument("--repeat", type=int, default=1, help="Passes over the cases")
+    prof_parser.add_argument("--json", action="store_true", help="Print the profile as JSON")
+    prof_parser.add_argument("--path", "-p", default="./data/versions", help="Versions path")
+    prof_parser.add_argument(
+        "--backend", choices=["memory", "mmap"], default="memory", help="Table backend"
+    )
+
+    # reload
+    reload_parser = subparsers.add_parser(
+        "reload", help="Hot-reload changed versions in a running API server"
+    )
+    reload_parser.add_argument("--version", "-v", help="Reload this version (default: all changed)")
+    reload_parser.add_argument("--url", default="http://localhost:8000", help="API server URL")
+    reload_parser.add_argument("--path", "-p", default="./data/versions", help="Versions path")
+
+    # compile
+    compile_parser = subparsers.add_parser(
+        "compile", help="Compile .dbf tables into fast-loading snapshots"
+    )
+    compile_parser.add_argument("--version", "-v", help="Specific version (default: all)")
+    compile_parser.add_argument("--force", action="store_true", help="Rebuild even if fresh")
+    compile_parser.add_argument("--path", "-p", default="./data/versions", help="Versions path")
 
     # stats
     stats_parser = subparsers.add_parser("stats", help="Show statistics")
@@ -79,7 +452,15 @@ def main():
         return
 
     try:
-        manager = ThaiDRGGrouperManager(args.path)
+        manager = ThaiDRGGrouperManager(
+            args.path,
+            backend=getattr(args, "backend", "memory"),
+            cache_size=getattr(args, "cache_size", 0),
+            max_versions=getattr(args, "max_versions", None),
+            max_bytes=args.max_memory_mb * 2**20 if getattr(args, "max_memory_mb", None) else None,
+            pinned=args.pin.split(",") if getattr(args, "pin", None) else (),
+            profile=getattr(args, "profile", False),
+        )
     except Exception as e:
         print(f"Error initializing: {e}", file=sys.stderr)
         return 1
@@ -164,21 +545,90 @@ def main():
             print(f"PCL: {result.pcl}")
             print(f"Surgical: {result.is_surgical}")
 
+    elif args.command == "batch":
+        version = args.version or manager.get_default_version()
+        if not version:
+            print("No versions available")
+            return 1
+
+        try:
+            with open(args.input, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            cases = data["cases"] if isinstance(data, dict) else data
+            results = manager.group_parallel(
+                cases, version=version, workers=args.workers, chunk_size=args.chunk_size
+            )
+            output = json.dumps(
+                {
+                    "version": version,
+                    "results": [r.to_dict() for r in results],
+                    "count": len(results),
+                },
+                ensure_ascii=False,
+                indent=2,
+            )
+            if args.output:
+                with open(args.output, "w", encoding="utf-8") as f:
+                    f.write(output)
+        except KeyError as e:
+            print(f"❌ Missing field {e} in {args.input}", file=sys.stderr)
+            return 1
+        except TypeError as e:
+            print(f"❌ Invalid cases in {args.input}: {e}", file=sys.stderr)
+            return 1
+        except (OSError, ValueError) as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return 1
+
+        if args.output:
+            print(f"✅ Grouped {len(results)} cases -> {args.output}")
+        else:
+            print(output)
+
+    elif args.command == "group-file":
+        return _group_file(manager, args)
+
     elif args.command == "compare":
         sdx = args.sdx.split(",") if args.sdx else []
         procedures = args.proc.split(",") if args.proc else []
+        versions = args.versions.split(",") if args.versions else None
 
-        results = manager.group_all_versions(
-            pdx=args.pdx, sdx=sdx, procedures=procedures, age=args.age, sex=args.sex, los=args.los
-        )
+        try:
+            comparison = manager.compare(
+                pdx=args.pdx,
+                sdx=sdx,
+                procedures=procedures,
+                age=args.age,
+                sex=args.sex,
+                los=args.los,
+                versions=versions,
+            )
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 1
 
         print("\n📊 Version Comparison")
         print("-" * 50)
-        for version, result in results.items():
-            if result:
-                print(f"  {version}: DRG={result.drg} RW={result.rw:.4f} AdjRW={result.adjrw:.4f}")
-            else:
-                print(f"  {version}: Error")
+        if args.diff:
+            diff = comparison.diff()
+            for field, values in diff.items():
+                print(f"  {field}: " + "  ".join(f"{v}={value}" for v, value in values.items()))
+            if not diff:
+                print("  No differences")
+        else:
+            for version, result in comparison.results.items():
+                if result:
+                    print(
+                        f"  {version}: DRG={result.drg} RW={result.rw:.4f} AdjRW={result.adjrw:.4f}"
+                    )
+        for version, error in comparison.errors.items():
+            print(f"  {version}: Error - {error}")
+
+    elif args.command == "compare-file":
+        return _compare_file(manager, args)
+
+    elif args.command == "impact":
+        return _impact(manager, args)
 
     elif args.command == "serve":
         try:
@@ -186,7 +636,14 @@ def main():
 
             from .api import create_api
 
-            app = create_api(manager)
+            app = create_api(
+                manager,
+                executor=args.executor,
+                workers=args.workers,
+                max_concurrency=args.max_concurrency,
+                preload=_preload_versions(manager, args.preload),
+                watch=args.watch,
+            )
             print(f"\n🚀 Starting API server on {args.host}:{args.port}")
             print(f"   Docs: http://{args.host}:{args.port}/docs")
             uvicorn.run(app, host=args.host, port=args.port)
@@ -194,6 +651,26 @@ def main():
             print("Please install: pip install fastapi uvicorn")
             return 1
 
+    elif args.command == "profile":
+        return _profile(manager, args)
+
+    elif args.command == "reload":
+        return _reload(args)
+
+    elif args.command == "compile":
+        try:
+            status = manager.compile_snapshots(args.version, force=args.force)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 1
+        if not status:
+            print("No versions installed.")
+        for version, state in status.items():
+            if state == "compiled":
+                print(f"✅ Compiled snapshot for version {version}")
+            else:
+                print(f"✅ Snapshot for version {version} is up to date")
+
     elif args.command == "stats":
         stats = manager.get_stats(args.version)
         print(json.dumps(stats, indent=2))
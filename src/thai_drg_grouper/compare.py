@@ -0,0 +1,294 @@
+"""
+Thai DRG Grouper - Version Comparison
+
+Groups the same cases under several versions and reports what changed.
+Single cases are normalized once and grouped under every version at once;
+versions that still have to be loaded load concurrently, and only the
+requested versions are loaded at all. Case files are compared between two
+versions in one streaming pass, each chunk grouped under both versions by
+process-pool engines.
+"""
+
+import csv
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import IO, Any, Dict, Iterable, Iterator, Mapping, Optional, Sequence
+
+from .fileio import FORMATS
+from .parallel import ParallelGrouper
+from .types import RESULT_FIELDS, GrouperResult
+
+# Result fields compared by default
+COMPARE_FIELDS = ("mdc", "dc", "drg", "rw", "adjrw", "pcl", "los_status", "is_valid")
+
+
+def diff_values(values: Mapping[str, Mapping[str, Any]], fields: Sequence[str]) -> Dict:
+    """
+    Fields whose value is not the same in every version
+
+    Args:
+        values: version -> field -> value
+        fields: Fields to check
+
+    Returns:
+        field -> version -> value, for differing fields only
+    """
+    versions = list(values)
+    diff = {}
+    for name in fields:
+        column = [values[v][name] for v in versions]
+        if any(value != column[0] for value in column[1:]):
+            diff[name] = dict(zip(versions, column))
+    return diff
+
+
+# Keyword arguments of ThaiDRGGrouper.group
+_GROUP_ARGS = frozenset(("pdx", "sdx", "procedures", "age", "sex", "los", "discharge_status"))
+
+
+class SharedCase:
+    """
+    One case grouped under several versions, its codes normalized once
+
+    The first version to group it normalizes the codes; each version then
+    resolves its own copy of the normalized case (the table records differ
+    between versions), so versions can group it concurrently. Cases with an
+    age error or unexpected arguments go through group() as they are.
+
+    Args:
+        case: group() keyword arguments ('pdx' required)
+    """
+
+    def __init__(self, case: Mapping):
+        self.case = dict(case)
+        self.case["sdx"] = list(self.case.get("sdx") or [])
+        self.case["procedures"] = list(self.case.get("procedures") or [])
+        age = self.case.get("age")
+        self._shared = (
+            "pdx" in self.case
+            and _GROUP_ARGS.issuperset(self.case)
+            and isinstance(age, int)
+            and 0 <= age <= 124
+        )
+        self._normalized = None
+        self._lock = threading.Lock()
+
+    def group(self, grouper) -> GrouperResult:
+        """grouper.group(**case), reusing the normalized codes"""
+        case = self.case
+        if not self._shared:
+            return grouper.group(**case)
+        with self._lock:
+            if self._normalized is None:
+                self._normalized = grouper._normalize_case(
+                    case["pdx"], case["sdx"], case["procedures"]
+                )
+        return grouper._group_normalized(
+            self._normalized.unresolved(), case["age"], case.get("sex"), case.get("los", 1)
+        )
+
+
+@dataclass
+class VersionComparison:
+    """One case grouped under several versions"""
+
+    results: Dict[str, Optional[GrouperResult]]
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    def diff(self, fields: Sequence[str] = COMPARE_FIELDS) -> Dict[str, Dict[str, Any]]:
+        """Fields that differ between the versions that grouped successfully"""
+        values = {
+            version: {name: getattr(result, name) for name in fields}
+            for version, result in self.results.items()
+            if result is not None
+        }
+        return diff_values(values, fields)
+
+    def to_dict(self, diff_only: bool = False, fields: Sequence[str] = COMPARE_FIELDS) -> dict:
+        """Per-version results, differing fields and errors (diff_only: no results)"""
+        if diff_only:
+            return {"diff": self.diff(fields), "errors": self.errors}
+        return {
+            "results": {v: r.to_dict() if r else None for v, r in self.results.items()},
+            "diff": self.diff(fields),
+            "errors": self.errors,
+        }
+
+
+def compare_case(
+    manager, case: Mapping, versions: Optional[Sequence[str]] = None
+) -> VersionComparison:
+    """
+    Group one case under several versions (default: all)
+
+    The case is normalized once and every version groups it concurrently,
+    one thread each (versions that are not loaded yet load in their thread).
+    A version that fails is reported in ``errors`` with a None result.
+
+    Args:
+        manager: ThaiDRGGrouperManager
+        case: group() keyword arguments ('pdx' required)
+        versions: Versions to compare, in output order (default: all)
+
+    Raises:
+        ValueError: If a version is not found
+    """
+    versions = list(versions or manager._versions)
+    unknown = [v for v in versions if v not in manager._versions]
+    if unknown:
+        raise ValueError(f"Versions {unknown} not found. Available: {list(manager._versions)}")
+
+    shared = SharedCase(case)
+
+    def group(version: str) -> GrouperResult:
+        return shared.group(manager._get_grouper(version))
+
+    futures = {}
+    if len(versions) > 1:
+        with ThreadPoolExecutor(
+            max_workers=len(versions), thread_name_prefix="drg-compare"
+        ) as pool:
+            futures = {v: pool.submit(group, v) for v in versions}
+
+    results: Dict[str, Optional[GrouperResult]] = {}
+    errors: Dict[str, str] = {}
+    for version in versions:
+        try:
+            future = futures.get(version)
+            results[version] = future.result() if future else group(version)
+        except Exception as e:
+            results[version] = None
+            errors[version] = str(e) or type(e).__name__
+    return VersionComparison(results, errors)
+
+
+class CompareWriter:
+    """
+    Incremental writer for case-file comparisons
+
+    JSONL rows: kept input columns, "case" (1-based case number), "changed"
+    (differing fields) and one object per version with the compared fields.
+    CSV rows: kept columns, "case", "changed" and one "<field>@<version>"
+    column per field and version.
+
+    Args:
+        stream: Text stream to write to
+        fmt: 'csv' or 'jsonl'
+        versions: (base, other) version names
+        fields: Compared result fields
+        keep: Input columns copied through to each output row
+        diff_only: Write only changed cases (JSONL rows then carry only the
+            changed fields)
+        list_sep: Separator for list fields in CSV output
+    """
+
+    def __init__(
+        self,
+        stream: IO[str],
+        fmt: str,
+        versions: Sequence[str],
+        fields: Sequence[str] = COMPARE_FIELDS,
+        keep: Sequence[str] = (),
+        diff_only: bool = False,
+        list_sep: str = ",",
+    ):
+        unknown = [f for f in fields if f not in RESULT_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown result fields: {unknown}")
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format {fmt!r}. Available: {list(FORMATS)}")
+        self.stream = stream
+        self.fmt = fmt
+        self.versions = list(versions)
+        self.fields = list(fields)
+        self.keep = list(keep)
+        self.diff_only = diff_only
+        self.list_sep = list_sep
+        self.count = 0
+        self.changed = 0
+        self._csv = None
+        if fmt == "csv":
+            self._csv = csv.writer(stream)
+            header = self.keep + ["case", "changed"]
+            header += [f"{name}@{v}" for name in self.fields for v in self.versions]
+            self._csv.writerow(header)
+
+    def _cell(self, value):
+        return self.list_sep.join(value) if isinstance(value, list) else value
+
+    def write(self, number: int, record: Mapping, values: Mapping[str, Mapping[str, Any]]):
+        """Write one case: values is version -> field -> value"""
+        self.count += 1
+        diff = diff_values(values, self.fields)
+        if diff:
+            self.changed += 1
+        elif self.diff_only:
+            return
+        kept = [record.get(k) for k in self.keep]
+        if self._csv is not None:
+            row = kept + [number, self.list_sep.join(diff)]
+            row += [self._cell(values[v][name]) for name in self.fields for v in self.versions]
+            self._csv.writerow(row)
+            return
+        shown = list(diff) if self.diff_only else self.fields
+        row = dict(zip(self.keep, kept))
+        row["case"] = number
+        row["changed"] = list(diff)
+        for v in self.versions:
+            row[v] = {name: values[v][name] for name in shown}
+        self.stream.write(json.dumps(row, ensure_ascii=False))
+        self.stream.write("\n")
+
+
+def paired_columns(
+    base: ParallelGrouper, other: ParallelGrouper, cases: Iterable[dict]
+) -> Iterator[tuple]:
+    """
+    Group one case stream under two engines chunk by chunk
+
+    Yields (base columns, other columns) per chunk, in input order. Both
+    engines read the same chunks, so at most their in-flight chunks are
+    buffered between them.
+    """
+    left, right = itertools.tee(cases)
+    return zip(base.imap_columns(left), other.imap_columns(right))
+
+
+def compare_stream(
+    base: ParallelGrouper, other: ParallelGrouper, cases: Iterable[dict], writer: CompareWriter
+) -> Dict[str, float]:
+    """
+    Compare a stream of cases (as from fileio.read_cases) between two engines
+
+    Returns a summary: cases compared, cases changed, elapsed seconds and
+    cases per second.
+    """
+    records = deque()
+
+    def feed() -> Iterator[dict]:
+        for case in cases:
+            records.append(case.pop("_record", {}))
+            yield case
+
+    start = time.perf_counter()
+    number = 0
+    names = (base.version, other.version)
+    for columns in paired_columns(base, other, feed()):
+        for i in range(len(columns[0]["drg"])):
+            number += 1
+            values = {
+                name: {f: out[f][i] for f in writer.fields} for name, out in zip(names, columns)
+            }
+            writer.write(number, records.popleft(), values)
+    elapsed = time.perf_counter() - start
+    return {
+        "cases": writer.count,
+        "changed": writer.changed,
+        "seconds": elapsed,
+        "cases_per_sec": writer.count / elapsed if elapsed > 0 else 0.0,
+    }
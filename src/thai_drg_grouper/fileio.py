@@ -0,0 +1,226 @@
+"""
+Thai DRG Grouper - Streaming Case Files
+
+Readers and writers for CSV and JSONL (one JSON object per line) discharge
+files. Cases are read lazily and results written as each chunk is grouped, so
+memory use stays flat regardless of file size.
+"""
+
+import csv
+import json
+import time
+from collections import deque
+from typing import IO, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+
+from .parallel import ParallelGrouper
+from .types import RESULT_FIELDS
+
+FORMATS = ("csv", "jsonl")
+
+# Case fields read from input records
+CASE_FIELDS = ("pdx", "sdx", "procedures", "age", "sex", "los")
+
+_INT_FIELDS = ("age", "los")
+
+
+def detect_format(path: Optional[str], default: str = "jsonl") -> str:
+    """Guess the file format from its extension"""
+    if path and path != "-":
+        lower = path.lower()
+        if lower.endswith(".csv"):
+            return "csv"
+        if lower.endswith((".jsonl", ".ndjson", ".json")):
+            return "jsonl"
+    return default
+
+
+def parse_column_map(spec: Optional[str]) -> Dict[str, List[str]]:
+    """
+    Parse "field=COLUMN,..." into a case field -> source columns mapping
+
+    Several source columns are joined with "+", e.g. "sdx=DIAG2+DIAG3".
+    """
+    mapping = {}
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        field, sep, columns = item.partition("=")
+        field = field.strip()
+        if not sep or field not in CASE_FIELDS:
+            raise ValueError(f"Invalid column mapping {item!r}. Fields: {list(CASE_FIELDS)}")
+        mapping[field] = [c.strip() for c in columns.split("+") if c.strip()]
+    return mapping
+
+
+class BadRecord(ValueError):
+    """An input record that cannot be turned into a case"""
+
+    def __init__(self, line: int, message: str):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+
+
+def _to_list(value, list_sep: str) -> List[str]:
+    if value is None or value == "":
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in str(value).split(list_sep) if v.strip()]
+
+
+def _to_int(value) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"not a number: {value!r}")
+    if isinstance(value, (int, float)):
+        return int(value)
+    return int(float(str(value).strip()))
+
+
+def _to_case(record: Mapping, columns: Mapping[str, List[str]], list_sep: str) -> dict:
+    case = {}
+    for field in CASE_FIELDS:
+        sources = columns.get(field, [field])
+        if field in ("sdx", "procedures"):
+            case[field] = [c for src in sources for c in _to_list(record.get(src), list_sep)]
+            continue
+        value = record.get(sources[0]) if sources else None
+        if field in _INT_FIELDS:
+            try:
+                value = _to_int(value)
+            except ValueError:
+                raise ValueError(f"invalid {field}: {value!r}") from None
+            if field == "los" and value is None:
+                value = 1
+        elif value is not None:
+            value = str(value).strip() or None
+        case[field] = value
+    if not case["pdx"]:
+        raise ValueError("missing pdx")
+    return case
+
+
+def _raw_records(stream: IO[str], fmt: str) -> Iterator[Tuple[int, Union[str, dict]]]:
+    """Yield (line number, CSV row dict or unparsed JSONL line)"""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == "jsonl":
+        for line_no, line in enumerate(stream, 1):
+            if line.strip():
+                yield line_no, line
+    else:
+        raise ValueError(f"Unknown format {fmt!r}. Available: {list(FORMATS)}")
+
+
+def read_cases(
+    stream: IO[str],
+    fmt: str,
+    columns: Optional[Mapping[str, List[str]]] = None,
+    list_sep: str = ",",
+    errors: Optional[List[BadRecord]] = None,
+) -> Iterator[dict]:
+    """
+    Lazily read cases from a CSV or JSONL stream
+
+    Every case carries its raw record under "_record". Records that cannot be
+    parsed are skipped and appended to ``errors`` (raised if it is None).
+    """
+    columns = columns or {}
+    for line_no, raw in _raw_records(stream, fmt):
+        try:
+            record = json.loads(raw) if isinstance(raw, str) else raw
+            if not isinstance(record, dict):
+                raise ValueError("record is not an object")
+            case = _to_case(record, columns, list_sep)
+        except ValueError as e:
+            if errors is None:
+                raise BadRecord(line_no, str(e)) from None
+            errors.append(BadRecord(line_no, str(e)))
+            continue
+        case["_record"] = record
+        yield case
+
+
+class ResultWriter:
+    """
+    Incremental CSV/JSONL result writer
+
+    Args:
+        stream: Text stream to write to
+        fmt: 'csv' or 'jsonl'
+        fields: Result fields to write (default: all GrouperResult fields)
+        keep: Input columns copied through to each output row (e.g. an AN)
+        list_sep: Separator for list fields in CSV output
+    """
+
+    def __init__(
+        self,
+        stream: IO[str],
+        fmt: str,
+        fields: Optional[Sequence[str]] = None,
+        keep: Sequence[str] = (),
+        list_sep: str = ",",
+    ):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format {fmt!r}. Available: {list(FORMATS)}")
+        all_fields = list(RESULT_FIELDS)
+        self.fields = list(fields or all_fields)
+        unknown = [f for f in self.fields if f not in all_fields]
+        if unknown:
+            raise ValueError(f"Unknown result fields: {unknown}")
+        self.keep = list(keep)
+        self.stream = stream
+        self.fmt = fmt
+        self.list_sep = list_sep
+        self.count = 0
+        self._csv = None
+        if fmt == "csv":
+            self._csv = csv.writer(stream)
+            self._csv.writerow(self.keep + self.fields)
+
+    def write_columns(self, out: Mapping[str, list], records: Sequence[Mapping]):
+        """Write one chunk of columnar group_many() output"""
+        columns = [out[f] for f in self.fields]
+        for i, record in enumerate(records):
+            kept = [record.get(k) for k in self.keep]
+            values = [column[i] for column in columns]
+            if self._csv is not None:
+                self._csv.writerow(
+                    kept + [self.list_sep.join(v) if isinstance(v, list) else v for v in values]
+                )
+            else:
+                row = dict(zip(self.keep, kept))
+                row.update(zip(self.fields, values))
+                self.stream.write(json.dumps(row, ensure_ascii=False))
+                self.stream.write("\n")
+        self.count += len(records)
+
+
+def group_stream(
+    engine: ParallelGrouper, cases: Iterable[dict], writer: ResultWriter
+) -> Dict[str, float]:
+    """
+    Group a stream of cases chunk by chunk and write results as they arrive
+
+    Returns a summary: cases written, elapsed seconds and cases per second.
+    """
+    records = deque()
+
+    def feed() -> Iterator[dict]:
+        for case in cases:
+            records.append(case.pop("_record", {}))
+            yield case
+
+    start = time.perf_counter()
+    for out in engine.imap_columns(feed()):
+        n = len(out["drg"])
+        writer.write_columns(out, [records.popleft() for _ in range(n)])
+    elapsed = time.perf_counter() - start
+    return {
+        "cases": writer.count,
+        "seconds": elapsed,
+        "cases_per_sec": writer.count / elapsed if elapsed > 0 else 0.0,
+    }
@@ -2,16 +2,141 @@
 Thai DRG Grouper - Core Grouper Class
 """
 
-import os
+import struct
+import sys
 from datetime import datetime
-from typing import Dict, List, Optional, Set, Tuple
+from operator import itemgetter
+from typing import Collection, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from .cache import LRUCache
+from .catalog import DRGCatalog
+from .profiling import StageProfiler, instrument, uninstrument
+from .regroup import CaseDiff, RegroupResult, regroup_case
+from .snapshot import (
+    Tables,
+    compile_snapshot,
+    decode_section,
+    find_dbf_files,
+    is_snapshot_fresh,
+    load_snapshot,
+    read_dbf_tables,
+    write_snapshot,
+)
+from .tables import CCExclusionIndex, CompactICD10Table, CompactProcTable, MappedTables
+from .types import MDC_NAMES, RESULT_FIELDS, GrouperResult
+
+# Input columns accepted by ThaiDRGGrouper.group_many
+_CASE_COLUMNS = ("pdx", "sdx", "procedures", "age", "sex", "los")
+
+_UNGROUPABLE_DRG = {
+    "drg": "26509",
+    "name": "Ungroupable",
+    "rw": 0,
+    "rw0d": 0,
+    "wtlos": 0,
+    "ot": 0,
+    "mdc": "26",
+}
+
+# GrouperResult fields that depend only on the cached case signature
+_CACHED_FIELDS = (
+    "mdc",
+    "mdc_name",
+    "dc",
+    "drg",
+    "drg_name",
+    "rw",
+    "rw0d",
+    "wtlos",
+    "ot",
+    "pcl",
+    "has_or_procedure",
+    "is_surgical",
+    "is_valid",
+)
+
+
+def _as_list(column) -> list:
+    """Plain list from a list/tuple/NumPy column (NumPy scalars become Python values)"""
+    return column.tolist() if hasattr(column, "tolist") else list(column)
+
+
+def _deep_sizeof(roots: Sequence, seen: set) -> int:
+    """Bytes held by containers and their contents, each object counted once"""
+    total = 0
+    stack = list(roots)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif isinstance(obj, Mapping) and hasattr(obj, "__dict__"):
+            stack.append(vars(obj))  # compact tables: their columns and indexes
+        elif hasattr(type(obj), "__slots__"):
+            stack.extend(getattr(obj, name) for name in type(obj).__slots__)
+    return total
+
+
+def normalize_icd(code: str) -> str:
+    """
+    ICD-10 code without dots and spaces, upper-cased and stripped
+
+    Codes that are already normalized (ASCII letters and digits, no lower
+    case) are returned as they are, without building any new string.
+    """
+    if code.isascii() and code.isalnum() and (code.isupper() or code.isdigit()):
+        return code
+    return code.replace(".", "").replace(" ", "").upper().strip()
+
 
-from .types import MDC_NAMES, GrouperResult
+def normalize_proc(code: str) -> str:
+    """Procedure code without dots and spaces, stripped (returned as is if already so)"""
+    if code.isascii() and code.isalnum():
+        return code
+    return code.replace(".", "").replace(" ", "").strip()
+
+
+class _Case:
+    """
+    One case flowing through group(): its codes, their normalized forms and,
+    once resolved, their table records, so every stage reads each code's
+    record instead of looking it up again
+    """
 
-try:
-    from dbfread import DBF
-except ImportError:
-    raise ImportError("Please install dbfread: pip install dbfread")
+    __slots__ = (
+        "pdx",
+        "pdx_norm",
+        "sdx",
+        "sdx_norms",
+        "procedures",
+        "proc_norms",
+        "pdx_info",
+        "sdx_infos",
+        "has_or",
+    )
+
+    def __init__(self, pdx, pdx_norm, sdx, sdx_norms, procedures, proc_norms):
+        self.pdx = pdx
+        self.pdx_norm = pdx_norm
+        self.sdx = sdx
+        self.sdx_norms = sdx_norms
+        self.procedures = procedures
+        self.proc_norms = proc_norms
+        self.pdx_info: Optional[Mapping] = None
+        self.sdx_infos: List[Optional[Mapping]] = []
+        self.has_or = False
+
+    def unresolved(self) -> "_Case":
+        """Copy with the same codes and normalized forms but no records yet"""
+        return _Case(
+            self.pdx, self.pdx_norm, self.sdx, self.sdx_norms, self.procedures, self.proc_norms
+        )
 
 
 class ThaiDRGGrouper:
@@ -21,165 +146,244 @@ class ThaiDRGGrouper:
     Args:
         dbf_path: Path to folder containing .dbf files
         version: Version string (e.g., '6.3')
+        use_snapshot: Load from (and maintain) the compiled table snapshot
+            next to the .dbf files instead of parsing them every time
+        backend: 'memory' builds per-process lookup dicts; 'mmap' probes the
+            snapshot in place so all processes share one copy of the tables
+        cache_size: Keep the results of up to this many distinct cases in an
+            LRU cache for group() (0 disables it)
+        profile: Record per-stage timings and lookup counters, reported by
+            get_stats() (see enable_profiling)
 
     Example:
         grouper = ThaiDRGGrouper('./data/6.3', '6.3')
         result = grouper.group(pdx='S82201D', los=5)
     """
 
-    def __init__(self, dbf_path: str, version: str = "unknown"):
+    BACKENDS = ("memory", "mmap")
+
+    def __init__(
+        self,
+        dbf_path: str,
+        version: str = "unknown",
+        use_snapshot: bool = True,
+        backend: str = "memory",
+        cache_size: int = 0,
+        profile: bool = False,
+    ):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}. Available: {list(self.BACKENDS)}")
         self.dbf_path = dbf_path
         self.version = version
+        self.use_snapshot = use_snapshot
+        self.backend = backend
 
-        self._icd10_data: Dict[str, dict] = {}
-        self._proc_data: Dict[str, dict] = {}
+        self._icd10_data: Mapping[str, dict] = {}
+        self._proc_data: Mapping[str, dict] = {}
         self._drg_data: Dict[str, List[dict]] = {}
-        self._cc_exclusions: Dict[str, Set[str]] = {}
+        self._dc_table: Dict[Tuple[str, str, bool], str] = {}
+        self._drg_index: Dict[str, dict] = {}
+        self._catalog: Optional[DRGCatalog] = None
+        self._cc_exclusions: Mapping[str, Collection[str]] = {}
+        self._mapped: Optional[MappedTables] = None
+        self._cc_index = None
+        self._result_cache = LRUCache(cache_size) if cache_size > 0 else None
+        self._heap_bytes: Optional[int] = None
+        self._profiler: Optional[StageProfiler] = None
 
         self._load_data()
+        if profile:
+            self.enable_profiling()
 
     def _find_dbf_files(self) -> Dict[str, Optional[str]]:
         """Find .dbf files"""
-        dbf_files = {"i10": None, "proc": None, "drg": None, "ccex": None}
-
-        for f in os.listdir(self.dbf_path):
-            fl = f.lower()
-            if fl.endswith(".dbf"):
-                if "i10" in fl:
-                    dbf_files["i10"] = f
-                elif "proc" in fl:
-                    dbf_files["proc"] = f
-                elif "drg" in fl and "ccex" not in fl:
-                    dbf_files["drg"] = f
-                elif "ccex" in fl or ("cc" in fl and "drg" not in fl):
-                    dbf_files["ccex"] = f
-
-        return dbf_files
+        return find_dbf_files(self.dbf_path)
 
     def _load_data(self):
-        """Load .dbf files"""
-        dbf_files = self._find_dbf_files()
-
-        # Load ICD-10
-        if dbf_files["i10"]:
-            for rec in DBF(os.path.join(self.dbf_path, dbf_files["i10"]), encoding="cp874"):
-                code = rec["CODE"].strip().upper()
-                self._icd10_data[code] = {
-                    "mdc": rec["MDC"].strip(),
-                    "pdc": rec["PDC"].strip(),
-                    "cc": bool(rec.get("CC")),
-                    "maincc": (rec.get("MAINCC") or "").strip(),
-                    "dclmain": (rec.get("DCLMAIN") or "").strip(),
-                    "trauma": str(rec.get("TRAUMA", "")).strip() == "T",
-                    "ccrow": rec.get("CCROW") or 0,
+        """Load tables from the compiled snapshot, or from .dbf files if it is stale"""
+        self.clear_cache()
+        self._heap_bytes = None
+        if self.backend == "mmap":
+            self._load_mapped()
+            return
+        tables = load_snapshot(self.dbf_path) if self.use_snapshot else None
+        if tables is None:
+            tables = read_dbf_tables(self.dbf_path)
+            if self.use_snapshot:
+                try:
+                    write_snapshot(self.dbf_path, tables)
+                except (OSError, ValueError, struct.error):
+                    pass  # read-only folder or unencodable data: keep using the .dbf files
+        self._build_tables(tables)
+
+    def _load_mapped(self):
+        """Map the snapshot (compiling it first if needed) and probe it in place"""
+        if not is_snapshot_fresh(self.dbf_path):
+            try:
+                compile_snapshot(self.dbf_path)
+            except OSError as e:
+                raise OSError(
+                    f"Cannot write the table snapshot for version {self.version} in "
+                    f"{self.dbf_path} ({e}). The mmap backend needs a compiled snapshot: "
+                    "run 'thai-drg-grouper compile' where the folder is writable, "
+                    "or use backend='memory'"
+                ) from e
+        self._mapped = MappedTables(self.dbf_path)
+        self._icd10_data = self._mapped.icd10
+        self._proc_data = self._mapped.proc
+        self._cc_exclusions = self._mapped.ccex
+        self._cc_index = self._mapped.ccex
+        # DRG definitions are small and walked per DC, so they stay as dicts
+        self._build_drg(decode_section(self._mapped.buffer, self._mapped.meta, "drg"))
+
+    def _build_tables(self, tables: Tables):
+        """Build the compact lookup tables from compiled tables"""
+        icd10_rows = tables["icd10"]
+        self._icd10_data = CompactICD10Table(icd10_rows, tables["icd10_alias"])
+        self._proc_data = CompactProcTable(tables["proc"])
+
+        self._build_drg(tables["drg"])
+        for mdc, pdc in {(row[1], row[2]) for row in icd10_rows}:
+            for has_or in (False, True):
+                self._dc_table[(mdc, pdc, has_or)] = self._search_dc(mdc, pdc, has_or)
+
+        exclusions: Dict[str, List[str]] = {}
+        for cc, notfor in tables["ccex"]:
+            exclusions.setdefault(cc, []).append(notfor)
+        self._cc_index = self._cc_exclusions = CCExclusionIndex(exclusions)
+
+    def _build_drg(self, rows: List[tuple]):
+        for dc, mdc, drg, rw, rw0d, wtlos, ot, name in rows:
+            if dc not in self._drg_data:
+                self._drg_data[dc] = []
+            self._drg_data[dc].append(
+                {
+                    "mdc": mdc,
+                    "drg": drg,
+                    "rw": rw,
+                    "rw0d": rw0d,
+                    "wtlos": wtlos,
+                    "ot": ot,
+                    "name": name,
                 }
-                if len(code) > 4:
-                    for length in [5, 4, 3]:
-                        base = code[:length]
-                        if base not in self._icd10_data:
-                            self._icd10_data[base] = self._icd10_data[code]
-
-        # Load Procedures
-        if dbf_files["proc"]:
-            for rec in DBF(os.path.join(self.dbf_path, dbf_files["proc"]), encoding="cp874"):
-                code = str(rec["CODE"]).strip()
-                self._proc_data[code] = {
-                    "orp": str(rec.get("ORP", "")).strip().upper() == "Y",
-                    "desc": str(rec.get("DESC", "")).strip(),
-                }
-                if len(code) == 4 and code.isdigit():
-                    self._proc_data[f"{code[:2]}.{code[2:]}"] = self._proc_data[code]
-
-        # Load DRG
-        if dbf_files["drg"]:
-            for rec in DBF(os.path.join(self.dbf_path, dbf_files["drg"]), encoding="cp874"):
-                dc = rec["DC"].strip()
-                if dc not in self._drg_data:
-                    self._drg_data[dc] = []
-                self._drg_data[dc].append(
-                    {
-                        "mdc": rec["MDC"].strip(),
-                        "drg": rec["DRG"].strip(),
-                        "rw": float(rec.get("RW") or 0),
-                        "rw0d": float(rec.get("RW0D") or 0),
-                        "wtlos": float(rec.get("WTLOS") or 0),
-                        "ot": int(rec.get("OT") or 0),
-                        "name": str(rec.get("DRGNAME") or "").strip(),
-                    }
-                )
-
-        # Load CC Exclusions
-        if dbf_files["ccex"]:
-            for rec in DBF(os.path.join(self.dbf_path, dbf_files["ccex"]), encoding="cp874"):
-                cc = rec["CC10"].strip().upper()
-                notfor = rec["NOTFOR10"].strip().upper()
-                if cc not in self._cc_exclusions:
-                    self._cc_exclusions[cc] = set()
-                self._cc_exclusions[cc].add(notfor)
+            )
+        # _find_drg picks by position in the DRG-code order
+        for drgs in self._drg_data.values():
+            drgs.sort(key=itemgetter("drg"))
+            for d in drgs:
+                self._drg_index.setdefault(d["drg"], d)
+        self._dc_table.clear()
 
     def _normalize_icd(self, code: str) -> str:
-        return code.replace(".", "").replace(" ", "").upper().strip()
+        return normalize_icd(code)
 
     def _normalize_proc(self, code: str) -> str:
-        return code.replace(".", "").replace(" ", "").strip()
+        return normalize_proc(code)
+
+    def _normalize_case(self, pdx: str, sdx: List[str], procedures: List[str]) -> _Case:
+        """Normalize every code of a case once, for all grouping stages"""
+        normalize_icd, normalize_proc = self._normalize_icd, self._normalize_proc
+        return _Case(
+            pdx,
+            normalize_icd(pdx),
+            sdx,
+            [normalize_icd(code) for code in sdx],
+            procedures,
+            [normalize_proc(code) for code in procedures],
+        )
+
+    def _resolve_case(self, case: _Case) -> bool:
+        """
+        Look up the records of a normalized case, each code once
+
+        Returns:
+            False if the PDx is unknown (SDx and procedures are then left
+            unresolved, as grouping stops there)
+        """
+        case.pdx_info = self._lookup_icd10(case.pdx_norm)
+        if not case.pdx_info:
+            return False
+        case.sdx_infos = self._lookup_icd10_many(case.sdx_norms)
+        # Procedures only matter as OR flags: stop at the first OR procedure
+        case.has_or = any(info and info["orp"] for info in map(self._lookup_proc, case.proc_norms))
+        return True
 
     def _get_icd10_info(self, code: str) -> Optional[dict]:
-        normalized = self._normalize_icd(code)
-        if normalized in self._icd10_data:
-            return self._icd10_data[normalized]
-        for length in [6, 5, 4, 3]:
-            if len(normalized) >= length:
-                short = normalized[:length]
-                if short in self._icd10_data:
-                    return self._icd10_data[short]
-        return None
+        return self._lookup_icd10(self._normalize_icd(code))
+
+    def _lookup_icd10(self, normalized: str) -> Optional[dict]:
+        """Info of a normalized code, or of its longest known truncation prefix"""
+        return self._icd10_data.lookup(normalized)
+
+    def _lookup_icd10_many(self, normalized: List[str]) -> List[Optional[dict]]:
+        """_lookup_icd10 of a list of normalized codes in one call"""
+        return self._icd10_data.lookup_many(normalized)
 
     def _get_proc_info(self, code: str) -> Optional[dict]:
-        normalized = self._normalize_proc(code)
-        if normalized in self._proc_data:
-            return self._proc_data[normalized]
-        if len(normalized) < 4:
-            padded = normalized.zfill(4)
-            if padded in self._proc_data:
-                return self._proc_data[padded]
-        return None
+        return self._lookup_proc(self._normalize_proc(code))
+
+    def _lookup_proc(self, normalized: str) -> Optional[dict]:
+        info = self._proc_data.get(normalized)
+        if info is None and len(normalized) < 4:
+            info = self._proc_data.get(normalized.zfill(4))
+        return info
 
     def _is_valid_cc(self, cc_code: str, pdx_code: str) -> bool:
-        cc_info = self._get_icd10_info(cc_code)
+        cc_norm = self._normalize_icd(cc_code)
+        cc_info = self._lookup_icd10(cc_norm)
         if not cc_info or not cc_info["cc"]:
             return False
-        maincc = cc_info["maincc"] or self._normalize_icd(cc_code)
-        pdx_norm = self._normalize_icd(pdx_code)
-        if maincc in self._cc_exclusions:
-            for excl in self._cc_exclusions[maincc]:
-                if pdx_norm.startswith(excl) or excl.startswith(pdx_norm[:3]):
-                    return False
-        return True
+        return not self._is_excluded(cc_info["maincc"] or cc_norm, self._normalize_icd(pdx_code))
+
+    def _is_excluded(self, maincc: str, pdx_norm: str) -> bool:
+        """True if any exclusion code of maincc is a prefix of the PDx or starts with its
+        first three characters (answered by the precomputed index, not a scan)"""
+        return self._cc_index.excludes(maincc, pdx_norm)
+
+    def _cc_level(self, sdx_norm: str, pdx_norm: str) -> Optional[str]:
+        """'mcc', 'cc' or None for a normalized SDx against a normalized PDx"""
+        return self._classify_cc(self._lookup_icd10(sdx_norm), sdx_norm, pdx_norm)
 
-    def _calculate_pcl(self, pdx: str, sdx_list: List[str]) -> Tuple[int, List[str], List[str]]:
+    def _classify_cc(self, info: Optional[dict], sdx_norm: str, pdx_norm: str) -> Optional[str]:
+        """_cc_level for an SDx already looked up"""
+        if not info or not info["cc"] or self._is_excluded(info["maincc"] or sdx_norm, pdx_norm):
+            return None
+        return "mcc" if (info.get("ccrow", 0) or 0) >= 3 else "cc"
+
+    def _calculate_pcl(self, case: _Case) -> Tuple[int, List[str], List[str]]:
+        """PCL and CC/MCC lists of a resolved case"""
         valid_ccs, valid_mccs = [], []
-        for sdx in sdx_list:
-            if self._is_valid_cc(sdx, pdx):
-                info = self._get_icd10_info(sdx)
-                if info:
-                    if (info.get("ccrow", 0) or 0) >= 3:
-                        valid_mccs.append(sdx)
-                    else:
-                        valid_ccs.append(sdx)
-        if valid_mccs:
-            pcl = min(4, 2 + len(valid_mccs))
-        elif valid_ccs:
-            pcl = min(2, len(valid_ccs))
-        else:
-            pcl = 0
-        return pcl, valid_ccs, valid_mccs
+        pdx_norm = case.pdx_norm
+        for sdx, sdx_norm, info in zip(case.sdx, case.sdx_norms, case.sdx_infos):
+            level = self._classify_cc(info, sdx_norm, pdx_norm)
+            if level == "mcc":
+                valid_mccs.append(sdx)
+            elif level == "cc":
+                valid_ccs.append(sdx)
+        return self._pcl(len(valid_ccs), len(valid_mccs)), valid_ccs, valid_mccs
+
+    @staticmethod
+    def _pcl(cc_count: int, mcc_count: int) -> int:
+        if mcc_count:
+            return min(4, 2 + mcc_count)
+        if cc_count:
+            return min(2, cc_count)
+        return 0
 
     def _find_dc(self, pdx: str, has_or: bool) -> str:
-        pdx_info = self._get_icd10_info(pdx)
+        return self._resolve_dc(self._get_icd10_info(pdx), has_or)
+
+    def _resolve_dc(self, pdx_info: Optional[dict], has_or: bool) -> str:
         if not pdx_info:
             return "2650"
-        mdc = pdx_info["mdc"]
-        pdc = pdx_info["pdc"]
+        key = (pdx_info["mdc"], pdx_info["pdc"], has_or)
+        dc = self._dc_table.get(key)
+        if dc is None:
+            dc = self._dc_table[key] = self._search_dc(*key)
+        return dc
+
+    def _search_dc(self, mdc: str, pdc: str, has_or: bool) -> str:
+        """Resolve the DC for an (mdc, pdc, has_or) combination against the DRG table"""
         if pdc:
             pdc_letter = pdc[-1] if pdc[-1].isalpha() else "A"
             pdc_num = ord(pdc_letter.upper()) - ord("A")
@@ -203,16 +407,8 @@ class ThaiDRGGrouper:
 
     def _find_drg(self, dc: str, pcl: int) -> dict:
         if dc not in self._drg_data:
-            return {
-                "drg": "26509",
-                "name": "Ungroupable",
-                "rw": 0,
-                "rw0d": 0,
-                "wtlos": 0,
-                "ot": 0,
-                "mdc": "26",
-            }
-        drgs = sorted(self._drg_data[dc], key=lambda x: x["drg"])
+            return dict(_UNGROUPABLE_DRG)
+        drgs = self._drg_data[dc]
         return drgs[min(pcl, len(drgs) - 1)]
 
     def _calculate_adjrw(
@@ -240,48 +436,138 @@ class ThaiDRGGrouper:
         """Group a patient case into DRG"""
         sdx = sdx or []
         procedures = procedures or []
-        errors, warnings = [], []
-
-        # Validate Age (Error Code 6) - must be checked first
+        # Validate Age (Error Code 6) - must be checked first, before any code is read
         if age is None or age < 0 or age > 124:
-            error_msg = "No age" if age is None else f"Invalid age: {age}"
-            errors.append(error_msg)
-            return GrouperResult(
-                version=self.version,
-                pdx=pdx,
-                sdx=sdx,
-                procedures=procedures,
-                age=age,
-                sex=sex,
-                los=los,
-                mdc="26",
-                mdc_name="Ungroupable",
-                dc="2653",
-                drg="26539",
-                drg_name="Age error",
-                rw=0,
-                rw0d=0,
-                adjrw=0,
-                wtlos=0,
-                ot=0,
-                pcl=0,
-                cc_list=[],
-                mcc_list=[],
-                has_or_procedure=False,
-                is_surgical=False,
-                los_status="normal",
-                is_valid=False,
-                errors=errors,
-                warnings=warnings,
-                grouped_at=datetime.now().isoformat(),
+            return self._age_error(pdx, sdx, procedures, age, sex, los)
+        return self._group_normalized(self._normalize_case(pdx, sdx, procedures), age, sex, los)
+
+    def _group_normalized(
+        self,
+        case: _Case,
+        age: int,
+        sex: Optional[str],
+        los: int,
+    ) -> GrouperResult:
+        """group() of a case from _normalize_case (of any version) with a valid age"""
+        if self._result_cache is not None:
+            return self._group_cached(case, age, sex, los)
+        return self._group_case(case, age, sex, los)
+
+    def _group_cached(
+        self,
+        case: _Case,
+        age: int,
+        sex: Optional[str],
+        los: int,
+    ) -> GrouperResult:
+        """
+        group() through the result cache
+
+        The key is the normalized PDx, the sorted SDx codes and the set of
+        procedure codes; age (already valid), sex and LOS are left out because
+        they only feed the warnings and adjrw, which are rebuilt per call along
+        with the echoed inputs and the CC/MCC lists in the caller's order.
+        """
+        pdx, sdx, procedures = case.pdx, case.sdx, case.procedures
+        sdx_norm = case.sdx_norms
+        key = (case.pdx_norm, tuple(sorted(sdx_norm)), frozenset(case.proc_norms))
+        entry = self._result_cache.get(key)
+        if entry is None:
+            result = self._group_case(case, age, sex, los)
+            core = {name: getattr(result, name) for name in _CACHED_FIELDS}
+            cc_codes, mcc_codes = set(result.cc_list), set(result.mcc_list)
+            ccs = frozenset(norm for code, norm in zip(sdx, sdx_norm) if code in cc_codes)
+            mccs = frozenset(norm for code, norm in zip(sdx, sdx_norm) if code in mcc_codes)
+            self._result_cache.put(key, (core, ccs, mccs))
+            return result
+
+        core, ccs, mccs = entry
+        warnings = []
+        if sex is None or sex not in ["M", "F", "1", "2"]:
+            warnings.append(f"Missing or invalid sex: {sex}")
+        if core["is_valid"]:
+            errors = []
+            adjrw, los_status = self._calculate_adjrw(
+                core["rw"], core["rw0d"], core["wtlos"], core["ot"], los
             )
+        else:
+            errors = [f"Invalid PDx: {pdx}"]
+            adjrw, los_status = 0, "normal"
+        return GrouperResult(
+            version=self.version,
+            pdx=pdx,
+            sdx=sdx,
+            procedures=procedures,
+            age=age,
+            sex=sex,
+            los=los,
+            adjrw=adjrw,
+            cc_list=[code for code, norm in zip(sdx, sdx_norm) if norm in ccs],
+            mcc_list=[code for code, norm in zip(sdx, sdx_norm) if norm in mccs],
+            los_status=los_status,
+            errors=errors,
+            warnings=warnings,
+            grouped_at=datetime.now().isoformat(),
+            **core,
+        )
+
+    def _age_error(
+        self,
+        pdx: str,
+        sdx: List[str],
+        procedures: List[str],
+        age: Optional[int],
+        sex: Optional[str],
+        los: int,
+    ) -> GrouperResult:
+        """Result of a case with a missing or invalid age (its codes are not read)"""
+        errors = ["No age" if age is None else f"Invalid age: {age}"]
+        return GrouperResult(
+            version=self.version,
+            pdx=pdx,
+            sdx=sdx,
+            procedures=procedures,
+            age=age,
+            sex=sex,
+            los=los,
+            mdc="26",
+            mdc_name="Ungroupable",
+            dc="2653",
+            drg="26539",
+            drg_name="Age error",
+            rw=0,
+            rw0d=0,
+            adjrw=0,
+            wtlos=0,
+            ot=0,
+            pcl=0,
+            cc_list=[],
+            mcc_list=[],
+            has_or_procedure=False,
+            is_surgical=False,
+            los_status="normal",
+            is_valid=False,
+            errors=errors,
+            warnings=[],
+            grouped_at=datetime.now().isoformat(),
+        )
+
+    def _group_case(
+        self,
+        case: _Case,
+        age: int,
+        sex: Optional[str],
+        los: int,
+    ) -> GrouperResult:
+        """Group a normalized case with a valid age"""
+        pdx, sdx, procedures = case.pdx, case.sdx, case.procedures
+        errors, warnings = [], []
 
         # Validate Sex (Warning Code 32)
         if sex is None or sex not in ["M", "F", "1", "2"]:
             warnings.append(f"Missing or invalid sex: {sex}")
 
-        pdx_info = self._get_icd10_info(pdx)
-        if not pdx_info:
+        if not self._resolve_case(case):
             errors.append(f"Invalid PDx: {pdx}")
             return GrouperResult(
                 version=self.version,
@@ -313,10 +599,10 @@ class ThaiDRGGrouper:
                 grouped_at=datetime.now().isoformat(),
             )
 
-        mdc = pdx_info["mdc"]
-        has_or = any(self._get_proc_info(p) and self._get_proc_info(p)["orp"] for p in procedures)
-        pcl, cc_list, mcc_list = self._calculate_pcl(pdx, sdx)
-        dc = self._find_dc(pdx, has_or)
+        mdc = case.pdx_info["mdc"]
+        has_or = case.has_or
+        pcl, cc_list, mcc_list = self._calculate_pcl(case)
+        dc = self._resolve_dc(case.pdx_info, has_or)
         drg_info = self._find_drg(dc, pcl)
         adjrw, los_status = self._calculate_adjrw(
             drg_info["rw"], drg_info["rw0d"], drg_info["wtlos"], drg_info["ot"], los
@@ -353,19 +639,242 @@ class ThaiDRGGrouper:
             grouped_at=datetime.now().isoformat(),
         )
 
+    def regroup(
+        self,
+        previous: GrouperResult,
+        diff: Optional[CaseDiff] = None,
+        verify: bool = False,
+        **edits,
+    ) -> RegroupResult:
+        """
+        Regroup a corrected case from its previous result
+
+        Only the stages the edits affect are rerun: SDx edits redo the PCL
+        (looking up just the added SDx), procedure edits the OR flag and DC,
+        LOS edits the AdjRW. The result equals group() of the edited case;
+        the DRG row is always read from the tables, and a previous result
+        that disagrees with them is regrouped in full.
+
+        Args:
+            previous: Earlier result of this grouper for the case
+            diff: Edits to apply, or pass CaseDiff fields as keywords
+                (add_sdx, remove_sdx, add_procedures, remove_procedures, age, sex, los)
+            verify: Also check the previous CC/MCC lists and OR flag against
+                its codes, for results that come from outside the process
+
+        Example:
+            first = grouper.group(pdx='J189', sdx=['E119'], age=65, sex='F', los=7)
+            update = grouper.regroup(first, add_sdx=['N179'], los=10)
+            update.result.drg, update.stages, update.explanation
+        """
+        return regroup_case(self, previous, diff or CaseDiff(**edits), verify)
+
+    def group_many(self, cases: Mapping[str, Sequence]) -> Dict[str, list]:
+        """
+        Group many cases in batched passes
+
+        Every distinct code is normalized and looked up once for the whole
+        batch, and CC levels, DCs and DRGs are resolved through per-batch memos,
+        so large claim runs skip most of the per-case work done by group().
+
+        Args:
+            cases: Columnar input - equal-length lists or NumPy arrays keyed by
+                'pdx', 'sdx', 'procedures', 'age', 'sex', 'los'. Only 'pdx' is
+                required; missing columns take the defaults of group().
+
+        Returns:
+            Columnar output - one list per GrouperResult field, in input order.
+            All rows share one 'grouped_at' timestamp.
+
+        Example:
+            out = grouper.group_many({'pdx': ['J189', 'S82201D'], 'age': [65, 25]})
+            out['drg']  # ['04...', '08...']
+        """
+        columns = {name: _as_list(cases[name]) for name in _CASE_COLUMNS if name in cases}
+        if "pdx" not in columns:
+            raise ValueError("group_many requires a 'pdx' column")
+        n = len(columns["pdx"])
+        for name, column in columns.items():
+            if len(column) != n:
+                raise ValueError(f"Column {name!r} has {len(column)} rows, expected {n}")
+
+        pdxs = columns["pdx"]
+        sdxs = [list(v) if v is not None else [] for v in columns.get("sdx", [None] * n)]
+        procs = [list(v) if v is not None else [] for v in columns.get("procedures", [None] * n)]
+        ages = columns.get("age", [None] * n)
+        sexes = columns.get("sex", [None] * n)
+        loss = columns.get("los", [1] * n)
+
+        # Pass 1: normalize and look up every distinct code once, skipping the
+        # rows that end in the age error (their codes are never read, as in group())
+        grouped = [i for i in range(n) if ages[i] is not None and 0 <= ages[i] <= 124]
+        icd_codes = {pdxs[i] for i in grouped}.union(*(sdxs[i] for i in grouped))
+        icd_norm = {code: self._normalize_icd(code) for code in icd_codes}
+        norms = list(set(icd_norm.values()))
+        icd_info = dict(zip(norms, self._lookup_icd10_many(norms)))
+        orp = {}
+        for code in set().union(*(procs[i] for i in grouped)):
+            info = self._lookup_proc(self._normalize_proc(code))
+            orp[code] = bool(info and info["orp"])
+
+        # Pass 2: group each case against per-batch memos
+        cc_memo: Dict[Tuple[str, str], Optional[str]] = {}
+        dc_memo: Dict[Tuple[str, bool], str] = {}
+        drg_memo: Dict[Tuple[str, int], dict] = {}
+        out: Dict[str, list] = {name: [] for name in RESULT_FIELDS}
+        grouped_at = datetime.now().isoformat()
+
+        for i in range(n):
+            pdx, sdx, procedures = pdxs[i], sdxs[i], procs[i]
+            age, sex, los = ages[i], sexes[i], loss[i]
+            errors, warnings = [], []
+            cc_list, mcc_list = [], []
+            has_or, pcl = False, 0
+
+            if age is None or age < 0 or age > 124:
+                errors.append("No age" if age is None else f"Invalid age: {age}")
+                mdc, mdc_name, dc = "26", "Ungroupable", "2653"
+                drg_info = dict(_UNGROUPABLE_DRG, drg="26539", name="Age error")
+            else:
+                if sex is None or sex not in ["M", "F", "1", "2"]:
+                    warnings.append(f"Missing or invalid sex: {sex}")
+                pdx_norm = icd_norm[pdx]
+                pdx_info = icd_info[pdx_norm]
+                if not pdx_info:
+                    errors.append(f"Invalid PDx: {pdx}")
+                    mdc, mdc_name, dc = "26", "Ungroupable", "2650"
+                    drg_info = dict(_UNGROUPABLE_DRG, name="Invalid principal diagnosis")
+                else:
+                    mdc = pdx_info["mdc"]
+                    mdc_name = MDC_NAMES.get(mdc, "Unknown")
+                    has_or = any(orp[p] for p in procedures)
+                    for code in sdx:
+                        key = (icd_norm[code], pdx_norm)
+                        level = cc_memo.get(key, False)
+                        if level is False:
+                            level = cc_memo[key] = self._classify_cc(icd_info[key[0]], *key)
+                        if level == "mcc":
+                            mcc_list.append(code)
+                        elif level == "cc":
+                            cc_list.append(code)
+                    pcl = self._pcl(len(cc_list), len(mcc_list))
+                    dc = dc_memo.get((pdx_norm, has_or))
+                    if dc is None:
+                        dc = dc_memo[(pdx_norm, has_or)] = self._resolve_dc(pdx_info, has_or)
+                    drg_info = drg_memo.get((dc, pcl))
+                    if drg_info is None:
+                        drg_info = drg_memo[(dc, pcl)] = self._find_drg(dc, pcl)
+
+            valid = not errors
+            if valid:
+                adjrw, los_status = self._calculate_adjrw(
+                    drg_info["rw"], drg_info["rw0d"], drg_info["wtlos"], drg_info["ot"], los
+                )
+                is_surgical = has_or or (
+                    int(dc[2:]) < 50 if len(dc) >= 4 and dc[2:].isdigit() else False
+                )
+            else:
+                adjrw, los_status, is_surgical = 0, "normal", False
+
+            out["version"].append(self.version)
+            out["pdx"].append(pdx)
+            out["sdx"].append(sdx)
+            out["procedures"].append(procedures)
+            out["age"].append(age)
+            out["sex"].append(sex)
+            out["los"].append(los)
+            out["mdc"].append(mdc)
+            out["mdc_name"].append(mdc_name)
+            out["dc"].append(dc)
+            out["drg"].append(drg_info["drg"])
+            out["drg_name"].append(drg_info["name"])
+            out["rw"].append(drg_info["rw"] if valid else 0)
+            out["rw0d"].append(drg_info["rw0d"] if valid else 0)
+            out["adjrw"].append(adjrw)
+            out["wtlos"].append(drg_info["wtlos"] if valid else 0)
+            out["ot"].append(drg_info["ot"] if valid else 0)
+            out["pcl"].append(pcl)
+            out["cc_list"].append(cc_list)
+            out["mcc_list"].append(mcc_list)
+            out["has_or_procedure"].append(has_or)
+            out["is_surgical"].append(is_surgical)
+            out["los_status"].append(los_status)
+            out["is_valid"].append(valid)
+            out["errors"].append(errors)
+            out["warnings"].append(warnings)
+            out["grouped_at"].append(grouped_at)
+
+        return out
+
+    def enable_profiling(self) -> StageProfiler:
+        """
+        Start recording per-stage timings and lookup counters
+
+        The stage methods are wrapped on this instance only; until profiling
+        is enabled group() runs without any instrumentation cost.
+
+        Returns:
+            The profiler (already enabled profiling keeps its numbers)
+        """
+        if self._profiler is None:
+            self._profiler = StageProfiler()
+            instrument(self, self._profiler)
+        return self._profiler
+
+    def disable_profiling(self):
+        """Stop profiling and drop the recorded numbers"""
+        if self._profiler is not None:
+            uninstrument(self)
+            self._profiler = None
+
+    def profile_stats(self) -> Optional[dict]:
+        """Per-stage timings and counters, or None if profiling is off"""
+        return self._profiler.snapshot() if self._profiler is not None else None
+
     def get_stats(self) -> dict:
         return {
             "version": self.version,
+            "backend": self.backend,
             "icd10_count": len(self._icd10_data),
             "procedure_count": len(self._proc_data),
             "dc_count": len(self._drg_data),
             "drg_count": sum(len(drgs) for drgs in self._drg_data.values()),
             "cc_exclusion_count": len(self._cc_exclusions),
+            "result_cache": self._result_cache.stats() if self._result_cache is not None else None,
+            "profile": self.profile_stats(),
         }
 
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        Approximate table memory in bytes
+
+        'heap' counts the lookup tables and indexes held as Python objects
+        (measured once, result cache excluded); 'mapped' is the size of the
+        memory-mapped snapshot (mmap backend), shared through the page cache.
+        """
+        if self._heap_bytes is None:
+            roots = [
+                self._drg_data,
+                self._dc_table,
+                self._drg_index,
+                self._catalog.entries if self._catalog is not None else [],
+            ]
+            if self._mapped is None:
+                roots += [self._icd10_data, self._proc_data, self._cc_index]
+            self._heap_bytes = _deep_sizeof(roots, set())
+        mapped = len(self._mapped.buffer) if self._mapped is not None else 0
+        return {"heap": self._heap_bytes, "mapped": mapped}
+
+    def clear_cache(self):
+        """Drop cached group() results (tables changed or were reloaded)"""
+        if self._result_cache is not None:
+            self._result_cache.clear()
+
     def get_drg_info(self, drg_code: str) -> Optional[dict]:
-        for drgs in self._drg_data.values():
-            for d in drgs:
-                if d["drg"] == drg_code:
-                    return d
-        return None
+        return self._drg_index.get(drg_code)
+
+    def get_drg_catalog(self) -> DRGCatalog:
+        """DRG listing of this version, filterable by MDC, DC and RW range"""
+        if self._catalog is None:
+            self._catalog = DRGCatalog(self.version, self._drg_data)
+        return self._catalog
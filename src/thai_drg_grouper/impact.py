@@ -0,0 +1,189 @@
+"""
+Thai DRG Grouper - Version Impact Analysis
+
+Regroups a case file under a base and a candidate version in one streaming
+pass (see ``compare.paired_columns``) and keeps only aggregates: the DRG
+migration matrix, AdjRW totals and deltas, and per-MDC changes. Memory is
+bounded by the number of distinct DRG pairs and MDCs, not by the file size.
+"""
+
+import time
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from .compare import paired_columns
+from .parallel import ParallelGrouper
+
+
+def _round(value: float) -> float:
+    return round(value, 4)
+
+
+class ImpactReport:
+    """
+    Aggregated impact of switching from one version to another
+
+    Args:
+        base: Version currently in use
+        other: Candidate version
+    """
+
+    def __init__(self, base: str, other: str):
+        self.base = base
+        self.other = other
+        self.cases = 0
+        self.drg_changed = 0
+        self.mdc_changed = 0
+        self.adjrw_base = 0.0
+        self.adjrw_other = 0.0
+        self.invalid_base = 0
+        self.invalid_other = 0
+        self.seconds = 0.0
+        # (base DRG, other DRG) -> [cases, AdjRW delta]
+        self._migrations: Dict[Tuple[str, str], List] = {}
+        # base MDC -> [cases, DRG changed, AdjRW base, AdjRW other]
+        self._mdcs: Dict[str, List] = {}
+
+    def add_columns(self, base_out: Mapping[str, list], other_out: Mapping[str, list]):
+        """Aggregate one chunk of columnar group_many() output from each version"""
+        rows = zip(
+            base_out["drg"],
+            base_out["mdc"],
+            base_out["adjrw"],
+            base_out["is_valid"],
+            other_out["drg"],
+            other_out["mdc"],
+            other_out["adjrw"],
+            other_out["is_valid"],
+        )
+        migrations, mdcs = self._migrations, self._mdcs
+        for drg_a, mdc_a, adjrw_a, valid_a, drg_b, mdc_b, adjrw_b, valid_b in rows:
+            self.cases += 1
+            self.adjrw_base += adjrw_a
+            self.adjrw_other += adjrw_b
+            if not valid_a:
+                self.invalid_base += 1
+            if not valid_b:
+                self.invalid_other += 1
+            if mdc_a != mdc_b:
+                self.mdc_changed += 1
+
+            migration = migrations.get((drg_a, drg_b))
+            if migration is None:
+                migration = migrations[(drg_a, drg_b)] = [0, 0.0]
+            migration[0] += 1
+            migration[1] += adjrw_b - adjrw_a
+
+            mdc = mdcs.get(mdc_a)
+            if mdc is None:
+                mdc = mdcs[mdc_a] = [0, 0, 0.0, 0.0]
+            mdc[0] += 1
+            mdc[2] += adjrw_a
+            mdc[3] += adjrw_b
+            if drg_a != drg_b:
+                self.drg_changed += 1
+                mdc[1] += 1
+
+    @property
+    def adjrw_delta(self) -> float:
+        return self.adjrw_other - self.adjrw_base
+
+    def migrations(self, changed_only: bool = True) -> List[dict]:
+        """DRG pairs ordered by absolute AdjRW delta, then case count"""
+        rows = [
+            {"from": a, "to": b, "cases": count, "adjrw_delta": _round(delta)}
+            for (a, b), (count, delta) in self._migrations.items()
+            if a != b or not changed_only
+        ]
+        rows.sort(key=lambda row: (-abs(row["adjrw_delta"]), -row["cases"], row["from"], row["to"]))
+        return rows
+
+    def by_mdc(self) -> List[dict]:
+        """Per base-version MDC: cases, DRG changes and AdjRW totals"""
+        return [
+            {
+                "mdc": mdc,
+                "cases": cases,
+                "drg_changed": changed,
+                "adjrw_base": _round(base),
+                "adjrw_other": _round(other),
+                "adjrw_delta": _round(other - base),
+            }
+            for mdc, (cases, changed, base, other) in sorted(self._mdcs.items())
+        ]
+
+    def to_dict(self, top: Optional[int] = None) -> dict:
+        """
+        JSON-ready report
+
+        Args:
+            top: Keep only the largest DRG migrations (default: all)
+        """
+        migrations = self.migrations()
+        return {
+            "base": self.base,
+            "other": self.other,
+            "cases": self.cases,
+            "drg_changed": self.drg_changed,
+            "mdc_changed": self.mdc_changed,
+            "invalid_base": self.invalid_base,
+            "invalid_other": self.invalid_other,
+            "adjrw_base": _round(self.adjrw_base),
+            "adjrw_other": _round(self.adjrw_other),
+            "adjrw_delta": _round(self.adjrw_delta),
+            "adjrw_delta_pct": (
+                _round(100 * self.adjrw_delta / self.adjrw_base) if self.adjrw_base else None
+            ),
+            "by_mdc": self.by_mdc(),
+            "migrations": migrations if top is None else migrations[:top],
+            "seconds": _round(self.seconds),
+        }
+
+    def format_text(self, top: int = 20) -> str:
+        """Human-readable summary with the ``top`` largest migrations"""
+        data = self.to_dict(top=top)
+        pct = data["adjrw_delta_pct"]
+        lines = [
+            f"📊 Impact of v{self.base} -> v{self.other} ({self.cases:,} cases)",
+            "-" * 60,
+            f"  DRG changed: {self.drg_changed:,}   MDC changed: {self.mdc_changed:,}",
+            f"  Invalid:     {self.invalid_base:,} -> {self.invalid_other:,}",
+            f"  AdjRW:       {data['adjrw_base']:,.4f} -> {data['adjrw_other']:,.4f}"
+            f" ({data['adjrw_delta']:+,.4f}" + (f", {pct:+.2f}%)" if pct is not None else ")"),
+            "",
+            "  MDC   Cases  Changed  AdjRW delta",
+        ]
+        for row in data["by_mdc"]:
+            lines.append(
+                f"  {row['mdc']:<4}{row['cases']:>7,}{row['drg_changed']:>9,}"
+                f"{row['adjrw_delta']:>+13,.4f}"
+            )
+        if data["migrations"]:
+            lines += ["", f"  Top {len(data['migrations'])} DRG migrations (by AdjRW delta)"]
+            for row in data["migrations"]:
+                lines.append(
+                    f"  {row['from']} -> {row['to']}: {row['cases']:,} cases,"
+                    f" {row['adjrw_delta']:+,.4f}"
+                )
+        return "\n".join(lines)
+
+
+def analyze_impact(
+    base: ParallelGrouper, other: ParallelGrouper, cases: Iterable[Mapping]
+) -> ImpactReport:
+    """
+    Regroup a stream of cases under two engines and aggregate the differences
+
+    Cases are read lazily and each chunk's results are dropped once
+    aggregated, so only the chunks in flight are held in memory.
+
+    Args:
+        base: Engine of the version currently in use
+        other: Engine of the candidate version
+        cases: group() keyword dicts (e.g. from fileio.read_cases)
+    """
+    report = ImpactReport(base.version, other.version)
+    start = time.perf_counter()
+    for base_out, other_out in paired_columns(base, other, cases):
+        report.add_columns(base_out, other_out)
+    report.seconds = time.perf_counter() - start
+    return report
@@ -4,13 +4,21 @@ Thai DRG Grouper - Multi-Version Manager
 
 import json
 import shutil
+import threading
+import time
 import urllib.request
 import zipfile
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Mapping, Optional, Set
 
+from .compare import VersionComparison, compare_case
 from .grouper import ThaiDRGGrouper
+from .impact import ImpactReport, analyze_impact
+from .parallel import ParallelGrouper
+from .regroup import CaseDiff, RegroupResult
+from .snapshot import compile_snapshot, is_snapshot_fresh, source_fingerprints
 from .types import GrouperResult, VersionInfo
 
 
@@ -26,6 +34,20 @@ class ThaiDRGGrouperManager:
         │   └── data/*.dbf
         └── 6.3.4/
 
+    Args:
+        versions_path: Folder holding one sub-folder per version
+        backend: Table backend for loaded groupers ('memory' or 'mmap'),
+            see ThaiDRGGrouper
+        cache_size: Per-version group() result cache size (0 disables it),
+            see ThaiDRGGrouper
+        max_versions: Loaded versions kept at once; beyond it the least
+            recently used version is evicted (default: unlimited)
+        max_bytes: Table memory kept loaded, see ThaiDRGGrouper.memory_usage()
+            (default: unlimited)
+        pinned: Versions never evicted, in addition to the default version
+        profile: Record per-stage timings in loaded groupers, see
+            ThaiDRGGrouper.enable_profiling()
+
     Example:
         manager = ThaiDRGGrouperManager('./versions')
         result = manager.group_latest(pdx='S82201D', los=5)
@@ -36,11 +58,49 @@ class ThaiDRGGrouperManager:
         "5.1": "https://www.tcmc.or.th/_content_images/download/fileupload/S0033.zip",
     }
 
-    def __init__(self, versions_path: str = "./versions"):
+    def __init__(
+        self,
+        versions_path: str = "./versions",
+        backend: str = "memory",
+        cache_size: int = 0,
+        max_versions: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        pinned: Iterable[str] = (),
+        profile: bool = False,
+    ):
+        if backend not in ThaiDRGGrouper.BACKENDS:
+            raise ValueError(
+                f"Unknown backend {backend!r}. Available: {list(ThaiDRGGrouper.BACKENDS)}"
+            )
+        if max_versions is not None and max_versions < 1:
+            raise ValueError("max_versions must be at least 1")
+        if max_bytes is not None and max_bytes < 1:
+            raise ValueError("max_bytes must be positive")
         self.versions_path = Path(versions_path)
+        self.backend = backend
+        self.cache_size = cache_size
+        self.profile = profile
         self.versions_path.mkdir(parents=True, exist_ok=True)
 
-        self._groupers: Dict[str, ThaiDRGGrouper] = {}
+        # Loaded groupers, least recently used first
+        self._groupers: "OrderedDict[str, ThaiDRGGrouper]" = OrderedDict()
+        self.max_versions = max_versions
+        self.max_bytes = max_bytes
+        self._pinned: Set[str] = set(pinned)
+        self._limited = max_versions is not None or max_bytes is not None
+        self._residency_lock = threading.Lock()
+        self._bytes: Dict[str, int] = {}
+        self._loads = 0
+        self._evictions = 0
+        self._reloads = 0
+        # Version -> .dbf fingerprints its loaded grouper was built from
+        self._sources: Dict[str, dict] = {}
+        self._watcher: Optional[threading.Thread] = None
+        self._watch_stop: Optional[threading.Event] = None
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._load_locks_guard = threading.Lock()
+        self._load_state: Dict[str, dict] = {}
+        self._preload_targets: Set[str] = set()
         self._versions: Dict[str, VersionInfo] = {}
         self._default_version: Optional[str] = None
 
@@ -67,8 +127,8 @@ class ThaiDRGGrouperManager:
             )
 
     def _scan_versions(self):
-        self._versions.clear()
-
+        # Build the new index aside and swap it in, so readers never see it half-filled
+        versions: Dict[str, VersionInfo] = {}
         for item in self.versions_path.iterdir():
             if item.is_dir() and not item.name.startswith("."):
                 version_json = item / "version.json"
@@ -86,7 +146,7 @@ class ThaiDRGGrouperManager:
                             info = json.load(f)
 
                     version = info.get("version", item.name)
-                    self._versions[version] = VersionInfo(
+                    versions[version] = VersionInfo(
                         version=version,
                         name=info.get("name", f"Thai DRG {version}"),
                         release_date=info.get("release_date", "unknown"),
@@ -96,6 +156,7 @@ class ThaiDRGGrouperManager:
                         rights=info.get("rights", ["UC", "CSMBS", "SSS"]),
                         notes=info.get("notes", ""),
                     )
+        self._versions = versions
 
         if not self._default_version and self._versions:
             self._default_version = sorted(self._versions.keys(), reverse=True)[0]
@@ -119,13 +180,348 @@ class ThaiDRGGrouperManager:
             return True
         return False
 
+    def _resident(self, version: str) -> Optional[ThaiDRGGrouper]:
+        """Loaded grouper for a version (None if not loaded), marked as recently used"""
+        grouper = self._groupers.get(version)
+        if grouper is not None and self._limited:
+            with self._residency_lock:
+                if version in self._groupers:
+                    self._groupers.move_to_end(version)
+        return grouper
+
     def _get_grouper(self, version: str) -> Optional[ThaiDRGGrouper]:
         if version not in self._versions:
             return None
-        if version not in self._groupers:
-            info = self._versions[version]
-            self._groupers[version] = ThaiDRGGrouper(info.dbf_path, version)
-        return self._groupers[version]
+        grouper = self._resident(version)
+        if grouper is None:
+            # Single-flight: concurrent first requests wait for one load
+            with self._load_lock(version):
+                grouper = self._groupers.get(version)
+                if grouper is None:
+                    grouper = self._load_grouper(version)
+        return grouper
+
+    def _load_grouper(self, version: str) -> ThaiDRGGrouper:
+        """Load a version, recording its state and load time (caller holds its load lock)"""
+        info = self._versions[version]
+        state = {"state": "loading", "seconds": None, "error": None}
+        self._load_state[version] = state
+        start = time.perf_counter()
+        # Fingerprint before reading, so edits made during the load are seen as changes
+        sources = source_fingerprints(info.dbf_path, with_hash=False)
+        try:
+            grouper = self._new_grouper(info.dbf_path, version)
+        except Exception as e:
+            state.update(state="failed", seconds=time.perf_counter() - start, error=str(e))
+            raise
+        state.update(state="ready", seconds=time.perf_counter() - start)
+        self._install(version, grouper, sources)
+        return grouper
+
+    def _new_grouper(self, dbf_path: str, version: str) -> ThaiDRGGrouper:
+        return ThaiDRGGrouper(
+            dbf_path,
+            version,
+            backend=self.backend,
+            cache_size=self.cache_size,
+            profile=self.profile,
+        )
+
+    def _install(self, version: str, grouper: ThaiDRGGrouper, sources: dict, reload: bool = False):
+        """Make a grouper the one served for a version (a single reference swap)"""
+        size = None
+        if self.max_bytes is not None:
+            # Measured before taking the lock: it walks every table of the grouper
+            usage = grouper.memory_usage()
+            size = usage["heap"] + usage["mapped"]
+        with self._residency_lock:
+            self._groupers[version] = grouper
+            self._sources[version] = sources
+            if reload:
+                self._reloads += 1
+            else:
+                self._loads += 1
+            if size is not None:
+                self._bytes[version] = size
+            self._enforce_residency(keep=version)
+
+    def reload_version(self, version: str) -> str:
+        """
+        Rebuild a loaded version from its current .dbf files and swap it in
+
+        The new grouper is built while the old one keeps serving; requests
+        already holding the old grouper finish on the old tables. If the
+        rebuild fails, the old grouper stays and the error is recorded in
+        load_status().
+
+        Returns:
+            'reloaded', or 'not_loaded' if the version is not loaded (its
+            current files are read on first use)
+
+        Raises:
+            ValueError: If the version is not found
+        """
+        info = self._versions.get(version)
+        if info is None:
+            raise ValueError(f"Version {version} not found. Available: {list(self._versions)}")
+        # Serialized with loads and other reloads of the same version
+        with self._load_lock(version):
+            if version not in self._groupers:
+                return "not_loaded"
+            start = time.perf_counter()
+            sources = source_fingerprints(info.dbf_path, with_hash=False)
+            try:
+                grouper = self._new_grouper(info.dbf_path, version)
+            except Exception as e:
+                state = self._load_state.setdefault(version, {"state": "ready", "seconds": None})
+                state["error"] = f"Reload failed: {e}"
+                raise
+            self._install(version, grouper, sources, reload=True)
+            self._load_state[version] = {
+                "state": "ready",
+                "seconds": time.perf_counter() - start,
+                "error": None,
+            }
+        return "reloaded"
+
+    def refresh(self) -> Dict[str, list]:
+        """
+        Rescan versions_path and hot-reload loaded versions whose .dbf files changed
+
+        Returns the versions 'added', 'removed', 'reloaded' and 'failed'
+        (version -> error) by this call.
+        """
+        before = set(self._versions)
+        self._scan_versions()
+        added = sorted(set(self._versions) - before)
+        removed = sorted(before - set(self._versions))
+        with self._residency_lock:
+            for version in removed:
+                self._drop_grouper(version)
+                self._load_state.pop(version, None)
+                self._preload_targets.discard(version)
+            # Copied under the lock: loads and evictions change it concurrently
+            loaded = list(self._groupers)
+        reloaded, failed = [], {}
+        for version in loaded:
+            info = self._versions.get(version)
+            if info is None:
+                continue
+            if source_fingerprints(info.dbf_path, with_hash=False) == self._sources.get(version):
+                continue
+            try:
+                if self.reload_version(version) == "reloaded":
+                    reloaded.append(version)
+            except Exception as e:
+                failed[version] = str(e)
+        return {"added": added, "removed": removed, "reloaded": reloaded, "failed": failed}
+
+    def _disk_state(self) -> tuple:
+        """Size and mtime of every version folder's version.json and .dbf files"""
+        entries = []
+        for item in sorted(self.versions_path.iterdir()):
+            if not item.is_dir() or item.name.startswith("."):
+                continue
+            paths = [item / "version.json", *item.glob("*.dbf"), *item.glob("data/*.dbf")]
+            for path in sorted(paths):
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                entries.append((str(path), st.st_size, st.st_mtime_ns))
+        return tuple(entries)
+
+    def watch(self, interval: float = 2.0) -> threading.Thread:
+        """
+        Watch versions_path and call refresh() when it changes
+
+        Polls file sizes and mtimes every ``interval`` seconds in a daemon
+        thread; a change is applied once it has been stable for one interval,
+        so partly copied files are not loaded. See stop_watching().
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return self._watcher
+        self._watch_stop = threading.Event()
+        self._watcher = threading.Thread(
+            target=self._watch_loop,
+            args=(interval, self._watch_stop, self._disk_state()),
+            name="drg-watch",
+            daemon=True,
+        )
+        self._watcher.start()
+        return self._watcher
+
+    def stop_watching(self):
+        if self._watcher is not None:
+            self._watch_stop.set()
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch_loop(self, interval: float, stop: threading.Event, applied: tuple):
+        last = applied
+        while not stop.wait(interval):
+            try:
+                current = self._disk_state()
+                if current == last and current != applied:
+                    self.refresh()
+                    applied = current
+                last = current
+            except Exception:
+                continue  # folder briefly unreadable: retry on the next poll
+
+    def _is_pinned(self, version: str) -> bool:
+        return version == self._default_version or version in self._pinned
+
+    def _over_limit(self) -> bool:
+        if self.max_versions is not None and len(self._groupers) > self.max_versions:
+            return True
+        return self.max_bytes is not None and sum(self._bytes.values()) > self.max_bytes
+
+    def _enforce_residency(self, keep: str):
+        """Evict least recently used unpinned versions until within limits (caller holds lock)"""
+        while self._over_limit():
+            victim = next((v for v in self._groupers if v != keep and not self._is_pinned(v)), None)
+            if victim is None:
+                return  # only pinned versions left: stay over the limit
+            self._drop_grouper(victim)
+            self._evictions += 1
+            state = self._load_state.get(victim)
+            if state is not None:
+                state["state"] = "evicted"
+
+    def _drop_grouper(self, version: str):
+        self._groupers.pop(version, None)
+        self._bytes.pop(version, None)
+        self._sources.pop(version, None)
+
+    def pin_version(self, version: str):
+        """Never evict a version (the default version is always pinned)"""
+        self._pinned.add(version)
+
+    def unpin_version(self, version: str):
+        self._pinned.discard(version)
+
+    def residency_stats(self) -> dict:
+        """
+        Loaded versions and residency counters
+
+        Returns limits, loaded versions (least recently used first), table
+        bytes per loaded version, pinned versions, and load/eviction/reload
+        counts.
+        """
+        with self._residency_lock:
+            resident = list(self._groupers.items())
+            loads, evictions, reloads = self._loads, self._evictions, self._reloads
+        memory = {}
+        for version, grouper in resident:
+            usage = grouper.memory_usage()
+            memory[version] = usage["heap"] + usage["mapped"]
+        return {
+            "max_versions": self.max_versions,
+            "max_bytes": self.max_bytes,
+            "resident": [version for version, _ in resident],
+            "bytes": memory,
+            "total_bytes": sum(memory.values()),
+            "pinned": sorted(v for v in self._versions if self._is_pinned(v)),
+            "loads": loads,
+            "evictions": evictions,
+            "reloads": reloads,
+        }
+
+    def preload(
+        self, versions: Optional[Iterable[str]] = None, wait: bool = False, warmup: bool = True
+    ) -> List[threading.Thread]:
+        """
+        Load versions in parallel background threads
+
+        Preloaded versions decide readiness, see is_ready().
+
+        Args:
+            versions: Versions to load (default: the default version)
+            wait: Block until all of them are loaded (or failed)
+            warmup: Also build each version's DRG catalog and group one case
+
+        Raises:
+            ValueError: If a version is not found
+        """
+        if versions is None:
+            versions = [self._default_version] if self._default_version else []
+        versions = list(versions)
+        unknown = [v for v in versions if v not in self._versions]
+        if unknown:
+            raise ValueError(f"Versions {unknown} not found. Available: {list(self._versions)}")
+
+        threads = []
+        for version in versions:
+            self._preload_targets.add(version)
+            current = self._load_state.get(version)
+            if current is None or current["state"] == "failed":
+                self._load_state[version] = {"state": "pending", "seconds": None, "error": None}
+            thread = threading.Thread(
+                target=self._preload_one,
+                args=(version, warmup),
+                name=f"drg-preload-{version}",
+                daemon=True,
+            )
+            thread.start()
+            threads.append(thread)
+        if wait:
+            for thread in threads:
+                thread.join()
+        return threads
+
+    def _preload_one(self, version: str, warmup: bool):
+        try:
+            grouper = self._get_grouper(version)
+        except Exception:
+            return  # recorded as failed in the load state
+        if warmup and grouper is not None:
+            grouper.get_drg_catalog()
+            grouper.group(pdx=next(iter(grouper._icd10_data), ""), age=30, sex="M", los=1)
+
+    def load_status(self) -> Dict[str, dict]:
+        """
+        Load state of every known version
+
+        Each entry has 'state' ('not_loaded', 'pending', 'loading', 'ready',
+        'failed' or 'evicted'), 'seconds' (load time) and 'error'.
+        """
+        idle = {"state": "not_loaded", "seconds": None, "error": None}
+        return {v: dict(self._load_state.get(v, idle)) for v in self._versions}
+
+    def _ready_targets(self) -> set:
+        return self._preload_targets or (
+            {self._default_version} if self._default_version else set()
+        )
+
+    def is_ready(self) -> bool:
+        """
+        True when every preloaded version (without preloading: the default
+        version) is loaded; evicted versions count, they reload on next use
+        """
+        targets = self._ready_targets()
+        return bool(targets) and all(
+            v in self._groupers or self._load_state.get(v, {}).get("state") == "evicted"
+            for v in targets
+        )
+
+    def health(self) -> str:
+        """
+        'ok' when ready, 'failed' if a version that readiness waits for failed
+        to load (or there is none), else 'loading'
+        """
+        if self.is_ready():
+            return "ok"
+        targets = self._ready_targets()
+        if not targets or any(
+            self._load_state.get(v, {}).get("state") == "failed" for v in targets
+        ):
+            return "failed"
+        return "loading"
+
+    def _load_lock(self, version: str) -> threading.Lock:
+        with self._load_locks_guard:
+            return self._load_locks.setdefault(version, threading.Lock())
 
     def group(
         self,
@@ -168,6 +564,120 @@ class ThaiDRGGrouperManager:
             los=los,
         )
 
+    def regroup(
+        self,
+        previous: GrouperResult,
+        diff: Optional[CaseDiff] = None,
+        version: str = None,
+        verify: bool = False,
+        **edits,
+    ) -> RegroupResult:
+        """
+        Regroup a corrected case from its previous result, rerunning only
+        the affected stages (see ThaiDRGGrouper.regroup)
+
+        Args:
+            previous: Earlier result for the case
+            diff: Edits to apply, or pass CaseDiff fields as keywords
+            version: Version to regroup under (default: the previous result's);
+                another version than the previous result's regroups in full
+            verify: Check the previous result against its codes first
+
+        Raises:
+            ValueError: If the version is not found
+        """
+        version = version or previous.version
+        grouper = self._get_grouper(version)
+        if not grouper:
+            raise ValueError(
+                f"Version {version} not found. Available: {list(self._versions.keys())}"
+            )
+        return grouper.regroup(previous, diff, verify, **edits)
+
+    def parallel_grouper(
+        self,
+        version: str = None,
+        workers: Optional[int] = None,
+        chunk_size: int = 1000,
+        **kwargs,
+    ) -> ParallelGrouper:
+        """
+        Create a process-pool grouping engine for a version (default: default version)
+
+        Extra keyword arguments are passed to ParallelGrouper. When workers are
+        forked, they inherit the tables this manager has already loaded.
+        """
+        version = version or self._default_version
+        if version not in self._versions:
+            raise ValueError(
+                f"Version {version} not found. Available: {list(self._versions.keys())}"
+            )
+        kwargs.setdefault("backend", self.backend)
+        kwargs.setdefault("grouper", self._groupers.get(version))
+        return ParallelGrouper(
+            self._versions[version].dbf_path,
+            version,
+            workers=workers,
+            chunk_size=chunk_size,
+            **kwargs,
+        )
+
+    def group_parallel(
+        self,
+        cases: Iterable[Mapping],
+        version: str = None,
+        workers: Optional[int] = None,
+        chunk_size: int = 1000,
+    ) -> List[GrouperResult]:
+        """Group many cases across worker processes, results in input order"""
+        with self.parallel_grouper(version, workers=workers, chunk_size=chunk_size) as engine:
+            return engine.group(cases)
+
+    def compare(
+        self,
+        pdx: str,
+        sdx: List[str] = None,
+        procedures: List[str] = None,
+        age: Optional[int] = None,
+        sex: Optional[str] = None,
+        los: int = 1,
+        versions: Optional[Iterable[str]] = None,
+    ) -> VersionComparison:
+        """
+        Group one case under several versions (default: all) concurrently
+
+        Only the requested versions are loaded. See VersionComparison.diff()
+        for the fields that changed between them.
+
+        Raises:
+            ValueError: If a version is not found
+        """
+        case = dict(pdx=pdx, sdx=sdx, procedures=procedures, age=age, sex=sex, los=los)
+        return compare_case(self, case, None if versions is None else list(versions))
+
+    def impact(
+        self,
+        cases: Iterable[Mapping],
+        other: str,
+        base: str = None,
+        workers: Optional[int] = None,
+        chunk_size: int = 1000,
+    ) -> ImpactReport:
+        """
+        Aggregate how switching from base (default: default version) to other
+        changes DRGs and AdjRW over a stream of cases
+
+        Both versions group in their own worker processes in one pass; only
+        aggregates are kept, see ImpactReport.
+
+        Raises:
+            ValueError: If a version is not found
+        """
+        base_engine = self.parallel_grouper(base, workers=workers, chunk_size=chunk_size)
+        other_engine = self.parallel_grouper(other, workers=workers, chunk_size=chunk_size)
+        with base_engine, other_engine:
+            return analyze_impact(base_engine, other_engine, cases)
+
     def group_all_versions(
         self,
         pdx: str,
@@ -177,16 +687,8 @@ class ThaiDRGGrouperManager:
         sex: Optional[str] = None,
         los: int = 1,
     ) -> Dict[str, GrouperResult]:
-        """Group using all versions for comparison"""
-        results = {}
-        for version in self._versions:
-            try:
-                results[version] = self.group(
-                    version, pdx=pdx, sdx=sdx, procedures=procedures, age=age, sex=sex, los=los
-                )
-            except Exception:
-                results[version] = None
-        return results
+        """Group using all versions for comparison (None where a version fails)"""
+        return self.compare(pdx, sdx=sdx, procedures=procedures, age=age, sex=sex, los=los).results
 
     def add_version(
         self,
@@ -234,6 +736,10 @@ class ThaiDRGGrouperManager:
                 ensure_ascii=False,
             )
 
+        # Replaced tables: drop the loaded grouper (and its cached results)
+        with self._residency_lock:
+            self._drop_grouper(version)
+        self._load_state.pop(version, None)
         self._scan_versions()
         if set_default:
             self.set_default_version(version)
@@ -269,8 +775,10 @@ class ThaiDRGGrouperManager:
         if version_path.exists():
             shutil.rmtree(version_path)
 
-        if version in self._groupers:
-            del self._groupers[version]
+        with self._residency_lock:
+            self._drop_grouper(version)
+        self._load_state.pop(version, None)
+        self._preload_targets.discard(version)
 
         if self._default_version == version:
             self._default_version = None
@@ -279,8 +787,37 @@ class ThaiDRGGrouperManager:
         self._scan_versions()
         return True
 
+    def compile_snapshots(self, version: str = None, force: bool = False) -> Dict[str, str]:
+        """
+        Compile table snapshots so groupers start without parsing .dbf files
+
+        Returns a mapping of version -> "compiled" or "fresh" (already up to date).
+        """
+        versions = [version] if version else list(self._versions)
+        status = {}
+        for v in versions:
+            if v not in self._versions:
+                raise ValueError(f"Version {v} not found. Available: {list(self._versions.keys())}")
+            dbf_path = self._versions[v].dbf_path
+            if not force and is_snapshot_fresh(dbf_path):
+                status[v] = "fresh"
+            else:
+                compile_snapshot(dbf_path)
+                status[v] = "compiled"
+        return status
+
     def get_stats(self, version: str = None) -> dict:
+        """
+        Stats of one version, or version -> stats for all of them
+
+        Without a version, a manager with a residency limit reports only the
+        loaded versions instead of loading (and evicting) each one in turn.
+        """
         if version:
             grouper = self._get_grouper(version)
             return grouper.get_stats() if grouper else {}
+        if self._limited:
+            with self._residency_lock:
+                resident = list(self._groupers.items())
+            return {v: grouper.get_stats() for v, grouper in resident}
         return {v: self._get_grouper(v).get_stats() for v in self._versions}
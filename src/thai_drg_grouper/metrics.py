@@ -0,0 +1,295 @@
+"""
+Thai DRG Grouper - Prometheus Metrics
+
+Request counters and histograms of the API server, and rendering of those
+and the grouper statistics in the Prometheus text exposition format
+(version 0.0.4) for the /metrics endpoint.
+"""
+
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Request latency histogram buckets (seconds)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Cases per batch/stream request histogram buckets
+BATCH_BUCKETS = (1, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+
+# DRG of an ungroupable result -> reason label
+UNGROUPABLE_REASONS = {"26539": "age_error", "26509": "invalid_pdx"}
+
+# (labels, value) samples of one metric family
+Samples = Iterable[Tuple[Mapping[str, str], float]]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Mapping[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def family(name: str, kind: str, help_text: str, samples: Samples) -> List[str]:
+    """Lines of one metric family (# HELP, # TYPE and one line per sample)"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labels)} {_number(value)}")
+    return lines
+
+
+def histogram_family(
+    name: str, help_text: str, label_names: Sequence[str], histogram: "Histogram"
+) -> List[str]:
+    """Lines of one histogram family (_bucket, _sum and _count per label set)"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    bounds = [_number(float(b)) for b in histogram.buckets] + ["+Inf"]
+    for values, series in sorted(histogram.series()):
+        labels = dict(zip(label_names, values))
+        cumulative = 0
+        for bound, count in zip(bounds, series):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(dict(labels, le=bound))} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {_number(series[-1])}")
+        lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    return lines
+
+
+class Histogram:
+    """
+    Bucketed observations per label set
+
+    Not locked: update it from one thread (the API updates it from the
+    event loop only).
+
+    Args:
+        buckets: Upper bounds of the buckets; +Inf is added
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket..., count above the last bound, sum]
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def series(self) -> List[Tuple[tuple, list]]:
+        return [(labels, list(series)) for labels, series in list(self._series.items())]
+
+
+class RequestMetrics:
+    """
+    Request-level metrics of the API server
+
+    Updated only from the event loop (MetricsMiddleware and the async
+    handlers), so the hot path is a few dict updates and takes no lock.
+    """
+
+    def __init__(self):
+        self.requests = Histogram(LATENCY_BUCKETS)
+        self.batch_sizes = Histogram(BATCH_BUCKETS)
+        self.cases: Dict[str, int] = {}
+        self.ungroupable: Dict[Tuple[str, str], int] = {}
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float):
+        self.requests.observe((method, route, str(status)), seconds)
+
+    def observe_batch(self, route: str, size: int):
+        self.batch_sizes.observe((route,), size)
+
+    def record_results(self, version: str, results: Iterable):
+        """Count grouped GrouperResults and the ungroupable ones by reason"""
+        n = 0
+        for result in results:
+            n += 1
+            if not result.is_valid:
+                key = (version, UNGROUPABLE_REASONS.get(result.drg, "other"))
+                self.ungroupable[key] = self.ungroupable.get(key, 0) + 1
+        self.cases[version] = self.cases.get(version, 0) + n
+
+    def lines(self) -> List[str]:
+        lines = []
+        lines += histogram_family(
+            "thai_drg_http_request_duration_seconds",
+            "HTTP request latency by route and status",
+            ("method", "route", "status"),
+            self.requests,
+        )
+        lines += histogram_family(
+            "thai_drg_batch_size_cases",
+            "Cases per batch or stream request",
+            ("route",),
+            self.batch_sizes,
+        )
+        lines += family(
+            "thai_drg_cases_grouped_total",
+            "counter",
+            "Cases grouped through the API by version",
+            [({"version": v}, n) for v, n in sorted(self.cases.items())],
+        )
+        lines += family(
+            "thai_drg_ungroupable_total",
+            "counter",
+            "Ungroupable cases by version and reason",
+            [
+                ({"version": v, "reason": reason}, n)
+                for (v, reason), n in sorted(self.ungroupable.items())
+            ],
+        )
+        return lines
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request into RequestMetrics
+
+    Requests are labelled with the matched route template (e.g.
+    /group/{version}), so label sets stay bounded; unmatched paths share
+    the label 'unmatched'.
+    """
+
+    def __init__(self, app, metrics: RequestMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            self.metrics.observe_request(
+                scope["method"], route, status, time.perf_counter() - start
+            )
+
+
+def manager_metrics(manager) -> List[str]:
+    """
+    Version load, residency, result cache and stage timing families of a
+    ThaiDRGGrouperManager (read at scrape time; loads nothing)
+    """
+    residency = manager.residency_stats()
+    loaded = list(manager._groupers.items())
+    load_times = [
+        ({"version": v}, state["seconds"])
+        for v, state in sorted(manager.load_status().items())
+        if state.get("seconds") is not None
+    ]
+    caches = [(v, g._result_cache.stats()) for v, g in loaded if g._result_cache is not None]
+
+    lines = []
+    lines += family(
+        "thai_drg_version_load_seconds",
+        "gauge",
+        "Duration of the last load or reload of each version",
+        load_times,
+    )
+    lines += family(
+        "thai_drg_versions_resident", "gauge", "Versions currently loaded", [({}, len(loaded))]
+    )
+    for key, help_text in (
+        ("loads", "Version loads"),
+        ("evictions", "Versions evicted by the residency limits"),
+        ("reloads", "Version hot reloads"),
+    ):
+        lines += family(
+            f"thai_drg_version_{key}_total", "counter", help_text, [({}, residency[key])]
+        )
+    lines += family(
+        "thai_drg_result_cache_hits_total",
+        "counter",
+        "Result cache hits by version",
+        [({"version": v}, stats["hits"]) for v, stats in caches],
+    )
+    lines += family(
+        "thai_drg_result_cache_misses_total",
+        "counter",
+        "Result cache misses by version",
+        [({"version": v}, stats["misses"]) for v, stats in caches],
+    )
+    lines += family(
+        "thai_drg_result_cache_hit_ratio",
+        "gauge",
+        "Result cache hit ratio by version",
+        [({"version": v}, stats["hit_rate"]) for v, stats in caches],
+    )
+    lines += profile_metrics({v: g.profile_stats() for v, g in loaded})
+    return lines
+
+
+def profile_metrics(profiles: Mapping[str, Optional[dict]]) -> List[str]:
+    """
+    Stage timing families from ThaiDRGGrouper.profile_stats() per version
+
+    Versions without profiling (None) are left out.
+    """
+    stages: Dict[str, list] = {"calls": [], "seconds": [], "self_seconds": []}
+    counters = []
+    for version, profile in profiles.items():
+        if not profile:
+            continue
+        for stage, stats in profile["stages"].items():
+            labels = {"version": version, "stage": stage}
+            for key in stages:
+                stages[key].append((labels, stats[key]))
+        for event, count in profile["counters"].items():
+            counters.append(({"version": version, "event": event}, count))
+
+    lines = []
+    lines += family(
+        "thai_drg_stage_calls_total", "counter", "Calls of each grouper stage", stages["calls"]
+    )
+    lines += family(
+        "thai_drg_stage_seconds_total",
+        "counter",
+        "Time spent in each grouper stage, including nested stages",
+        stages["seconds"],
+    )
+    lines += family(
+        "thai_drg_stage_self_seconds_total",
+        "counter",
+        "Time spent in each grouper stage, excluding nested stages",
+        stages["self_seconds"],
+    )
+    lines += family(
+        "thai_drg_grouper_events_total",
+        "counter",
+        "Grouper lookup events (lookups, prefix fallbacks, misses, exclusion checks)",
+        counters,
+    )
+    return lines
+
+
+def render(lines: List[str]) -> str:
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,184 @@
+"""
+Thai DRG Grouper - Multiprocess Grouping Engine
+
+Grouping is CPU-bound pure Python, so large claim sets are spread over a pool
+of worker processes. Each worker loads the tables once (by default through the
+memory-mapped snapshot, so all workers share one physical copy; with the
+``fork`` start method an already loaded grouper is inherited as-is), groups
+whole chunks with ``ThaiDRGGrouper.group_many`` and returns columnar results.
+Chunks are collected in submission order, so output order always matches input.
+"""
+
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from .grouper import ThaiDRGGrouper
+from .snapshot import compile_snapshot, is_snapshot_fresh
+from .types import RESULT_FIELDS, GrouperResult
+
+# (dbf_path, version, backend) -> grouper handed to forked workers
+_INHERITED: Dict[Tuple[str, str, str], ThaiDRGGrouper] = {}
+
+# The grouper of the current worker process
+_worker_grouper: Optional[ThaiDRGGrouper] = None
+
+_CASE_DEFAULTS = {"sdx": None, "procedures": None, "age": None, "sex": None, "los": 1}
+
+
+def _init_worker(dbf_path: str, version: str, backend: str):
+    global _worker_grouper
+    key = (dbf_path, version, backend)
+    _worker_grouper = _INHERITED.get(key) or ThaiDRGGrouper(dbf_path, version, backend=backend)
+
+
+def _group_chunk(columns: Dict[str, list]) -> Dict[str, list]:
+    return _worker_grouper.group_many(columns)
+
+
+def _columns(cases: List[Mapping]) -> Dict[str, list]:
+    columns = {"pdx": [case["pdx"] for case in cases]}
+    for name, default in _CASE_DEFAULTS.items():
+        columns[name] = [case.get(name, default) for case in cases]
+    return columns
+
+
+def _results(out: Dict[str, list]) -> List[GrouperResult]:
+    """Columnar group_many output -> GrouperResult rows"""
+    return [GrouperResult(*row) for row in zip(*(out[name] for name in RESULT_FIELDS))]
+
+
+def _chunks(cases: Iterable[Mapping], size: int) -> Iterator[List[Mapping]]:
+    it = iter(cases)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ParallelGrouper:
+    """
+    Process-pool grouping engine for one version
+
+    Args:
+        dbf_path: Path to folder containing .dbf files
+        version: Version string (e.g., '6.3')
+        workers: Worker processes (default: CPU count); 1 groups in-process
+        chunk_size: Cases per task sent to a worker
+        backend: Table backend used by workers ('mmap' shares one copy)
+        max_pending: Chunks in flight at once (default: 2 x workers), which
+            bounds memory when streaming with imap()
+        grouper: Already loaded grouper for the same version; inherited by
+            workers when processes are forked
+        mp_context: multiprocessing start method ('fork', 'spawn', ...)
+
+    Example:
+        with ParallelGrouper('./data/versions/6.3/data', '6.3', workers=8) as engine:
+            for result in engine.imap(cases):
+                ...
+    """
+
+    def __init__(
+        self,
+        dbf_path: str,
+        version: str = "unknown",
+        workers: Optional[int] = None,
+        chunk_size: int = 1000,
+        backend: str = "mmap",
+        max_pending: Optional[int] = None,
+        grouper: Optional[ThaiDRGGrouper] = None,
+        mp_context: Optional[str] = None,
+    ):
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        self.dbf_path = dbf_path
+        self.version = version
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.chunk_size = chunk_size
+        self.backend = backend
+        self.max_pending = max_pending or 2 * self.workers
+        self._grouper = grouper
+        self._context = multiprocessing.get_context(mp_context)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            return self._start_pool()
+
+    def _start_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            if self.backend == "mmap" and not is_snapshot_fresh(self.dbf_path):
+                # Compile once here instead of racing in every worker
+                compile_snapshot(self.dbf_path)
+            key = (self.dbf_path, self.version, self.backend)
+            if self._context.get_start_method() == "fork":
+                if self._grouper is not None and self._grouper.backend == self.backend:
+                    _INHERITED[key] = self._grouper
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=self._context,
+                initializer=_init_worker,
+                initargs=key,
+            )
+        return self._pool
+
+    def _local_grouper(self) -> ThaiDRGGrouper:
+        if self._grouper is None:
+            self._grouper = ThaiDRGGrouper(self.dbf_path, self.version, backend=self.backend)
+        return self._grouper
+
+    def imap(self, cases: Iterable[Mapping]) -> Iterator[GrouperResult]:
+        """
+        Group cases lazily, yielding results in input order
+
+        Args:
+            cases: Iterable of dicts with group() keyword arguments
+                ('pdx' required; 'sdx', 'procedures', 'age', 'sex', 'los')
+        """
+        yield from self._imap_columns(cases, _results)
+
+    def imap_columns(self, cases: Iterable[Mapping]) -> Iterator[Dict[str, list]]:
+        """Like imap(), but yield each chunk's columnar group_many() output"""
+        yield from self._imap_columns(cases, lambda out: [out])
+
+    def _imap_columns(self, cases, unpack) -> Iterator:
+        if self.workers == 1:
+            grouper = self._local_grouper()
+            for chunk in _chunks(cases, self.chunk_size):
+                yield from unpack(grouper.group_many(_columns(chunk)))
+            return
+
+        pool = self._get_pool()
+        pending = deque()
+        for chunk in _chunks(cases, self.chunk_size):
+            pending.append(pool.submit(_group_chunk, _columns(chunk)))
+            if len(pending) >= self.max_pending:
+                yield from unpack(pending.popleft().result())
+        while pending:
+            yield from unpack(pending.popleft().result())
+
+    def group(self, cases: Iterable[Mapping]) -> List[GrouperResult]:
+        """Group all cases and return the results in input order"""
+        return list(self.imap(cases))
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+                key = (self.dbf_path, self.version, self.backend)
+                # A newer engine for the same version may have replaced the entry
+                if _INHERITED.get(key) is self._grouper:
+                    _INHERITED.pop(key, None)
+
+    def __enter__(self) -> "ParallelGrouper":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,228 @@
+"""
+Thai DRG Grouper - Stage Profiling
+
+Optional per-stage timings and counters for ThaiDRGGrouper. Profiling works
+by shadowing the grouper's stage methods with timed wrappers on the
+instance, so a grouper without profiling runs its plain methods untouched.
+"""
+
+import functools
+import threading
+import time
+from typing import Callable, Dict, List
+
+# Stage -> grouper methods timed under it
+STAGES = {
+    "group": ("group",),
+    "group_many": ("group_many",),
+    "regroup": ("regroup",),
+    "normalize": ("_normalize_icd", "_normalize_proc"),
+    "icd10_lookup": ("_lookup_icd10", "_lookup_icd10_many"),
+    "proc_lookup": ("_lookup_proc",),
+    "cc_exclusion": ("_is_excluded",),
+    "pcl": ("_calculate_pcl",),
+    "dc": ("_resolve_dc",),
+    "drg": ("_find_drg",),
+}
+
+
+def _stage_order(item) -> int:
+    return list(STAGES).index(item[0])
+
+
+class _ThreadRecord:
+    """Timings and counters of one thread, merged on read"""
+
+    __slots__ = ("stages", "counters", "child_ns")
+
+    def __init__(self):
+        # stage -> [calls, total ns, self ns]
+        self.stages: Dict[str, List[int]] = {}
+        self.counters: Dict[str, int] = {}
+        self.child_ns = 0
+
+
+class StageProfiler:
+    """
+    Per-stage timings and counters for one grouper
+
+    Each thread writes to its own record, so the timed path takes no lock.
+    Stage times are reported both inclusive ('seconds') and exclusive of
+    nested stages ('self_seconds'); the self time of 'group' is input
+    validation, cache handling and result construction.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._records: List[_ThreadRecord] = []
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def _record(self) -> _ThreadRecord:
+        record = getattr(self._local, "record", None)
+        if record is None:
+            record = self._local.record = _ThreadRecord()
+            with self._lock:
+                self._records.append(record)
+        return record
+
+    def timed(self, stage: str, func: Callable) -> Callable:
+        """Wrap func so its calls are timed under stage"""
+        clock = time.perf_counter_ns
+        get_record = self._record
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            record = get_record()
+            outer_child = record.child_ns
+            record.child_ns = 0
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                stats = record.stages.get(stage)
+                if stats is None:
+                    stats = record.stages[stage] = [0, 0, 0]
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] += elapsed - record.child_ns
+                record.child_ns = outer_child + elapsed
+
+        return wrapper
+
+    def count(self, name: str, n: int = 1):
+        counters = self._record().counters
+        counters[name] = counters.get(name, 0) + n
+
+    def reset(self):
+        """Zero all timings and counters"""
+        with self._lock:
+            for record in self._records:
+                record.stages.clear()
+                record.counters.clear()
+            self.started = time.time()
+
+    def snapshot(self) -> dict:
+        """
+        Merged timings and counters of all threads
+
+        Returns:
+            {"since": epoch seconds, "stages": {stage: {"calls", "seconds",
+            "self_seconds", "mean_us"}}, "counters": {name: count}}
+        """
+        stages: Dict[str, List[int]] = {}
+        counters: Dict[str, int] = {}
+        with self._lock:
+            records = list(self._records)
+        for record in records:
+            for stage, (calls, total, own) in list(record.stages.items()):
+                merged = stages.setdefault(stage, [0, 0, 0])
+                merged[0] += calls
+                merged[1] += total
+                merged[2] += own
+            for name, n in list(record.counters.items()):
+                counters[name] = counters.get(name, 0) + n
+        return {
+            "since": self.started,
+            "stages": {
+                stage: {
+                    "calls": calls,
+                    "seconds": total / 1e9,
+                    "self_seconds": own / 1e9,
+                    "mean_us": round(total / calls / 1e3, 3) if calls else 0.0,
+                }
+                for stage, (calls, total, own) in sorted(stages.items(), key=_stage_order)
+            },
+            "counters": counters,
+        }
+
+
+def instrument(grouper, profiler: StageProfiler):
+    """Shadow a grouper's stage methods with timed, counting wrappers"""
+    count = profiler.count
+    lookup_icd10 = grouper._lookup_icd10
+    lookup_icd10_many = grouper._lookup_icd10_many
+    lookup_proc = grouper._lookup_proc
+    is_excluded = grouper._is_excluded
+    search_dc = grouper._search_dc
+
+    def counted_lookup_icd10(normalized):
+        info = lookup_icd10(normalized)
+        count("icd10_lookups")
+        if info is None:
+            count("icd10_misses")
+        elif normalized not in grouper._icd10_data:
+            count("icd10_prefix_hits")
+        return info
+
+    def counted_lookup_icd10_many(normalized):
+        infos = lookup_icd10_many(normalized)
+        count("icd10_lookups", len(infos))
+        for code, info in zip(normalized, infos):
+            if info is None:
+                count("icd10_misses")
+            elif code not in grouper._icd10_data:
+                count("icd10_prefix_hits")
+        return infos
+
+    def counted_lookup_proc(normalized):
+        info = lookup_proc(normalized)
+        count("proc_lookups")
+        if info is None:
+            count("proc_misses")
+        return info
+
+    def counted_is_excluded(maincc, pdx_norm):
+        excluded = is_excluded(maincc, pdx_norm)
+        count("exclusion_checks")
+        if excluded:
+            count("exclusions_hit")
+        return excluded
+
+    def counted_search_dc(mdc, pdc, has_or):
+        count("dc_searches")
+        return search_dc(mdc, pdc, has_or)
+
+    # Counting runs inside the timed wrappers, so its cost is charged to the stage
+    counted = {
+        "_lookup_icd10": counted_lookup_icd10,
+        "_lookup_icd10_many": counted_lookup_icd10_many,
+        "_lookup_proc": counted_lookup_proc,
+        "_is_excluded": counted_is_excluded,
+    }
+    for stage, names in STAGES.items():
+        for name in names:
+            func = counted.get(name) or getattr(grouper, name)
+            setattr(grouper, name, profiler.timed(stage, func))
+    grouper._search_dc = counted_search_dc
+
+
+def uninstrument(grouper):
+    """Remove the wrappers installed by instrument()"""
+    for names in STAGES.values():
+        for name in names:
+            grouper.__dict__.pop(name, None)
+    grouper.__dict__.pop("_search_dc", None)
+
+
+def format_profile(profile: dict) -> str:
+    """Stage table and counters of a StageProfiler.snapshot() as text"""
+    stages = profile["stages"]
+    top = stages.get("group") or stages.get("group_many")
+    total = top["seconds"] if top else sum(s["self_seconds"] for s in stages.values())
+    lines = [
+        f"{'stage':<14}{'calls':>10}{'total ms':>12}{'self ms':>12}{'mean us':>10}{'self %':>8}",
+        "-" * 66,
+    ]
+    for stage, s in stages.items():
+        share = s["self_seconds"] / total * 100 if total else 0.0
+        lines.append(
+            f"{stage:<14}{s['calls']:>10,}{s['seconds'] * 1e3:>12.2f}"
+            f"{s['self_seconds'] * 1e3:>12.2f}{s['mean_us']:>10.2f}{share:>7.1f}%"
+        )
+    if profile["counters"]:
+        lines.append("")
+        for name, count in sorted(profile["counters"].items()):
+            lines.append(f"{name:<24}{count:>12,}")
+    return "\n".join(lines)
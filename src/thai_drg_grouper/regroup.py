@@ -0,0 +1,294 @@
+"""
+Thai DRG Grouper - Incremental Regrouping
+
+Regroups a corrected claim from its previous result and a diff, rerunning
+only the stages the diff touches: SDx edits redo the PCL, procedure edits
+redo the OR flag (and the DC if it flips), and DRG and AdjRW follow only if
+their inputs changed. A LOS edit alone recomputes just the AdjRW. Edits
+that change validity (age, or a previous result that did not group) fall
+back to a full group(), as does a previous result that disagrees with the
+tables. The DRG row and AdjRW are always read from the tables, never copied
+from the previous result.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from .types import MDC_NAMES, GrouperResult
+
+# Result fields reported as changed by a regroup
+REGROUP_FIELDS = (
+    "mdc",
+    "dc",
+    "drg",
+    "drg_name",
+    "rw",
+    "adjrw",
+    "pcl",
+    "cc_list",
+    "mcc_list",
+    "has_or_procedure",
+    "is_surgical",
+    "los_status",
+    "is_valid",
+)
+
+# Stages in pipeline order; a full regroup reports all of them
+STAGES = ("validate", "pcl", "dc", "drg", "adjrw")
+
+
+@dataclass
+class CaseDiff:
+    """
+    Edits to a grouped case
+
+    None leaves age, sex and LOS as they were (a diff cannot clear them).
+    Removed codes match every occurrence with the same normalized code.
+    """
+
+    add_sdx: List[str] = field(default_factory=list)
+    remove_sdx: List[str] = field(default_factory=list)
+    add_procedures: List[str] = field(default_factory=list)
+    remove_procedures: List[str] = field(default_factory=list)
+    age: Optional[int] = None
+    sex: Optional[str] = None
+    los: Optional[int] = None
+
+
+@dataclass
+class RegroupResult:
+    """A regrouped case: the new result, the stages rerun and what changed"""
+
+    result: GrouperResult
+    previous: GrouperResult
+    stages: List[str]
+    explanation: List[str]
+
+    def changes(self, fields: Sequence[str] = REGROUP_FIELDS) -> Dict[str, Dict[str, Any]]:
+        """field -> {"previous": ..., "current": ...} for fields that changed"""
+        return {
+            name: {"previous": getattr(self.previous, name), "current": getattr(self.result, name)}
+            for name in fields
+            if getattr(self.previous, name) != getattr(self.result, name)
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "result": self.result.to_dict(),
+            "stages": self.stages,
+            "changes": self.changes(),
+            "explanation": self.explanation,
+        }
+
+
+def _valid_age(age: Optional[int]) -> bool:
+    return age is not None and 0 <= age <= 124
+
+
+def _remove(codes: List[str], removed: List[str], normalize) -> List[str]:
+    if not removed:
+        return list(codes)
+    drop = {normalize(code) for code in removed}
+    return [code for code in codes if normalize(code) not in drop]
+
+
+def _level(code: str, result: GrouperResult) -> str:
+    return " (MCC)" if code in result.mcc_list else " (CC)" if code in result.cc_list else ""
+
+
+def _mismatch(
+    grouper, previous: GrouperResult, pdx_info, has_or: bool, levels: Optional[List]
+) -> bool:
+    """
+    True if previous disagrees with the tables: its MDC and DC with its PDx
+    and OR flag, its PCL with its CC/MCC lists, and (if the CC levels of its
+    SDx are given) those lists with the levels
+    """
+    if not pdx_info:
+        return True
+    if levels is None:
+        cc_list, mcc_list = previous.cc_list, previous.mcc_list
+        listed = set(previous.sdx)
+        if not listed.issuperset(cc_list + mcc_list) or set(cc_list) & set(mcc_list):
+            return True
+    else:
+        cc_list = [code for code, level in zip(previous.sdx, levels) if level == "cc"]
+        mcc_list = [code for code, level in zip(previous.sdx, levels) if level == "mcc"]
+        if previous.cc_list != cc_list or previous.mcc_list != mcc_list:
+            return True
+    return (
+        previous.mdc != pdx_info["mdc"]
+        or previous.has_or_procedure != has_or
+        or previous.dc != grouper._resolve_dc(pdx_info, has_or)
+        or previous.pcl != grouper._pcl(len(cc_list), len(mcc_list))
+    )
+
+
+def regroup_case(
+    grouper, previous: GrouperResult, diff: CaseDiff, verify: bool = False
+) -> RegroupResult:
+    """
+    Apply a diff to a previous result of the same grouper
+
+    The result equals group() of the edited case (apart from grouped_at).
+    The previous MDC and DC are checked against its PDx and its PCL against
+    its CC/MCC lists; a previous result that disagrees regroups in full.
+
+    Args:
+        grouper: ThaiDRGGrouper that produced previous
+        previous: Result to start from
+        diff: Edits to apply
+        verify: Also check the CC/MCC lists and the OR flag against the
+            previous SDx and procedures (for results from outside the
+            process; looks up every previous code)
+    """
+    normalize_icd, normalize_proc = grouper._normalize_icd, grouper._normalize_proc
+    age = previous.age if diff.age is None else diff.age
+    sex = previous.sex if diff.sex is None else diff.sex
+    los = previous.los if diff.los is None else diff.los
+    kept_sdx = _remove(previous.sdx, diff.remove_sdx, normalize_icd)
+    kept_procs = _remove(previous.procedures, diff.remove_procedures, normalize_proc)
+    sdx = kept_sdx + list(diff.add_sdx)
+    procedures = kept_procs + list(diff.add_procedures)
+
+    # OR flag: added procedures can only set it, removals can only clear it
+    def any_or(codes: List[str]) -> bool:
+        infos = map(grouper._lookup_proc, map(normalize_proc, codes))
+        return any(info and info["orp"] for info in infos)
+
+    if previous.version != grouper.version:
+        reason = f"version {previous.version} -> {grouper.version}"
+    elif not previous.is_valid:
+        reason = "previous result was not valid"
+    elif not _valid_age(age):
+        reason = f"invalid age {age}"
+    else:
+        reason = None
+        pdx_norm = normalize_icd(previous.pdx)
+        pdx_info = grouper._lookup_icd10(pdx_norm)
+        # Previous SDx (if verified) and added SDx are looked up in one call
+        checked = previous.sdx if verify else []
+        norms = [normalize_icd(code) for code in checked + list(diff.add_sdx)]
+        infos = grouper._lookup_icd10_many(norms)
+        levels = [grouper._classify_cc(info, n, pdx_norm) for info, n in zip(infos, norms)]
+        added_levels = levels[len(checked) :]
+        if verify:
+            has_or = any_or(previous.procedures)
+            mismatch = _mismatch(grouper, previous, pdx_info, has_or, levels[: len(checked)])
+        else:
+            mismatch = _mismatch(grouper, previous, pdx_info, previous.has_or_procedure, None)
+        if mismatch:
+            reason = "previous result does not match the tables"
+    if reason is not None:
+        result = grouper.group(
+            pdx=previous.pdx, sdx=sdx, procedures=procedures, age=age, sex=sex, los=los
+        )
+        explanation = _explain(previous, result, diff, kept_sdx, kept_procs)
+        return RegroupResult(
+            result, previous, list(STAGES), [f"Regrouped in full: {reason}"] + explanation
+        )
+
+    stages = []
+
+    # PCL: kept SDx keep their level, only added SDx were looked up
+    pcl, cc_list, mcc_list = previous.pcl, list(previous.cc_list), list(previous.mcc_list)
+    if sdx != previous.sdx:
+        stages.append("pcl")
+        level_of = dict.fromkeys(previous.cc_list, "cc")
+        level_of.update(dict.fromkeys(previous.mcc_list, "mcc"))
+        pairs = [(code, level_of.get(code)) for code in kept_sdx]
+        pairs += zip(diff.add_sdx, added_levels)
+        cc_list = [code for code, level in pairs if level == "cc"]
+        mcc_list = [code for code, level in pairs if level == "mcc"]
+        pcl = grouper._pcl(len(cc_list), len(mcc_list))
+
+    has_or, dc = previous.has_or_procedure, previous.dc
+    if has_or and len(kept_procs) < len(previous.procedures):
+        has_or = any_or(procedures)
+    elif not has_or and diff.add_procedures:
+        has_or = any_or(diff.add_procedures)
+    if has_or != previous.has_or_procedure:
+        stages.append("dc")
+        dc = grouper._resolve_dc(pdx_info, has_or)
+
+    if pcl != previous.pcl or dc != previous.dc:
+        stages.append("drg")
+    info = grouper._find_drg(dc, pcl)
+    if los != previous.los or "drg" in stages:
+        stages.append("adjrw")
+    adjrw, los_status = grouper._calculate_adjrw(
+        info["rw"], info["rw0d"], info["wtlos"], info["ot"], los
+    )
+
+    warnings = []
+    if sex is None or sex not in ["M", "F", "1", "2"]:
+        warnings.append(f"Missing or invalid sex: {sex}")
+    is_surgical = has_or or (int(dc[2:]) < 50 if len(dc) >= 4 and dc[2:].isdigit() else False)
+    result = GrouperResult(
+        version=grouper.version,
+        pdx=previous.pdx,
+        sdx=sdx,
+        procedures=procedures,
+        age=age,
+        sex=sex,
+        los=los,
+        mdc=pdx_info["mdc"],
+        mdc_name=MDC_NAMES.get(pdx_info["mdc"], "Unknown"),
+        dc=dc,
+        drg=info["drg"],
+        drg_name=info["name"],
+        rw=info["rw"],
+        rw0d=info["rw0d"],
+        adjrw=adjrw,
+        wtlos=info["wtlos"],
+        ot=info["ot"],
+        pcl=pcl,
+        cc_list=cc_list,
+        mcc_list=mcc_list,
+        has_or_procedure=has_or,
+        is_surgical=is_surgical,
+        los_status=los_status,
+        is_valid=True,
+        errors=[],
+        warnings=warnings,
+        grouped_at=datetime.now().isoformat(),
+    )
+    explanation = _explain(previous, result, diff, kept_sdx, kept_procs)
+    return RegroupResult(result, previous, stages, explanation)
+
+
+def _explain(
+    previous: GrouperResult,
+    result: GrouperResult,
+    diff: CaseDiff,
+    kept_sdx: List[str],
+    kept_procs: List[str],
+) -> List[str]:
+    """Explanation lines: the edits, then the PCL, OR flag, DC, DRG and AdjRW changes"""
+    kept_sdx, kept_procs = set(kept_sdx), set(kept_procs)
+    lines = [
+        f"SDx {code} removed{_level(code, previous)}"
+        for code in previous.sdx
+        if code not in kept_sdx
+    ]
+    lines += [f"SDx {code} added{_level(code, result)}" for code in diff.add_sdx]
+    lines += [f"Procedure {code} removed" for code in previous.procedures if code not in kept_procs]
+    lines += [f"Procedure {code} added" for code in diff.add_procedures]
+    for name, label in (("age", "Age"), ("sex", "Sex"), ("los", "LOS")):
+        if getattr(result, name) != getattr(previous, name):
+            lines.append(f"{label} {getattr(previous, name)} -> {getattr(result, name)}")
+
+    if result.pcl != previous.pcl:
+        lines.append(f"PCL {previous.pcl} -> {result.pcl}")
+    if result.has_or_procedure != previous.has_or_procedure:
+        lines.append("OR procedure " + ("added" if result.has_or_procedure else "removed"))
+    if result.dc != previous.dc:
+        lines.append(f"DC {previous.dc} -> {result.dc}")
+    if result.drg != previous.drg:
+        lines.append(f"DRG {previous.drg} -> {result.drg} ({result.drg_name})")
+    if result.adjrw != previous.adjrw:
+        lines.append(f"AdjRW {previous.adjrw} -> {result.adjrw} ({result.los_status})")
+    elif result.drg == previous.drg:
+        lines.append("DRG and AdjRW unchanged")
+    return lines
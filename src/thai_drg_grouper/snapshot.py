@@ -0,0 +1,448 @@
+"""
+Thai DRG Grouper - Compiled Table Snapshots
+
+Parsing the .dbf files with dbfread is by far the slowest part of building a
+grouper (the CC exclusion table alone has ~250k rows decoded one field at a
+time). The tables are therefore compiled once into a flat binary snapshot that
+lives next to the .dbf files and is loaded with ``struct`` instead.
+
+Snapshot layout (all integers little-endian)::
+
+    header    magic "TDRG", format version (u16), reserved (u16), meta length (u32)
+    meta      UTF-8 JSON: source fingerprints and the section table
+    sections  fixed-width records, one section per table, see ``_SECTIONS``
+    strings   UTF-8 string pool
+
+Every section entry in the meta records its ``struct`` format, record count and
+byte offset (relative to the end of the meta), so code widths follow whatever
+the source .dbf files contain. Variable-length text (procedure descriptions,
+DRG names) is stored in the string pool and referenced by (offset, length).
+"""
+
+import hashlib
+import json
+import os
+import struct
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from dbfread import DBF
+except ImportError:
+    raise ImportError("Please install dbfread: pip install dbfread")
+
+MAGIC = b"TDRG"
+FORMAT_VERSION = 2
+SNAPSHOT_NAME = "tables.snap"
+
+_HEADER = struct.Struct("<4sHHI")
+CODE_ENCODING = "ascii"
+
+# Section name -> record layout with "{...}" placeholders for code widths
+_SECTIONS = {
+    # code, mdc, pdc, cc, maincc, dclmain, trauma, ccrow
+    "icd10": "<{code}s{mdc}s{pdc}s?{maincc}s{dclmain}s?H",
+    # prefix, row index into icd10 (prefixes of 5+ char codes, first code wins)
+    "icd10_alias": "<{code}sI",
+    # code, orp, desc offset, desc length
+    "proc": "<{proc}s?IH",
+    # dc, mdc, drg, rw, rw0d, wtlos, ot, name offset, name length
+    "drg": "<{dc}s{mdc}s{drg}sdddiIH",
+    # cc, notfor
+    "ccex": "<{ccex}s{ccex}s",
+}
+
+# Compiled tables: section name -> list of row tuples (strings decoded)
+Tables = Dict[str, List[tuple]]
+
+
+def find_dbf_files(dbf_path: str) -> Dict[str, Optional[str]]:
+    """Find the i10/proc/drg/ccex .dbf files in a folder"""
+    dbf_files = {"i10": None, "proc": None, "drg": None, "ccex": None}
+
+    for f in sorted(os.listdir(dbf_path)):
+        fl = f.lower()
+        if fl.endswith(".dbf"):
+            if "i10" in fl:
+                dbf_files["i10"] = f
+            elif "proc" in fl:
+                dbf_files["proc"] = f
+            elif "drg" in fl and "ccex" not in fl:
+                dbf_files["drg"] = f
+            elif "ccex" in fl or ("cc" in fl and "drg" not in fl):
+                dbf_files["ccex"] = f
+
+    return dbf_files
+
+
+def snapshot_path(dbf_path: str) -> str:
+    return os.path.join(dbf_path, SNAPSHOT_NAME)
+
+
+def read_dbf_tables(dbf_path: str) -> Tables:
+    """Parse the .dbf files and compile them into snapshot tables"""
+    dbf_files = find_dbf_files(dbf_path)
+    icd10, proc, drg, ccex = [], [], [], []
+
+    if dbf_files["i10"]:
+        for rec in DBF(os.path.join(dbf_path, dbf_files["i10"]), encoding="cp874"):
+            icd10.append(
+                (
+                    rec["CODE"].strip().upper(),
+                    rec["MDC"].strip(),
+                    rec["PDC"].strip(),
+                    bool(rec.get("CC")),
+                    (rec.get("MAINCC") or "").strip(),
+                    (rec.get("DCLMAIN") or "").strip(),
+                    str(rec.get("TRAUMA", "")).strip() == "T",
+                    int(rec.get("CCROW") or 0),
+                )
+            )
+
+    if dbf_files["proc"]:
+        for rec in DBF(os.path.join(dbf_path, dbf_files["proc"]), encoding="cp874"):
+            proc.append(
+                (
+                    str(rec["CODE"]).strip(),
+                    str(rec.get("ORP", "")).strip().upper() == "Y",
+                    str(rec.get("DESC", "")).strip(),
+                )
+            )
+
+    if dbf_files["drg"]:
+        for rec in DBF(os.path.join(dbf_path, dbf_files["drg"]), encoding="cp874"):
+            drg.append(
+                (
+                    rec["DC"].strip(),
+                    rec["MDC"].strip(),
+                    rec["DRG"].strip(),
+                    float(rec.get("RW") or 0),
+                    float(rec.get("RW0D") or 0),
+                    float(rec.get("WTLOS") or 0),
+                    int(rec.get("OT") or 0),
+                    str(rec.get("DRGNAME") or "").strip(),
+                )
+            )
+
+    if dbf_files["ccex"]:
+        for rec in DBF(os.path.join(dbf_path, dbf_files["ccex"]), encoding="cp874"):
+            ccex.append((rec["CC10"].strip().upper(), rec["NOTFOR10"].strip().upper()))
+
+    return compile_tables(icd10, proc, drg, ccex)
+
+
+def compile_tables(
+    icd10: List[tuple], proc: List[tuple], drg: List[tuple], ccex: List[tuple]
+) -> Tables:
+    """
+    Normalize raw .dbf rows into snapshot tables
+
+    ICD-10 and procedure rows are de-duplicated (last row wins) and sorted by
+    code. Truncated ICD-10 prefixes (5/4/3 chars) that are not codes themselves
+    resolve to the first longer code carrying them, in .dbf order. DRG rows keep
+    their .dbf order; CC exclusion pairs are de-duplicated and sorted.
+    """
+    icd10_rows = {row[0]: row for row in icd10}
+    aliases: Dict[str, str] = {}
+    for row in icd10:
+        code = row[0]
+        if len(code) > 4:
+            for length in (5, 4, 3):
+                base = code[:length]
+                if base not in icd10_rows and base not in aliases:
+                    aliases[base] = code
+
+    icd10_sorted = sorted(icd10_rows.values())
+    row_index = {row[0]: i for i, row in enumerate(icd10_sorted)}
+
+    return {
+        "icd10": icd10_sorted,
+        "icd10_alias": sorted((prefix, row_index[code]) for prefix, code in aliases.items()),
+        "proc": sorted({row[0]: row for row in proc}.values()),
+        "drg": list(drg),
+        "ccex": sorted(set(ccex)),
+    }
+
+
+def _fingerprint(path: str, with_hash: bool = True) -> dict:
+    st = os.stat(path)
+    fp = {"name": os.path.basename(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if with_hash:
+        fp["sha256"] = _sha256(path)
+    return fp
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def source_fingerprints(dbf_path: str, with_hash: bool = True) -> Dict[str, Optional[dict]]:
+    return {
+        kind: _fingerprint(os.path.join(dbf_path, name), with_hash) if name else None
+        for kind, name in find_dbf_files(dbf_path).items()
+    }
+
+
+def sources_match(
+    dbf_path: str, recorded: Dict[str, Optional[dict]], moved: Optional[Dict[str, int]] = None
+) -> bool:
+    """Compare recorded fingerprints against the .dbf files on disk
+
+    Size and mtime are checked first; a file whose mtime moved but whose
+    content hash is unchanged (e.g. after a fresh checkout) still counts as
+    matching, and is reported in ``moved`` (kind -> mtime_ns seen before
+    hashing) so the caller can record the new mtime.
+    """
+    current = source_fingerprints(dbf_path, with_hash=False)
+    if set(current) != set(recorded or {}):
+        return False
+    for kind, fp in current.items():
+        rec = recorded[kind]
+        if fp is None or rec is None:
+            if fp is not rec:
+                return False
+            continue
+        if fp["name"] != rec.get("name") or fp["size"] != rec.get("size"):
+            return False
+        if fp["mtime_ns"] != rec.get("mtime_ns"):
+            if _sha256(os.path.join(dbf_path, fp["name"])) != rec.get("sha256"):
+                return False
+            if moved is not None:
+                moved[kind] = fp["mtime_ns"]
+    return True
+
+
+def _record_mtimes(path: str, sources: dict, moved: Dict[str, int], buf=None):
+    """
+    Rewrite a snapshot's meta with the new mtimes of unchanged sources, so
+    later loads match on size and mtime instead of hashing the files again
+
+    ``sources`` are the fingerprints that were checked; a snapshot replaced
+    since then is left alone. Best effort: a snapshot that cannot be
+    rewritten (read-only folder) stays valid and is hashed again next time.
+    """
+    if not moved:
+        return
+    try:
+        if buf is None:
+            with open(path, "rb") as f:
+                buf = f.read()
+        meta = read_snapshot_meta(buf)
+        if meta is None or meta.get("sources") != sources:
+            return
+        data = bytes(buf[meta.pop("data_offset") :])
+        for kind, mtime_ns in moved.items():
+            meta["sources"][kind]["mtime_ns"] = mtime_ns
+        _write_snapshot_file(path, json.dumps(meta, sort_keys=True).encode("utf-8"), [data])
+    except OSError:
+        pass
+
+
+def _widths(tables: Tables) -> Dict[str, int]:
+    def width(values) -> int:
+        return max([len(v.encode(CODE_ENCODING)) for v in values] + [1])
+
+    icd10 = tables["icd10"]
+    return {
+        "code": width([r[0] for r in icd10] + [a[0] for a in tables["icd10_alias"]]),
+        "mdc": width([r[1] for r in icd10] + [r[1] for r in tables["drg"]]),
+        "pdc": width([r[2] for r in icd10]),
+        "maincc": width([r[4] for r in icd10]),
+        "dclmain": width([r[5] for r in icd10]),
+        "proc": width([r[0] for r in tables["proc"]]),
+        "dc": width([r[0] for r in tables["drg"]]),
+        "drg": width([r[2] for r in tables["drg"]]),
+        "ccex": width([c for pair in tables["ccex"] for c in pair]),
+    }
+
+
+def _encode_rows(name: str, rows: List[tuple], pool: bytearray) -> List[tuple]:
+    def enc(value: str) -> bytes:
+        return value.encode(CODE_ENCODING)
+
+    def text(value: str) -> Tuple[int, int]:
+        data = value.encode("utf-8")
+        offset = len(pool)
+        pool.extend(data)
+        return offset, len(data)
+
+    if name == "icd10":
+        return [
+            (enc(c), enc(m), enc(p), cc, enc(mc), enc(dm), t, cr)
+            for c, m, p, cc, mc, dm, t, cr in rows
+        ]
+    if name == "icd10_alias":
+        return [(enc(prefix), idx) for prefix, idx in rows]
+    if name == "proc":
+        return [(enc(code), orp) + text(desc) for code, orp, desc in rows]
+    if name == "drg":
+        return [
+            (enc(dc), enc(mdc), enc(drg), rw, rw0d, wtlos, ot) + text(drg_name)
+            for dc, mdc, drg, rw, rw0d, wtlos, ot, drg_name in rows
+        ]
+    return [(enc(cc), enc(notfor)) for cc, notfor in rows]
+
+
+def write_snapshot(dbf_path: str, tables: Tables, output: Optional[str] = None) -> str:
+    """Write compiled tables to a snapshot file (atomically) and return its path"""
+    output = output or snapshot_path(dbf_path)
+    widths = _widths(tables)
+    pool = bytearray()
+
+    sections, blobs, offset = {}, [], 0
+    for name, layout in _SECTIONS.items():
+        packer = struct.Struct(layout.format(**widths))
+        blob = b"".join(packer.pack(*row) for row in _encode_rows(name, tables[name], pool))
+        sections[name] = {
+            "fmt": packer.format,
+            "count": len(tables[name]),
+            "keys": len({row[0] for row in tables[name]}),
+            "size": packer.size,
+            "offset": offset,
+        }
+        blobs.append(blob)
+        offset += len(blob)
+
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "created_at": datetime.now().isoformat(),
+        "sources": source_fingerprints(dbf_path),
+        "sections": sections,
+        "strings": {"offset": offset, "length": len(pool)},
+    }
+    meta_bytes = json.dumps(meta, sort_keys=True).encode("utf-8")
+    _write_snapshot_file(output, meta_bytes, blobs + [pool])
+    return output
+
+
+def _write_snapshot_file(output: str, meta_bytes: bytes, blobs: List[bytes]):
+    """Write header, meta and data blobs to a temporary file and move it into place"""
+    tmp = f"{output}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(meta_bytes)))
+            f.write(meta_bytes)
+            for blob in blobs:
+                f.write(blob)
+        os.replace(tmp, output)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def compile_snapshot(dbf_path: str, output: Optional[str] = None) -> str:
+    """Parse the .dbf files in ``dbf_path`` and write a fresh snapshot"""
+    return write_snapshot(dbf_path, read_dbf_tables(dbf_path), output)
+
+
+def read_snapshot_meta(buf) -> Optional[dict]:
+    """Parse header and meta from a snapshot buffer, None if not a valid snapshot"""
+    if len(buf) < _HEADER.size:
+        return None
+    magic, version, _, meta_len = _HEADER.unpack_from(buf, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        return None
+    try:
+        meta = json.loads(bytes(buf[_HEADER.size : _HEADER.size + meta_len]).decode("utf-8"))
+    except ValueError:
+        return None
+    meta["data_offset"] = _HEADER.size + meta_len
+    return meta
+
+
+class _CodeDecoder(dict):
+    """Memoizing bytes -> str decoder for padded code fields
+
+    Codes repeat heavily (the CC exclusion table has ~250k pairs over a few
+    thousand distinct codes), so each distinct value is decoded only once and
+    every other lookup is a plain dict hit.
+    """
+
+    def __missing__(self, value: bytes) -> str:
+        code = self[value] = value.rstrip(b"\x00").decode(CODE_ENCODING)
+        return code
+
+
+def decode_section(buf, meta: dict, name: str, dec: Optional[_CodeDecoder] = None) -> List[tuple]:
+    """Decode one section of a snapshot buffer into row tuples"""
+    base = meta["data_offset"]
+    sec = meta["sections"][name]
+    start = base + sec["offset"]
+    rows = struct.iter_unpack(sec["fmt"], buf[start : start + sec["count"] * sec["size"]])
+    dec = dec if dec is not None else _CodeDecoder()
+
+    if name == "icd10":
+        return [
+            (dec[c], dec[m], dec[p], cc, dec[mc], dec[dm], t, cr)
+            for c, m, p, cc, mc, dm, t, cr in rows
+        ]
+    if name == "icd10_alias":
+        return [(dec[prefix], idx) for prefix, idx in rows]
+    if name == "ccex":
+        return [(dec[cc], dec[notfor]) for cc, notfor in rows]
+
+    strings = meta["strings"]
+    pool = bytes(buf[base + strings["offset"] : base + strings["offset"] + strings["length"]])
+
+    def text(offset: int, length: int) -> str:
+        return pool[offset : offset + length].decode("utf-8")
+
+    if name == "proc":
+        return [(dec[code], orp, text(o, n)) for code, orp, o, n in rows]
+    return [
+        (dec[dc], dec[mdc], dec[drg], rw, rw0d, wtlos, ot, text(o, n))
+        for dc, mdc, drg, rw, rw0d, wtlos, ot, o, n in rows
+    ]
+
+
+def decode_tables(buf, meta: dict) -> Tables:
+    """Decode every section of a snapshot buffer into row tuples"""
+    dec = _CodeDecoder()
+    return {name: decode_section(buf, meta, name, dec) for name in _SECTIONS}
+
+
+def is_snapshot_fresh(dbf_path: str, path: Optional[str] = None) -> bool:
+    path = path or snapshot_path(dbf_path)
+    try:
+        with open(path, "rb") as f:
+            head = f.read(_HEADER.size)
+            if len(head) < _HEADER.size:
+                return False
+            meta = read_snapshot_meta(head + f.read(_HEADER.unpack(head)[3]))
+    except (OSError, struct.error):
+        return False
+    moved = {}
+    if meta is None or not sources_match(dbf_path, meta.get("sources"), moved):
+        return False
+    _record_mtimes(path, meta["sources"], moved)
+    return True
+
+
+def load_snapshot(dbf_path: str, path: Optional[str] = None) -> Optional[Tables]:
+    """
+    Load compiled tables from the snapshot next to the .dbf files
+
+    Returns None when the snapshot is missing, unreadable, written by another
+    format version, or stale with respect to the .dbf files.
+    """
+    path = path or snapshot_path(dbf_path)
+    try:
+        with open(path, "rb") as f:
+            buf = f.read()
+    except OSError:
+        return None
+
+    meta = read_snapshot_meta(buf)
+    moved = {}
+    if meta is None or not sources_match(dbf_path, meta.get("sources"), moved):
+        return None
+    try:
+        tables = decode_tables(buf, meta)
+    except (KeyError, struct.error, UnicodeDecodeError):
+        return None
+    _record_mtimes(path, meta["sources"], moved, buf)
+    return tables
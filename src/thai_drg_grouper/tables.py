@@ -0,0 +1,610 @@
+"""
+Thai DRG Grouper - Lookup Tables and Indexes
+
+The in-memory backend keeps its tables compact: ``CompactICD10Table`` and
+``CompactProcTable`` map each code to a row number and keep the attributes in
+parallel ``array`` columns, with repeated strings interned into one pool and
+stored as integer IDs. Lookups return ``RowView`` objects that read a row on
+access. ``CCExclusionIndex`` stores each CC's exclusion codes as a sorted
+range of integer code IDs and answers CC exclusion checks by bisection.
+
+The ``Mapped*`` classes are read-only views over a compiled table snapshot
+(see ``snapshot.py``). The
+snapshot file is mapped with ``mmap`` and probed in place with binary search
+over its sorted fixed-width records, so the ICD-10, procedure and CC exclusion
+tables are never materialized as per-row dicts. Every process mapping the same
+snapshot shares one physical copy through the OS page cache, which keeps memory
+flat as the number of API workers grows.
+
+The views implement ``Mapping`` and return the same record shapes as the
+in-memory tables, so ``ThaiDRGGrouper`` uses either backend unchanged.
+"""
+
+import mmap
+import re
+import struct
+from array import array
+from bisect import bisect_left
+from typing import Collection, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from .snapshot import CODE_ENCODING, read_snapshot_meta, snapshot_path, sources_match
+
+_KEY_WIDTH = re.compile(r"^<(\d+)s")
+
+
+class RowView(Mapping):
+    """
+    Read-only view of one row of a compact table
+
+    Behaves like the info dict of the row (``info["mdc"]``, ``info.get()``,
+    ``dict(info)``, equality with dicts) without holding a copy of it.
+    ``columns`` maps each field to ``(column, decode)``; the value is
+    ``decode[column[row]]``, or ``column[row]`` when decode is None.
+    """
+
+    __slots__ = ("_columns", "_row")
+
+    def __init__(self, columns: Dict[str, Tuple[Sequence, Optional[Sequence]]], row: int):
+        self._columns = columns
+        self._row = row
+
+    def __getitem__(self, key: str):
+        column, decode = self._columns[key]
+        value = column[self._row]
+        return value if decode is None else decode[value]
+
+    def get(self, key: str, default=None):
+        entry = self._columns.get(key)
+        if entry is None:
+            return default
+        column, decode = entry
+        value = column[self._row]
+        return value if decode is None else decode[value]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._columns)
+
+    def __len__(self) -> int:
+        return len(self._columns)
+
+    def __repr__(self) -> str:
+        return f"RowView({dict(self)!r})"
+
+
+# Decodes 0/1 flag columns to bools
+_FLAGS = (False, True)
+
+
+class _Slices:
+    """Strings stored back to back in one str; item i is text[offsets[i]:offsets[i + 1]]"""
+
+    __slots__ = ("text", "offsets")
+
+    def __init__(self, strings: Iterable[str]):
+        offsets = [0]
+        parts = []
+        for value in strings:
+            parts.append(value)
+            offsets.append(offsets[-1] + len(value))
+        self.text = "".join(parts)
+        self.offsets = array("I", offsets)
+
+    def __getitem__(self, i: int) -> str:
+        return self.text[self.offsets[i] : self.offsets[i + 1]]
+
+
+class _StringPool:
+    """Interns strings into integer IDs while a table is built"""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.strings: list = []
+
+    def id(self, value: str) -> int:
+        i = self.ids.get(value)
+        if i is None:
+            i = self.ids[value] = len(self.strings)
+            self.strings.append(value)
+        return i
+
+
+class _CompactTable(Mapping):
+    """
+    Code -> RowView over parallel columns (subclasses fill _rows, _size and
+    _columns); _rows may hold extra index nodes mapped to -1, which are not keys
+    """
+
+    _rows: Dict[str, int]
+    _size: int
+    _columns: Dict[str, Tuple[Sequence, Optional[Sequence]]]
+
+    def get(self, code: str, default=None):
+        row = self._rows.get(code, -1)
+        return default if row < 0 else RowView(self._columns, row)
+
+    def __getitem__(self, code: str) -> RowView:
+        row = self._rows.get(code, -1)
+        if row < 0:
+            raise KeyError(code)
+        return RowView(self._columns, row)
+
+    def __contains__(self, code) -> bool:
+        return self._rows.get(code, -1) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        return (code for code, row in self._rows.items() if row >= 0)
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class CompactICD10Table(_CompactTable):
+    """
+    ICD-10 code -> info view, including truncated-prefix aliases
+
+    ``_rows`` doubles as a flattened code trie: every prefix of three or more
+    characters of a key is a node. Nodes that are not keys carry the row of
+    their own longest key prefix, encoded as ``-2 - row`` (-1 for none), so
+    the answer for a code is read off the deepest node among its prefixes.
+    Nodes are closed under taking prefixes, so that node is found by a binary
+    search over the prefix length (at most three probes).
+
+    Args:
+        rows: (code, mdc, pdc, cc, maincc, dclmain, trauma, ccrow) tuples
+        aliases: (prefix, row number) pairs
+    """
+
+    def __init__(self, rows: Iterable[tuple], aliases: Iterable[Tuple[str, int]] = ()):
+        pool = _StringPool()
+        self._rows = {}
+        columns = {name: [] for name in ("mdc", "pdc", "cc", "maincc", "dclmain", "trauma")}
+        ccrow = []
+        for i, (code, mdc, pdc, cc, maincc, dclmain, trauma, row_ccrow) in enumerate(rows):
+            self._rows[code] = i
+            columns["mdc"].append(pool.id(mdc))
+            columns["pdc"].append(pool.id(pdc))
+            columns["cc"].append(cc)
+            columns["maincc"].append(pool.id(maincc))
+            columns["dclmain"].append(pool.id(dclmain))
+            columns["trauma"].append(trauma)
+            ccrow.append(row_ccrow)
+        for prefix, row in aliases:
+            self._rows[prefix] = row
+        self._size = len(self._rows)
+        nodes = {code[:n] for code in self._rows for n in range(3, len(code))}
+        for node in sorted(nodes - self._rows.keys(), key=len):
+            parent = self._rows.get(node[:-1], -1)
+            self._rows[node] = parent if parent < 0 else -2 - parent
+
+        strings = pool.strings
+        self._columns = {
+            "mdc": (array("I", columns["mdc"]), strings),
+            "pdc": (array("I", columns["pdc"]), strings),
+            "cc": (array("b", columns["cc"]), _FLAGS),
+            "maincc": (array("I", columns["maincc"]), strings),
+            "dclmain": (array("I", columns["dclmain"]), strings),
+            "trauma": (array("b", columns["trauma"]), _FLAGS),
+            "ccrow": (array("i", ccrow), None),
+        }
+
+    def _longest_prefix(self, code: str) -> int:
+        """Row of the longest proper prefix (3-6 characters) of code that is a key, or -1"""
+        rows = self._rows
+        found = -1
+        lo, hi = 3, min(len(code) - 1, 6)
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            row = rows.get(code[:mid])
+            if row is None:
+                hi = mid - 1
+            else:
+                found = row
+                lo = mid + 1
+        return found if found >= 0 else -2 - found
+
+    def lookup(self, code: str) -> Optional[RowView]:
+        """View of code, or of its longest truncation prefix that is a key"""
+        row = self._rows.get(code, -1)
+        if row < 0:
+            row = self._longest_prefix(code)
+        return RowView(self._columns, row) if row >= 0 else None
+
+    def lookup_many(self, codes: Iterable[str]) -> List[Optional[RowView]]:
+        """lookup() of every code in one call"""
+        rows, columns, longest_prefix = self._rows, self._columns, self._longest_prefix
+        views = []
+        for code in codes:
+            row = rows.get(code, -1)
+            if row < 0:
+                row = longest_prefix(code)
+            views.append(RowView(columns, row) if row >= 0 else None)
+        return views
+
+
+class CompactProcTable(_CompactTable):
+    """
+    Procedure code -> info view; 4-digit codes also answer to "12.34"
+
+    Args:
+        rows: (code, orp, desc) tuples
+    """
+
+    def __init__(self, rows: Iterable[tuple]):
+        self._rows = {}
+        orp, descs = [], []
+        for i, (code, row_orp, desc) in enumerate(rows):
+            self._rows[code] = i
+            orp.append(row_orp)
+            descs.append(desc)
+        for code, i in list(self._rows.items()):
+            if len(code) == 4 and code.isdigit():
+                self._rows[f"{code[:2]}.{code[2:]}"] = i
+        self._size = len(self._rows)
+
+        self._columns = {
+            "orp": (array("b", orp), _FLAGS),
+            "desc": (range(len(descs)), _Slices(descs)),
+        }
+
+
+class CCExclusionIndex(Mapping):
+    """
+    CC code -> tuple of PDx codes/prefixes it is excluded for, with
+    precomputed exclusion checks
+
+    A CC is excluded for a PDx when one of its exclusion codes is a prefix of
+    the PDx, or starts with the first three characters of the PDx. Every
+    distinct exclusion code gets an integer ID in sorted code order, and each
+    CC keeps the sorted IDs of its codes as a slice of one ``array``:
+
+    - codes starting with a given head (up to three characters) have
+      consecutive IDs, so the second rule is one bisection of the CC's slice
+      against the precomputed ID range of ``pdx[:3]``
+    - a prefix of the PDx that is three or more characters long starts with
+      ``pdx[:3]``, so the first rule only has to probe the few codes shorter
+      than that (``pdx[:1]``, ``pdx[:2]``) by ID
+    """
+
+    def __init__(self, exclusions: Mapping[str, Collection[str]]):
+        codes = sorted(set().union(*exclusions.values())) if exclusions else []
+        self._codes = codes
+        self._code_ids = {code: i for i, code in enumerate(codes)}
+        self._short = tuple(sorted({len(code) for code in codes if len(code) < 3}))
+
+        # Head (first 0-3 characters of a code) -> range of IDs starting with it
+        self._heads: Dict[str, Tuple[int, int]] = {}
+        for i, code in enumerate(codes):
+            head = code[:3]
+            for k in range(len(head) + 1):
+                lo, _ = self._heads.get(head[:k], (i, i))
+                self._heads[head[:k]] = (lo, i + 1)
+
+        ids = []
+        self._spans: Dict[str, Tuple[int, int]] = {}
+        for cc, cc_codes in exclusions.items():
+            start = len(ids)
+            ids.extend(sorted(self._code_ids[code] for code in set(cc_codes)))
+            self._spans[cc] = (start, len(ids))
+        self._ids = array("I", ids)
+
+    def __getitem__(self, cc: str) -> tuple:
+        start, end = self._spans[cc]
+        return tuple(self._codes[i] for i in self._ids[start:end])
+
+    def __contains__(self, cc) -> bool:
+        return cc in self._spans
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._spans)
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+    def excludes(self, cc: str, pdx: str) -> bool:
+        span = self._spans.get(cc)
+        if span is None:
+            return False
+        start, end = span
+        ids = self._ids
+        head = self._heads.get(pdx[:3])
+        if head is not None:
+            i = bisect_left(ids, head[0], start, end)
+            if i < end and ids[i] < head[1]:
+                return True
+        for n in self._short:
+            if n >= len(pdx):
+                break
+            code_id = self._code_ids.get(pdx[:n])
+            if code_id is not None:
+                i = bisect_left(ids, code_id, start, end)
+                if i < end and ids[i] == code_id:
+                    return True
+        return False
+
+
+class _Section:
+    """Sorted fixed-width records of one snapshot section"""
+
+    def __init__(self, buf, meta: dict, name: str):
+        sec = meta["sections"][name]
+        self.buf = buf
+        self.offset = meta["data_offset"] + sec["offset"]
+        self.count = sec["count"]
+        self.keys = sec["keys"]
+        self.record = struct.Struct(sec["fmt"])
+        self.size = self.record.size
+        self.key_width = int(_KEY_WIDTH.match(sec["fmt"]).group(1))
+
+    def encode_key(self, code: str) -> Optional[bytes]:
+        """Pad a code to the key width, None if it cannot occur in this section"""
+        try:
+            key = code.encode(CODE_ENCODING)
+        except UnicodeEncodeError:
+            return None
+        if len(key) > self.key_width:
+            return None
+        return key.ljust(self.key_width, b"\x00")
+
+    def key_at(self, i: int) -> bytes:
+        start = self.offset + i * self.size
+        return self.buf[start : start + self.key_width]
+
+    def bisect(self, key: bytes, right: bool = False) -> int:
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            k = self.key_at(mid)
+            if k < key or (right and k == key):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find(self, key: bytes) -> int:
+        i = self.bisect(key)
+        return i if i < self.count and self.key_at(i) == key else -1
+
+    def unpack(self, i: int) -> tuple:
+        return self.record.unpack_from(self.buf, self.offset + i * self.size)
+
+
+def _dec(value: bytes) -> str:
+    return value.rstrip(b"\x00").decode(CODE_ENCODING)
+
+
+class MappedICD10Table(Mapping):
+    """ICD-10 code -> info dict, including truncated-prefix aliases"""
+
+    def __init__(self, rows: _Section, aliases: _Section):
+        self._rows = rows
+        self._aliases = aliases
+
+    def _row(self, code: str) -> int:
+        key = self._rows.encode_key(code)
+        if key is None:
+            return -1
+        i = self._rows.find(key)
+        if i < 0:
+            j = self._aliases.find(key)
+            if j >= 0:
+                i = self._aliases.unpack(j)[1]
+        return i
+
+    def get(self, code: str, default=None):
+        i = self._row(code)
+        if i < 0:
+            return default
+        _, mdc, pdc, cc, maincc, dclmain, trauma, ccrow = self._rows.unpack(i)
+        return {
+            "mdc": _dec(mdc),
+            "pdc": _dec(pdc),
+            "cc": cc,
+            "maincc": _dec(maincc),
+            "dclmain": _dec(dclmain),
+            "trauma": trauma,
+            "ccrow": ccrow,
+        }
+
+    def lookup(self, code: str) -> Optional[dict]:
+        """Info of code, or of its longest truncation prefix (6-3 characters) that is a key"""
+        info = self.get(code)
+        if info is None:
+            for n in range(min(len(code) - 1, 6), 2, -1):
+                info = self.get(code[:n])
+                if info is not None:
+                    break
+        return info
+
+    def lookup_many(self, codes: Iterable[str]) -> List[Optional[dict]]:
+        """lookup() of every code in one call"""
+        return [self.lookup(code) for code in codes]
+
+    def __getitem__(self, code: str) -> dict:
+        info = self.get(code)
+        if info is None:
+            raise KeyError(code)
+        return info
+
+    def __contains__(self, code) -> bool:
+        return isinstance(code, str) and self._row(code) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        for section in (self._rows, self._aliases):
+            for i in range(section.count):
+                yield _dec(section.key_at(i))
+
+    def __len__(self) -> int:
+        return self._rows.count + self._aliases.count
+
+
+class MappedProcTable(Mapping):
+    """Procedure code -> info dict; 4-digit codes also answer to "12.34" """
+
+    def __init__(self, rows: _Section, pool_offset: int):
+        self._rows = rows
+        self._pool_offset = pool_offset
+        self._dotted: Optional[int] = None
+
+    @staticmethod
+    def _undot(code: str) -> str:
+        if len(code) == 5 and code[2] == "." and (code[:2] + code[3:]).isdigit():
+            return code[:2] + code[3:]
+        return code
+
+    def _row(self, code: str) -> int:
+        key = self._rows.encode_key(self._undot(code))
+        return -1 if key is None else self._rows.find(key)
+
+    def get(self, code: str, default=None):
+        i = self._row(code)
+        if i < 0:
+            return default
+        _, orp, offset, length = self._rows.unpack(i)
+        start = self._pool_offset + offset
+        return {"orp": orp, "desc": self._rows.buf[start : start + length].decode("utf-8")}
+
+    def __getitem__(self, code: str) -> dict:
+        info = self.get(code)
+        if info is None:
+            raise KeyError(code)
+        return info
+
+    def __contains__(self, code) -> bool:
+        return isinstance(code, str) and self._row(code) >= 0
+
+    def _codes(self) -> Iterator[str]:
+        for i in range(self._rows.count):
+            yield _dec(self._rows.key_at(i))
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._codes()
+        for code in self._codes():
+            if len(code) == 4 and code.isdigit():
+                yield f"{code[:2]}.{code[2:]}"
+
+    def __len__(self) -> int:
+        if self._dotted is None:
+            self._dotted = sum(1 for c in self._codes() if len(c) == 4 and c.isdigit())
+        return self._rows.count + self._dotted
+
+
+class MappedCCExclusionTable(Mapping):
+    """CC code -> tuple of PDx codes/prefixes it is excluded for"""
+
+    def __init__(self, pairs: _Section):
+        self._pairs = pairs
+
+    def _range(self, cc: str) -> Tuple[int, int]:
+        key = self._pairs.encode_key(cc)
+        if key is None:
+            return 0, 0
+        return self._pairs.bisect(key), self._pairs.bisect(key, right=True)
+
+    def get(self, cc: str, default=None):
+        lo, hi = self._range(cc)
+        if lo == hi:
+            return default
+        return tuple(_dec(self._pairs.unpack(i)[1]) for i in range(lo, hi))
+
+    def __getitem__(self, cc: str) -> tuple:
+        excl = self.get(cc)
+        if excl is None:
+            raise KeyError(cc)
+        return excl
+
+    def __contains__(self, cc) -> bool:
+        if not isinstance(cc, str):
+            return False
+        lo, hi = self._range(cc)
+        return lo < hi
+
+    def __iter__(self) -> Iterator[str]:
+        last = None
+        for i in range(self._pairs.count):
+            key = self._pairs.key_at(i)
+            if key != last:
+                last = key
+                yield _dec(key)
+
+    def __len__(self) -> int:
+        return self._pairs.keys
+
+    def _find_second(self, value: bytes, lo: int, hi: int) -> int:
+        """First pair in [lo, hi) whose exclusion code is >= value"""
+        width = self._pairs.key_width
+        buf, offset, size = self._pairs.buf, self._pairs.offset + width, self._pairs.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = offset + mid * size
+            if buf[start : start + width] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def excludes(self, cc: str, pdx: str) -> bool:
+        """Same rule as CCExclusionIndex.excludes, by binary search in the mapped pairs"""
+        lo, hi = self._range(cc)
+        if lo == hi:
+            return False
+        width = self._pairs.key_width
+        try:
+            encoded = pdx.encode(CODE_ENCODING)
+        except UnicodeEncodeError:
+            return False
+
+        # Some exclusion code starts with pdx[:3]
+        head = encoded[:3]
+        i = self._find_second(head, lo, hi)
+        if i < hi:
+            start = self._pairs.offset + i * self._pairs.size + width
+            if self._pairs.buf[start : start + len(head)] == head:
+                return True
+
+        # Some exclusion code is a prefix of pdx
+        for n in range(min(len(encoded), width) + 1):
+            key = encoded[:n].ljust(width, b"\x00")
+            i = self._find_second(key, lo, hi)
+            if i < hi:
+                start = self._pairs.offset + i * self._pairs.size + width
+                if self._pairs.buf[start : start + width] == key:
+                    return True
+        return False
+
+
+class MappedTables:
+    """
+    Memory-mapped snapshot tables for one version
+
+    Args:
+        dbf_path: Folder containing the .dbf files and a fresh ``tables.snap``
+
+    Raises:
+        OSError: If the snapshot cannot be opened
+        ValueError: If the snapshot is invalid or stale
+    """
+
+    def __init__(self, dbf_path: str):
+        self.path = snapshot_path(dbf_path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        meta = read_snapshot_meta(self._mm)
+        if meta is None or not sources_match(dbf_path, meta.get("sources")):
+            self._mm.close()
+            raise ValueError(f"No fresh snapshot at {self.path}")
+        self.meta = meta
+
+        pool_offset = meta["data_offset"] + meta["strings"]["offset"]
+        self.icd10 = MappedICD10Table(
+            _Section(self._mm, meta, "icd10"), _Section(self._mm, meta, "icd10_alias")
+        )
+        self.proc = MappedProcTable(_Section(self._mm, meta, "proc"), pool_offset)
+        self.ccex = MappedCCExclusionTable(_Section(self._mm, meta, "ccex"))
+
+    @property
+    def buffer(self) -> mmap.mmap:
+        return self._mm
+
+    def close(self):
+        self._mm.close()
@@ -3,10 +3,27 @@ Thai DRG Grouper - Type Definitions
 """
 
 import json
-from dataclasses import asdict, dataclass, field
+from dataclasses import asdict, dataclass, field, fields
 from typing import List, Optional
 
 
+def _with_slots(cls):
+    """
+    Recreate a dataclass with ``__slots__`` (``dataclass(slots=True)`` needs Python 3.10)
+
+    Instances then carry no per-object ``__dict__``. Field defaults live in
+    the generated ``__init__``, so the class attributes holding them are dropped.
+    """
+    names = tuple(f.name for f in fields(cls))
+    namespace = {
+        key: value
+        for key, value in cls.__dict__.items()
+        if key not in names and key not in ("__dict__", "__weakref__")
+    }
+    namespace["__slots__"] = names
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
+
+
 @dataclass
 class VersionInfo:
     """Version information"""
@@ -24,9 +41,15 @@ class VersionInfo:
         return asdict(self)
 
 
+@_with_slots
 @dataclass
 class GrouperResult:
-    """Grouper result"""
+    """
+    Grouper result
+
+    A slotted dataclass: no per-instance ``__dict__``, and to_dict()/to_json()
+    read the fields directly instead of going through ``asdict`` recursion.
+    """
 
     version: str
     pdx: str
@@ -57,10 +80,22 @@ class GrouperResult:
     grouped_at: str = ""
 
     def to_dict(self) -> dict:
-        return asdict(self)
+        d = {name: getattr(self, name) for name in RESULT_FIELDS}
+        for name in _LIST_FIELDS:
+            if isinstance(d[name], list):
+                d[name] = d[name][:]
+        return d
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        d = {name: getattr(self, name) for name in RESULT_FIELDS}
+        return json.dumps(d, ensure_ascii=False, indent=indent)
+
+
+# GrouperResult field names, in declaration (and columnar output) order
+RESULT_FIELDS = tuple(f.name for f in fields(GrouperResult))
 
-    def to_json(self) -> str:
-        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+# List fields copied by to_dict() so the dict can be changed independently
+_LIST_FIELDS = ("sdx", "procedures", "cc_list", "mcc_list", "errors", "warnings")
 
 
 # MDC Names
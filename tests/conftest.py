@@ -0,0 +1,30 @@
+"""
+Shared fixtures for Thai DRG Grouper tests
+"""
+
+import os
+import shutil
+
+import pytest
+
+# Path to test data
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "versions")
+
+# Installed versions copied by versions_path unless the test module sets VERSIONS
+DEFAULT_VERSIONS = ("6.3", "6.3-copy")
+
+
+@pytest.fixture
+def versions_path(request, tmp_path):
+    """
+    A writable versions folder holding copies of the 6.3 tables
+
+    One copy per name in the test module's VERSIONS (default: 6.3 and
+    6.3-copy), so several versions with identical tables are installed.
+    """
+    source = os.path.join(DATA_PATH, "6.3", "data")
+    if not os.path.exists(source):
+        pytest.skip("Test data not available")
+    for version in getattr(request.module, "VERSIONS", DEFAULT_VERSIONS):
+        shutil.copytree(source, tmp_path / version / "data")
+    return str(tmp_path)
@@ -0,0 +1,143 @@
+"""
+Tests for the async grouping front-end
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from thai_drg_grouper import ThaiDRGGrouperManager
+from thai_drg_grouper.aio import AsyncGrouper
+from thai_drg_grouper.regroup import CaseDiff
+
+# Path to test data
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "versions")
+
+CASES = [
+    dict(pdx="S82201D", sdx=["E119", "I10"], procedures=["7936"], age=25, sex="M", los=5),
+    dict(pdx="J189", sdx=["E119", "N179", "J960"], age=65, sex="F", los=30),
+    dict(pdx="O800", procedures=["73.59"], age=28, sex="F", los=0),
+    dict(pdx="INVALID", age=30, sex="M", los=1),
+]
+
+
+@pytest.fixture
+def manager():
+    if not os.path.exists(DATA_PATH):
+        pytest.skip("Test data not available")
+    return ThaiDRGGrouperManager(DATA_PATH)
+
+
+def _strip(result) -> dict:
+    d = result.to_dict()
+    d.pop("grouped_at")
+    return d
+
+
+class TestAsyncGrouper:
+    """Test executor offload, single-flight loading and batching"""
+
+    def test_single_flight_loading(self, manager, monkeypatch):
+        """Concurrent first requests share one version load"""
+        loads = []
+        load = manager._get_grouper
+
+        def counting_load(version):
+            loads.append(version)
+            return load(version)
+
+        monkeypatch.setattr(manager, "_get_grouper", counting_load)
+        service = AsyncGrouper(manager, workers=2)
+
+        async def run():
+            return await asyncio.gather(*(service.get_grouper("6.3") for _ in range(8)))
+
+        groupers = asyncio.run(run())
+        service.close()
+        assert loads == ["6.3"]
+        assert all(g is groupers[0] for g in groupers)
+
+    def test_group_matches_sync(self, manager):
+        service = AsyncGrouper(manager, workers=2, chunk_size=3)
+
+        async def run():
+            single = await asyncio.gather(*(service.group("6.3", case) for case in CASES))
+            batch = await service.group_batch("6.3", CASES * 2)
+            return single, batch
+
+        single, batch = asyncio.run(run())
+        service.close()
+        expected = [_strip(manager.group("6.3", **case)) for case in CASES]
+        assert [_strip(r) for r in single] == expected
+        assert [_strip(r) for r in batch] == expected * 2
+
+    def test_process_executor(self, manager):
+        service = AsyncGrouper(manager, executor="process", workers=2, chunk_size=2)
+
+        async def run():
+            return await service.group_batch("6.3", CASES)
+
+        results = asyncio.run(run())
+        service.close()
+        assert [_strip(r) for r in results] == [
+            _strip(manager.group("6.3", **case)) for case in CASES
+        ]
+
+    def test_unknown_version(self, manager):
+        service = AsyncGrouper(manager)
+
+        async def run():
+            assert await service.get_grouper("9.9") is None
+            with pytest.raises(ValueError):
+                await service.group("9.9", CASES[0])
+            return await service.group_all_versions(CASES[0])
+
+        results = asyncio.run(run())
+        service.close()
+        assert set(results) == set(manager._versions)
+
+    def test_compare_normalizes_once(self, manager):
+        calls = []
+        for version in manager._versions:
+            grouper = manager._get_grouper(version)
+            normalize = grouper._normalize_case
+            grouper._normalize_case = lambda *args, f=normalize: calls.append(args) or f(*args)
+        service = AsyncGrouper(manager, workers=2)
+
+        comparison = asyncio.run(service.compare(CASES[1]))
+        service.close()
+        assert len(calls) == 1
+        assert {v: _strip(r) for v, r in comparison.results.items()} == {
+            v: _strip(manager.group(v, **CASES[1])) for v in manager._versions
+        }
+
+    def test_regroup(self, manager):
+        service = AsyncGrouper(manager, workers=2, max_concurrency=1)
+        previous = manager.group("6.3", **CASES[1])
+        diff = CaseDiff(remove_sdx=["J960"], los=5)
+
+        async def run():
+            await service._require("6.3")
+            async with service._jobs:  # the only job slot is taken
+                pending = asyncio.ensure_future(service.regroup("6.3", previous, diff, verify=True))
+                await asyncio.sleep(0.05)
+                assert not pending.done()
+            return await pending
+
+        update = asyncio.run(run())
+        with pytest.raises(ValueError):
+            asyncio.run(service.regroup("9.9", previous, diff))
+        service.close()
+        assert _strip(update.result) == _strip(manager.regroup(previous, diff).result)
+
+    def test_limits(self, manager):
+        service = AsyncGrouper(manager, workers=4)
+        assert (service.max_concurrency, service.max_batches) == (4, 2)
+        service.close()
+        with pytest.raises(ValueError):
+            AsyncGrouper(manager, executor="gpu")
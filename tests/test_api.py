@@ -3,8 +3,11 @@ API Tests for Thai DRG Grouper
 Tests all FastAPI endpoints and functionality
 """
 
+import asyncio
+import json
 import os
 import sys
+import threading
 import pytest
 from fastapi.testclient import TestClient
 
@@ -47,8 +50,12 @@ class TestAPIEndpoints:
         response = client.get("/health")
         assert response.status_code == 200
         data = response.json()
-        assert data["status"] == "ok"
-        assert "versions_loaded" in data
+        assert data["status"] == "loading"  # nothing loaded before the first request
+        assert data["versions_loaded"] == 0
+        assert data["versions_installed"] >= 1
+
+        client.post("/group", json={"pdx": "J189", "age": 30, "sex": "M", "los": 1})
+        assert client.get("/health").json()["versions_loaded"] == 1
 
     def test_list_versions(self, client):
         """Test GET /versions endpoint"""
@@ -65,6 +72,131 @@ class TestAPIEndpoints:
         assert "is_default" in version
 
 
+class TestReadiness:
+    """Test preloading and the readiness endpoint"""
+
+    def test_ready_without_preload(self, client):
+        """Test /ready is 503 until the default version is loaded"""
+        response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["ready"] is False
+
+        client.post("/group", json={"pdx": "J189", "age": 30, "sex": "M", "los": 1})
+        response = client.get("/ready")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["versions"]["6.3"]["state"] == "ready"
+        assert client.get("/health").json()["ready"] is True
+
+    def test_default_loaded_at_startup(self):
+        """Test the default version loads at startup without --preload"""
+        if not os.path.exists(DATA_PATH):
+            pytest.skip("Test data not available")
+        manager = ThaiDRGGrouperManager(DATA_PATH)
+        with TestClient(create_api(manager)) as client:
+            for thread in threading.enumerate():
+                if thread.name.startswith("drg-preload-"):
+                    thread.join()
+            assert client.get("/ready").status_code == 200
+            assert client.get("/health").json()["status"] == "ok"
+
+    def test_health_failed_load(self, client, monkeypatch):
+        """Test /health reports a default version that failed to load"""
+        manager = client.app.state.grouper.manager
+
+        def broken(version):
+            raise OSError("disk gone")
+
+        monkeypatch.setattr(manager, "_new_grouper", lambda path, version: broken(version))
+        manager.preload(wait=True)
+        assert client.get("/health").json()["status"] == "failed"
+        assert client.get("/ready").status_code == 503
+
+    def test_preload_at_startup(self):
+        """Test versions are loaded in the background when the app starts"""
+        if not os.path.exists(DATA_PATH):
+            pytest.skip("Test data not available")
+        manager = ThaiDRGGrouperManager(DATA_PATH)
+        with TestClient(create_api(manager, preload=["6.3"])) as client:
+            for thread in threading.enumerate():
+                if thread.name.startswith("drg-preload-"):
+                    thread.join()
+            response = client.get("/ready")
+            assert response.status_code == 200
+            assert response.json()["versions"]["6.3"]["seconds"] > 0
+
+    def test_stats(self, client):
+        """Test GET /stats for one version and for all of them"""
+        assert client.get("/stats?version=6.3").json()["version"] == "6.3"
+        assert client.get("/stats?version=9.9").json() == {}
+        assert "6.3" in client.get("/stats").json()
+
+    def test_residency(self, client):
+        """Test GET /residency reports loaded versions and their memory"""
+        client.post("/group", json={"pdx": "J189", "age": 30, "sex": "M", "los": 1})
+        response = client.get("/residency")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["resident"] == ["6.3"]
+        assert data["bytes"]["6.3"] > 0
+        assert data["evictions"] == 0
+        assert "6.3" in data["pinned"]
+
+    def test_metrics(self):
+        """Test GET /metrics exports stage timings in Prometheus text format"""
+        if not os.path.exists(DATA_PATH):
+            pytest.skip("Test data not available")
+        client = TestClient(create_api(ThaiDRGGrouperManager(DATA_PATH, profile=True)))
+        case = {"pdx": "J189", "sdx": ["E119"], "age": 30, "sex": "M", "los": 1}
+        client.post("/group", json=case)
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        body = response.text
+        assert "# TYPE thai_drg_stage_seconds_total counter" in body
+        assert 'thai_drg_stage_calls_total{version="6.3",stage="group"} 1' in body
+        assert 'thai_drg_grouper_events_total{version="6.3",event="icd10_lookups"}' in body
+
+    def test_request_metrics(self, client):
+        """Test GET /metrics counts requests, batch sizes and ungroupable cases"""
+        client.post("/group", json={"pdx": "J189", "age": 30, "sex": "M", "los": 1})
+        client.post("/group/6.3", json={"pdx": "INVALID", "age": 30, "sex": "M", "los": 1})
+        cases = [{"pdx": "J189", "age": 200, "sex": "M", "los": 1}] * 3
+        client.post("/group/batch", json={"cases": cases})
+        body = client.get("/metrics").text
+        assert (
+            'thai_drg_http_request_duration_seconds_count{method="POST",route="/group/{version}",'
+            'status="200"} 1' in body
+        )
+        assert 'thai_drg_batch_size_cases_sum{route="/group/batch"} 3.0' in body
+        assert 'thai_drg_cases_grouped_total{version="6.3"} 5' in body
+        assert 'thai_drg_ungroupable_total{version="6.3",reason="age_error"} 3' in body
+        assert 'thai_drg_ungroupable_total{version="6.3",reason="invalid_pdx"} 1' in body
+        assert 'thai_drg_version_load_seconds{version="6.3"}' in body
+
+    def test_reload_version(self, client):
+        """Test POST /versions/{version}/reload swaps in freshly built tables"""
+        response = client.post("/versions/6.3/reload")
+        assert response.status_code == 200
+        assert response.json()["status"] == "not_loaded"
+
+        client.post("/group", json={"pdx": "J189", "age": 30, "sex": "M", "los": 1})
+        response = client.post("/versions/6.3/reload")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "reloaded"
+        assert data["state"] == "ready"
+        assert client.get("/residency").json()["reloads"] == 1
+
+        assert client.post("/versions/9.9/reload").status_code == 404
+
+    def test_refresh_versions(self, client):
+        """Test POST /versions/reload rescans the versions folder"""
+        response = client.post("/versions/reload")
+        assert response.status_code == 200
+        assert response.json() == {"added": [], "removed": [], "reloaded": [], "failed": {}}
+
+
 class TestGroupEndpoints:
     """Test grouping endpoints"""
 
@@ -265,6 +397,84 @@ class TestCompareEndpoint:
         data = response.json()
         assert len(data) > 0
 
+    def test_compare_diff_only(self, client):
+        """Test POST /group/compare?diff=true"""
+        response = client.post(
+            "/group/compare?diff=true&versions=6.3", json={"pdx": "J189", "age": 30, "los": 5}
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["versions"] == ["6.3"]
+        assert data["diff"] == {}
+        assert data["errors"] == {}
+
+    def test_compare_unknown_version(self, client):
+        """Test POST /group/compare with an unknown version"""
+        response = client.post("/group/compare?versions=9.9", json={"pdx": "J189"})
+        assert response.status_code == 404
+
+
+class TestRegroupEndpoint:
+    """Test incremental regroup endpoint"""
+
+    def test_regroup(self, client):
+        """Test POST /group/regroup with a previous /group result"""
+        case = {"pdx": "J189", "sdx": ["E119"], "age": 65, "sex": "F", "los": 7}
+        previous = client.post("/group/6.3", json=case).json()
+
+        response = client.post(
+            "/group/regroup", json={"previous": previous, "diff": {"add_sdx": ["J960"]}}
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["result"]["sdx"] == ["E119", "J960"]
+        assert data["result"]["pcl"] == 4
+        assert data["stages"] == ["pcl", "drg", "adjrw"]
+        assert data["changes"]["pcl"] == {"previous": 3, "current": 4}
+        assert "SDx J960 added (MCC)" in data["explanation"]
+
+        full = client.post("/group/6.3", json=dict(case, sdx=["E119", "J960"])).json()
+        assert data["result"]["drg"] == full["drg"]
+        assert data["result"]["adjrw"] == full["adjrw"]
+
+    def test_regroup_invalid_previous(self, client):
+        """Test POST /group/regroup with a malformed previous result"""
+        response = client.post("/group/regroup", json={"previous": {"pdx": "J189"}, "diff": {}})
+        assert response.status_code == 422
+
+        previous = client.post("/group/6.3", json={"pdx": "J189", "age": 30}).json()
+        for edit in ({"pcl": "x"}, {"cc_list": "E119"}, {"rw": "high"}, {"sdx": [1]}):
+            response = client.post(
+                "/group/regroup", json={"previous": dict(previous, **edit), "diff": {"los": 3}}
+            )
+            assert response.status_code == 422, edit
+
+    def test_regroup_forged_previous(self, client):
+        """Test POST /group/regroup reads the DRG from the tables, not the client"""
+        case = {"pdx": "J189", "sdx": ["E119"], "age": 65, "sex": "F", "los": 7}
+        previous = client.post("/group/6.3", json=case).json()
+        forged = dict(previous, rw=99.0, adjrw=99.0, drg_name="Forged")
+
+        data = client.post("/group/regroup", json={"previous": forged, "diff": {"los": 8}}).json()
+        assert data["result"]["rw"] == previous["rw"]
+        assert data["result"]["drg_name"] == previous["drg_name"]
+
+        forged = dict(previous, pcl=4, drg="04999")
+        data = client.post("/group/regroup", json={"previous": forged, "diff": {"los": 8}}).json()
+        full = client.post("/group/6.3", json=dict(case, los=8)).json()
+        assert data["explanation"][0].startswith("Regrouped in full")
+        assert (data["result"]["pcl"], data["result"]["drg"]) == (full["pcl"], full["drg"])
+
+    def test_regroup_unknown_version(self, client):
+        """Test POST /group/regroup with an unknown version"""
+        previous = client.post("/group/6.3", json={"pdx": "J189", "age": 30}).json()
+        response = client.post(
+            "/group/regroup?version=9.9", json={"previous": previous, "diff": {"los": 3}}
+        )
+        assert response.status_code == 404
+
 
 class TestBatchEndpoint:
     """Test batch processing endpoint"""
@@ -382,6 +592,118 @@ class TestBatchEndpoint:
         assert data["results"][2]["is_valid"] is False
 
 
+class TestDRGCatalogEndpoints:
+    """Test DRG lookup and catalog endpoints"""
+
+    def test_get_drg(self, client):
+        """Test GET /drg/{drg_code}"""
+        response = client.get("/drg/00019")
+        assert response.status_code == 200
+        assert response.json()["name"] == "Liver transplant"
+        assert client.get("/drg/99999").status_code == 404
+
+    def test_list_drgs(self, client):
+        """Test GET /drgs returns the whole catalog"""
+        response = client.get("/drgs")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["count"] == len(data["drgs"]) > 0
+        assert {"drg", "dc", "mdc", "name", "rw"} <= set(data["drgs"][0])
+        assert response.headers["etag"]
+
+    def test_list_drgs_filters(self, client):
+        """Test MDC, DC and RW range filters"""
+        data = client.get("/drgs", params={"mdc": "4"}).json()
+        assert data["count"] > 0
+        assert all(d["mdc"] == "04" for d in data["drgs"])
+
+        dc = data["drgs"][0]["dc"]
+        data = client.get("/drgs", params={"dc": dc}).json()
+        assert all(d["dc"] == dc for d in data["drgs"])
+
+        data = client.get("/drgs", params={"rw_min": 1.0, "rw_max": 2.0}).json()
+        assert data["count"] > 0
+        assert all(1.0 <= d["rw"] <= 2.0 for d in data["drgs"])
+
+        assert client.get("/drgs", params={"mdc": "99"}).json()["count"] == 0
+
+    def test_list_drgs_etag(self, client):
+        """Test conditional requests answer 304 when the catalog is unchanged"""
+        etag = client.get("/drgs", params={"mdc": "04"}).headers["etag"]
+        response = client.get("/drgs", params={"mdc": "04"}, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+
+        response = client.get("/drgs", params={"mdc": "05"}, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+
+    def test_list_drgs_invalid_version(self, client):
+        """Test GET /drgs with unknown version"""
+        assert client.get("/drgs", params={"version": "9.9"}).status_code == 404
+
+
+class TestStreamEndpoint:
+    """Test NDJSON streaming batch endpoint"""
+
+    def test_stream_group(self, client):
+        """Test results stream back in input order with line numbers"""
+        cases = [
+            {"pdx": "S82201D", "sdx": ["E119"], "procedures": ["7936"], "age": 25, "los": 5},
+            {"pdx": "J189", "age": 65, "sex": "F", "los": 7},
+        ]
+        body = "\n".join(json.dumps(c) for c in cases * 300) + "\n"
+        response = client.post("/group/stream", content=body)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert len(rows) == 600
+        assert [row["line"] for row in rows] == list(range(1, 601))
+        batch = client.post("/group/batch", json={"cases": cases}).json()["results"]
+        for row, expected in zip(rows[:2], batch):
+            assert row["drg"] == expected["drg"]
+            assert row["adjrw"] == expected["adjrw"]
+
+    def test_stream_line_errors(self, client):
+        """Test unparseable lines are reported in place and the rest is grouped"""
+        body = '{"pdx": "J189", "age": 40}\nnot json\n\n[1, 2]\n{"age": 40}\n{"pdx": "J189"}'
+        response = client.post("/group/stream", content=body)
+        rows = [json.loads(line) for line in response.text.splitlines()]
+
+        assert [row["line"] for row in rows] == [1, 2, 4, 5, 6]
+        assert "drg" in rows[0] and "drg" in rows[4]
+        assert all("error" in row for row in rows[1:4])
+
+    def test_stream_invalid_version(self, client):
+        """Test unknown version is rejected before streaming"""
+        response = client.post("/group/stream?version=9.9", content='{"pdx": "J189"}\n')
+        assert response.status_code == 404
+
+    def test_ndjson_lines(self):
+        """Test line splitting across chunk boundaries and overlong lines"""
+        from thai_drg_grouper.api import _ndjson_lines
+
+        async def collect(chunks, max_line):
+            async def body():
+                for chunk in chunks:
+                    yield chunk
+
+            return [item async for item in _ndjson_lines(body(), max_line)]
+
+        chunks = [b'{"a"', b": 1}\n\n", b"x" * 30, b"x" * 30 + b"\n{}", b"\n[]"]
+        assert asyncio.run(collect(chunks, 40)) == [
+            (1, b'{"a": 1}'),
+            (3, None),
+            (4, b"{}"),
+            (5, b"[]"),
+        ]
+
+        many = [b"{}\n" * 100000 + b"{}", b"\n{}"]
+        lines = asyncio.run(collect(many, 40))
+        assert len(lines) == 100002
+        assert lines[-1] == (100002, b"{}")
+
+
 class TestAPIValidation:
     """Test API input validation"""
 
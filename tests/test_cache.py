@@ -0,0 +1,114 @@
+"""
+Tests for the group() result cache
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from thai_drg_grouper import ThaiDRGGrouper, ThaiDRGGrouperManager
+from thai_drg_grouper.cache import LRUCache
+
+# Path to test data
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "versions")
+VERSION_PATH = os.path.join(DATA_PATH, "6.3", "data")
+
+
+@pytest.fixture
+def groupers():
+    """Uncached and cached groupers over the same 6.3 data"""
+    if not os.path.exists(VERSION_PATH):
+        pytest.skip("Test data not available")
+    return ThaiDRGGrouper(VERSION_PATH, "6.3"), ThaiDRGGrouper(VERSION_PATH, "6.3", cache_size=8)
+
+
+def _strip(result) -> dict:
+    d = result.to_dict()
+    d.pop("grouped_at")
+    return d
+
+
+class TestLRUCache:
+    """Test the bounded LRU cache"""
+
+    def test_eviction_order(self):
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        assert cache.get("a") == 1  # "b" is now least recently used
+        cache.put("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+        assert cache.stats() == {
+            "size": 2,
+            "maxsize": 2,
+            "hits": 2,
+            "misses": 1,
+            "evictions": 1,
+            "hit_rate": 0.6667,
+        }
+
+    def test_invalid_size(self):
+        with pytest.raises(ValueError):
+            LRUCache(0)
+
+
+class TestResultCache:
+    """Cached group() results must match uncached grouping exactly"""
+
+    CASES = [
+        dict(pdx="S82201D", sdx=["E119", "I10"], procedures=["7936"], age=25, sex="M", los=5),
+        dict(pdx="J189", sdx=["E119", "N179", "J960"], age=65, sex="F", los=30),
+        dict(pdx="O800", procedures=["73.59"], age=28, sex="F", los=0),
+        dict(pdx="INVALID", age=30, sex="M", los=1),
+    ]
+
+    def test_matches_uncached(self, groupers):
+        plain, cached = groupers
+        for _ in range(2):
+            for case in self.CASES:
+                assert _strip(cached.group(**case)) == _strip(plain.group(**case))
+        stats = cached.get_stats()["result_cache"]
+        assert (stats["hits"], stats["misses"]) == (4, 4)
+        assert plain.get_stats()["result_cache"] is None
+
+    def test_order_insensitive_signature(self, groupers):
+        """Reordered or differently written codes hit, but echo the caller's input"""
+        plain, cached = groupers
+        cached.group(pdx="J189", sdx=["E119", "N179", "J960"], age=65, sex="F", los=30)
+
+        case = dict(pdx="j18.9", sdx=["J96.0", "n179", "E119"], age=40, sex=None, los=2)
+        result = cached.group(**case)
+        assert cached.get_stats()["result_cache"]["hits"] == 1
+        assert _strip(result) == _strip(plain.group(**case))
+        assert result.pdx == "j18.9"
+        assert result.warnings == ["Missing or invalid sex: None"]
+
+    def test_invalid_age_bypasses_cache(self, groupers):
+        _, cached = groupers
+        result = cached.group(pdx="J189", age=None, sex="M", los=1)
+        assert result.drg == "26539"
+        assert cached.get_stats()["result_cache"]["misses"] == 0
+
+    def test_grouped_at_is_call_time(self, groupers):
+        _, cached = groupers
+        first = cached.group(**self.CASES[0])
+        second = cached.group(**self.CASES[0])
+        assert second.grouped_at >= first.grouped_at
+        assert second.cc_list is not first.cc_list
+
+    def test_clear_cache(self, groupers):
+        _, cached = groupers
+        cached.group(**self.CASES[0])
+        cached.clear_cache()
+        assert cached.get_stats()["result_cache"]["size"] == 0
+
+    def test_manager_cache_size(self):
+        if not os.path.exists(DATA_PATH):
+            pytest.skip("Test data not available")
+        manager = ThaiDRGGrouperManager(DATA_PATH, cache_size=16)
+        assert manager.get_stats("6.3")["result_cache"]["maxsize"] == 16
@@ -0,0 +1,198 @@
+"""
+Tests for version comparison and the compare-file command
+"""
+
+import io
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from thai_drg_grouper import ThaiDRGGrouperManager
+from thai_drg_grouper.cli import main
+from thai_drg_grouper.compare import (
+    COMPARE_FIELDS,
+    CompareWriter,
+    VersionComparison,
+    compare_stream,
+    diff_values,
+)
+from thai_drg_grouper.fileio import read_cases
+
+CSV_INPUT = """AN,pdx,sdx,age,sex,los
+A1,S82201D,E119,25,M,5
+A2,J189,,65,F,7
+A3,J189,,abc,F,7
+"""
+
+
+@pytest.fixture
+def manager(versions_path):
+    return ThaiDRGGrouperManager(versions_path)
+
+
+class TestDiff:
+    """Test field diffs between versions"""
+
+    def test_diff_values(self):
+        values = {
+            "6.3": {"drg": "04520", "rw": 0.5661, "pcl": 0},
+            "6.4": {"drg": "04520", "rw": 0.6012, "pcl": 0},
+        }
+        assert diff_values(values, ["drg", "rw", "pcl"]) == {"rw": {"6.3": 0.5661, "6.4": 0.6012}}
+
+    def test_failed_versions_not_diffed(self, manager):
+        comparison = manager.compare(pdx="J189", age=65, sex="F", los=7)
+        comparison.results["broken"] = None
+        comparison.errors["broken"] = "boom"
+        assert comparison.diff() == {}
+        data = comparison.to_dict(diff_only=True)
+        assert data == {"diff": {}, "errors": {"broken": "boom"}}
+
+
+class TestManagerCompare:
+    """Test ThaiDRGGrouperManager.compare"""
+
+    def test_compare_all_versions(self, manager):
+        comparison = manager.compare(pdx="S82201D", sdx=["E119"], age=25, sex="M", los=5)
+        assert isinstance(comparison, VersionComparison)
+        assert set(comparison.results) == {"6.3", "6.3-copy"}
+        assert comparison.errors == {}
+        assert comparison.diff() == {}
+        assert comparison.results["6.3"].drg == comparison.results["6.3-copy"].drg
+
+    def test_loads_only_requested_versions(self, manager):
+        comparison = manager.compare(pdx="J189", age=65, los=7, versions=["6.3-copy"])
+        assert list(comparison.results) == ["6.3-copy"]
+        assert set(manager._groupers) == {"6.3-copy"}
+
+    def test_unknown_version(self, manager):
+        with pytest.raises(ValueError):
+            manager.compare(pdx="J189", versions=["9.9"])
+
+    def test_normalizes_once(self, manager):
+        case = dict(pdx="s82.201d", sdx=["e11.9", "I10"], procedures=["79.36"], age=25, los=5)
+        calls = []
+        for version in manager._versions:
+            grouper = manager._get_grouper(version)
+            normalize = grouper._normalize_case
+            grouper._normalize_case = lambda *args, f=normalize: calls.append(args) or f(*args)
+
+        comparison = manager.compare(**case)
+
+        assert len(calls) == 1
+        for version, result in comparison.results.items():
+            expected = manager._get_grouper(version).group(**case)
+            assert result.drg == expected.drg
+            assert result.cc_list + result.mcc_list == expected.cc_list + expected.mcc_list
+
+    def test_loaded_versions_grouped_concurrently(self, manager):
+        threads = []
+        for version in manager._versions:
+            grouper = manager._get_grouper(version)
+            group = grouper._group_normalized
+            grouper._group_normalized = lambda *args, f=group: (
+                threads.append(threading.current_thread().name) or f(*args)
+            )
+
+        manager.compare(pdx="J189", age=65, los=7)
+
+        assert len(threads) == 2  # each version on the pool, none inline
+        assert all(name.startswith("drg-compare") for name in threads)
+
+    def test_age_error_not_normalized(self, manager):
+        comparison = manager.compare(pdx=None, age=200)
+        assert comparison.errors == {}
+        assert {r.drg for r in comparison.results.values()} == {"26539"}
+
+    def test_errors_are_reported(self, manager, monkeypatch):
+        load = manager._load_grouper
+
+        def failing_load(version):
+            if version == "6.3-copy":
+                raise OSError("tables unreadable")
+            return load(version)
+
+        monkeypatch.setattr(manager, "_load_grouper", failing_load)
+        comparison = manager.compare(pdx="J189", age=65, los=7)
+        assert comparison.results["6.3"] is not None
+        assert comparison.results["6.3-copy"] is None
+        assert comparison.errors == {"6.3-copy": "tables unreadable"}
+
+        # Backwards compatible shape
+        results = manager.group_all_versions(pdx="J189", age=65, los=7)
+        assert results["6.3-copy"] is None
+        assert results["6.3"].drg == comparison.results["6.3"].drg
+
+
+class TestCompareFile:
+    """Test streaming two-version file comparison"""
+
+    def test_compare_stream(self, manager):
+        out = io.StringIO()
+        writer = CompareWriter(out, "jsonl", ("6.3", "6.3-copy"), keep=["AN"])
+        cases = read_cases(io.StringIO(CSV_INPUT), "csv", errors=[])
+        with manager.parallel_grouper("6.3") as base, manager.parallel_grouper("6.3-copy") as other:
+            summary = compare_stream(base, other, cases, writer)
+        assert summary["cases"] == 2
+        assert summary["changed"] == 0
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert [row["AN"] for row in rows] == ["A1", "A2"]
+        assert rows[0]["case"] == 1
+        assert rows[0]["changed"] == []
+        assert set(rows[0]["6.3"]) == set(COMPARE_FIELDS)
+        assert rows[0]["6.3"] == rows[0]["6.3-copy"]
+
+    def test_diff_only_writer(self):
+        out = io.StringIO()
+        writer = CompareWriter(out, "jsonl", ("a", "b"), fields=["drg", "rw"], diff_only=True)
+        same = {"drg": "04520", "rw": 0.5}
+        writer.write(1, {}, {"a": same, "b": same})
+        writer.write(2, {}, {"a": same, "b": {"drg": "04520", "rw": 0.7}})
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert rows == [{"case": 2, "changed": ["rw"], "a": {"rw": 0.5}, "b": {"rw": 0.7}}]
+        assert (writer.count, writer.changed) == (2, 1)
+
+    def test_csv_writer_columns(self):
+        out = io.StringIO()
+        writer = CompareWriter(out, "csv", ("a", "b"), fields=["drg", "rw"], keep=["AN"])
+        writer.write(1, {"AN": "A1"}, {"a": {"drg": "1", "rw": 1}, "b": {"drg": "2", "rw": 1}})
+        lines = out.getvalue().splitlines()
+        assert lines[0] == "AN,case,changed,drg@a,drg@b,rw@a,rw@b"
+        assert lines[1] == "A1,1,drg,1,2,1,1"
+
+    def test_unknown_field(self):
+        with pytest.raises(ValueError):
+            CompareWriter(io.StringIO(), "csv", ("a", "b"), fields=["nope"])
+
+    def test_cli_compare_file(self, versions_path, tmp_path, monkeypatch, capsys):
+        source = tmp_path / "cases.csv"
+        output = tmp_path / "diff.csv"
+        source.write_text(CSV_INPUT, encoding="utf-8")
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            ["thai-drg-grouper", "compare-file", str(source), "-o", str(output)]
+            + ["--base", "6.3", "--other", "6.3-copy", "--keep", "AN", "--path", versions_path],
+        )
+
+        assert main() == 0
+        lines = output.read_text(encoding="utf-8").splitlines()
+        assert lines[0].startswith("AN,case,changed,mdc@6.3,mdc@6.3-copy,")
+        assert [line.split(",")[0] for line in lines[1:]] == ["A1", "A2"]
+        assert "0 changed, 1 skipped" in capsys.readouterr().err
+
+    def test_cli_compare_diff(self, versions_path, monkeypatch, capsys):
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            ["thai-drg-grouper", "compare", "--pdx", "J189", "--diff", "--path", versions_path],
+        )
+
+        assert main() == 0
+        assert "No differences" in capsys.readouterr().out
@@ -0,0 +1,132 @@
+"""
+Tests for streaming CSV/JSONL case files and the group-file command
+"""
+
+import io
+import json
+import os
+import sys
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from thai_drg_grouper import ThaiDRGGrouperManager
+from thai_drg_grouper.cli import main
+from thai_drg_grouper.fileio import (
+    BadRecord,
+    ResultWriter,
+    detect_format,
+    group_stream,
+    parse_column_map,
+    read_cases,
+)
+
+# Path to test data
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "versions")
+
+CSV_INPUT = """AN,PDX,SDX1,SDX2,PROC,AGE,SEX,LOS
+A1,S82201D,E119,I10,7936,25,M,5
+A2,J189,E119,,,65,F,7
+A3,J189,,,,abc,F,7
+A4,O800,,,73.59,28,F,
+"""
+
+
+@pytest.fixture
+def manager():
+    if not os.path.exists(DATA_PATH):
+        pytest.skip("Test data not available")
+    return ThaiDRGGrouperManager(DATA_PATH)
+
+
+class TestReadCases:
+    """Test record parsing and column mapping"""
+
+    def test_csv_with_mapping(self):
+        columns = parse_column_map("pdx=PDX,sdx=SDX1+SDX2,procedures=PROC,age=AGE,sex=SEX,los=LOS")
+        errors = []
+        cases = list(read_cases(io.StringIO(CSV_INPUT), "csv", columns, errors=errors))
+
+        assert [c["pdx"] for c in cases] == ["S82201D", "J189", "O800"]
+        assert cases[0]["sdx"] == ["E119", "I10"]
+        assert cases[0]["procedures"] == ["7936"]
+        assert cases[0]["_record"]["AN"] == "A1"
+        assert cases[2]["los"] == 1
+        assert [e.line for e in errors] == [4]
+
+    def test_jsonl(self):
+        stream = io.StringIO('{"pdx": "J189", "sdx": ["E119"], "age": 40}\n\n{"pdx": "O800"}\n')
+        cases = list(read_cases(stream, "jsonl"))
+
+        assert cases[0]["sdx"] == ["E119"]
+        assert cases[1]["age"] is None
+
+    def test_bad_record_raises_without_error_list(self):
+        with pytest.raises(BadRecord):
+            list(read_cases(io.StringIO("not json\n"), "jsonl"))
+
+    def test_invalid_mapping(self):
+        with pytest.raises(ValueError):
+            parse_column_map("diagnosis=PDX")
+
+    def test_detect_format(self):
+        assert detect_format("claims.CSV") == "csv"
+        assert detect_format("claims.ndjson") == "jsonl"
+        assert detect_format("-", default="csv") == "csv"
+
+
+class TestGroupStream:
+    """Test chunked grouping into incremental writers"""
+
+    def test_jsonl_output(self, manager):
+        cases = read_cases(io.StringIO('{"pdx": "J189", "age": 40, "AN": "X1"}\n' * 5), "jsonl")
+        out = io.StringIO()
+        writer = ResultWriter(out, "jsonl", fields=["drg", "adjrw"], keep=["AN"])
+
+        with manager.parallel_grouper(workers=1, chunk_size=2) as engine:
+            summary = group_stream(engine, cases, writer)
+
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert summary["cases"] == 5
+        assert rows[0] == {"AN": "X1", "drg": rows[0]["drg"], "adjrw": rows[0]["adjrw"]}
+        assert rows[0]["drg"] == manager.group_latest(pdx="J189", age=40).drg
+
+    def test_unknown_field(self):
+        with pytest.raises(ValueError):
+            ResultWriter(io.StringIO(), "csv", fields=["drg", "nope"])
+
+    def test_cli_group_file(self, manager, tmp_path, monkeypatch):
+        source = tmp_path / "claims.csv"
+        output = tmp_path / "grouped.csv"
+        source.write_text(CSV_INPUT, encoding="utf-8")
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            ["thai-drg-grouper", "group-file", str(source), "-o", str(output)]
+            + ["--map", "pdx=PDX,sdx=SDX1+SDX2,procedures=PROC,age=AGE,sex=SEX,los=LOS"]
+            + ["--keep", "AN", "--fields", "drg,rw,cc_list", "--path", DATA_PATH],
+        )
+
+        assert main() == 0
+        lines = output.read_text(encoding="utf-8").splitlines()
+        assert lines[0] == "AN,drg,rw,cc_list"
+        assert [line.split(",")[0] for line in lines[1:]] == ["A1", "A2", "A4"]
+
+    @pytest.mark.parametrize(
+        "command",
+        [
+            ["group-file"],
+            ["compare-file", "--base", "6.3", "--other", "6.3"],
+            ["impact", "--other", "6.3"],
+            ["profile"],
+        ],
+    )
+    def test_cli_missing_input(self, manager, tmp_path, monkeypatch, capsys, command):
+        missing = str(tmp_path / "missing.csv")
+        argv = ["thai-drg-grouper", command[0], missing, *command[1:], "--path", DATA_PATH]
+        monkeypatch.setattr(sys, "argv", argv)
+
+        assert main() == 1
+        assert "❌" in capsys.readouterr().err
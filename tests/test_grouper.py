@@ -2,7 +2,10 @@
 Tests for Thai DRG Grouper
 """
 
+import dataclasses
+import json
 import os
+import pickle
 import sys
 
 import pytest
@@ -11,6 +14,8 @@ import pytest
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
 
 from thai_drg_grouper import GrouperResult, ThaiDRGGrouper, ThaiDRGGrouperManager
+from thai_drg_grouper.grouper import normalize_icd, normalize_proc
+from thai_drg_grouper.types import RESULT_FIELDS
 
 # Path to test data
 DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "versions")
@@ -54,6 +59,23 @@ class TestGrouper:
         assert result.drg == "26509"
         assert "Invalid PDx" in result.errors[0]
 
+    @pytest.mark.parametrize("cache_size", [0, 16])
+    def test_age_error_codes_not_read(self, cache_size):
+        """An age error is reported before any code is normalized"""
+        version_path = os.path.join(DATA_PATH, "6.3", "data")
+        if not os.path.exists(version_path):
+            pytest.skip("Test data not available")
+        grouper = ThaiDRGGrouper(version_path, "6.3", cache_size=cache_size)
+
+        result = grouper.group(pdx=None, age=200)
+        assert result.drg == "26539"
+        assert result.errors == ["Invalid age: 200"]
+
+        result = grouper.group(pdx="J189", sdx=[None], age=None)
+        assert result.drg == "26539"
+        assert result.errors == ["No age"]
+        assert result.sdx == [None]
+
     def test_daycase(self, grouper):
         """Test day case (LOS=0)"""
         result = grouper.group(pdx="J189", age=30, sex="M", los=0)
@@ -61,6 +83,20 @@ class TestGrouper:
         assert result.los_status == "daycase"
         assert result.adjrw == result.rw0d
 
+    def test_looks_up_each_code_once(self, grouper):
+        """Every stage reads the records resolved once per case"""
+        lookups = []
+        for name in ("_lookup_icd10", "_lookup_icd10_many", "_lookup_proc"):
+            lookup = getattr(grouper, name)
+            setattr(grouper, name, lambda code, f=lookup: lookups.append(code) or f(code))
+
+        result = grouper.group(
+            pdx="S82201D", sdx=["E119", "I10"], procedures=["9904", "7936"], age=25, los=5
+        )
+
+        assert lookups == ["S82201D", ["E119", "I10"], "9904", "7936"]
+        assert result.is_valid
+
     def test_get_stats(self, grouper):
         """Test statistics"""
         stats = grouper.get_stats()
@@ -69,6 +105,124 @@ class TestGrouper:
         assert stats["icd10_count"] > 0
         assert stats["drg_count"] > 0
 
+    def test_get_drg_info(self, grouper):
+        """Test indexed DRG lookup"""
+        for drgs in grouper._drg_data.values():
+            for d in drgs:
+                assert grouper.get_drg_info(d["drg"]) is d
+        assert grouper.get_drg_info("99999") is None
+
+    def test_drg_catalog(self, grouper):
+        """Test DRG catalog filters and cached blobs"""
+        catalog = grouper.get_drg_catalog()
+        assert catalog is grouper.get_drg_catalog()
+        assert len(catalog.entries) == grouper.get_stats()["drg_count"]
+
+        mdc04 = catalog.select(mdc="4")
+        assert mdc04 == [e for e in catalog.entries if e["mdc"] == "04"]
+        dc = mdc04[0]["dc"]
+        assert catalog.select(mdc="04", dc=dc) == catalog.select(dc=dc)
+        assert all(e["rw"] >= 5 for e in catalog.select(rw_min=5))
+
+        body, etag = catalog.blob(mdc="04")
+        assert catalog.blob(mdc="4") == (body, etag)
+        assert catalog.blob(mdc="05")[1] != etag
+
+
+class TestNormalize:
+    """Test the fast-path code normalizers"""
+
+    CODES = ["J189", "j18.9", " S82.201D ", "e 11.9", "\tI10\n", "a\tb", "ß10", "79.36", "7936 "]
+
+    def test_matches_replace_chain(self):
+        for code in self.CODES:
+            chain = code.replace(".", "").replace(" ", "")
+            assert normalize_icd(code) == chain.upper().strip()
+            assert normalize_proc(code) == chain.strip()
+
+    def test_normalizes_each_code_once(self):
+        version_path = os.path.join(DATA_PATH, "6.3", "data")
+        if not os.path.exists(version_path):
+            pytest.skip("Test data not available")
+        grouper = ThaiDRGGrouper(version_path, "6.3")
+        calls = []
+        normalize = grouper._normalize_icd
+        grouper._normalize_icd = lambda code: calls.append(code) or normalize(code)
+
+        result = grouper.group(pdx="j18.9", sdx=["E119", "N17.9"], age=65, sex="F", los=3)
+
+        assert calls == ["j18.9", "E119", "N17.9"]
+        assert result.mdc == "04"
+
+
+class TestGroupMany:
+    """Test columnar batch grouping"""
+
+    CASES = [
+        dict(pdx="S82201D", sdx=["E119", "I10"], procedures=["7936"], age=25, sex="M", los=5),
+        dict(pdx="J18.9", sdx=["E119", "N179", "J960"], procedures=[], age=65, sex="F", los=30),
+        dict(pdx="O800", sdx=[], procedures=["73.59"], age=28, sex="F", los=0),
+        dict(pdx="INVALID123", sdx=[], procedures=[], age=30, sex="M", los=5),
+        dict(pdx="J189", sdx=["E119"], procedures=[], age=None, sex="M", los=5),
+        dict(pdx="J189", sdx=["E119"], procedures=[], age=40, sex=None, los=5),
+    ]
+
+    @pytest.fixture
+    def grouper(self):
+        version_path = os.path.join(DATA_PATH, "6.3", "data")
+        if os.path.exists(version_path):
+            return ThaiDRGGrouper(version_path, "6.3")
+        pytest.skip("Test data not available")
+
+    def _columns(self, cases):
+        return {key: [case[key] for case in cases] for key in cases[0]}
+
+    def test_matches_group(self, grouper):
+        """Every row equals the result of group() for the same case"""
+        out = grouper.group_many(self._columns(self.CASES))
+
+        for i, case in enumerate(self.CASES):
+            expected = grouper.group(**case).to_dict()
+            row = {field: values[i] for field, values in out.items()}
+            expected.pop("grouped_at")
+            row.pop("grouped_at")
+            assert row == expected
+
+    def test_optional_columns(self, grouper):
+        out = grouper.group_many({"pdx": ["J189", "S82201D"], "age": [65, 25]})
+
+        assert out["los"] == [1, 1]
+        assert out["sdx"] == [[], []]
+        assert all(out["is_valid"])
+
+    def test_numpy_columns(self, grouper):
+        np = pytest.importorskip("numpy")
+        cases = self._columns(self.CASES[:3])
+        out = grouper.group_many(
+            dict(cases, age=np.array(cases["age"]), los=np.array(cases["los"]))
+        )
+        assert out["drg"] == grouper.group_many(cases)["drg"]
+
+    def test_age_error_rows_not_normalized(self, grouper):
+        """Codes of age-error rows are never read, as in group()"""
+        out = grouper.group_many(
+            {"pdx": [None, "J189"], "sdx": [[None], ["E119"]], "age": [200, 65]}
+        )
+
+        assert out["drg"][0] == "26539"
+        assert out["errors"][0] == ["Invalid age: 200"]
+        assert out["is_valid"] == [False, True]
+
+    def test_empty_batch(self, grouper):
+        out = grouper.group_many({"pdx": []})
+        assert out["drg"] == []
+
+    def test_invalid_columns(self, grouper):
+        with pytest.raises(ValueError):
+            grouper.group_many({"sdx": [["E119"]]})
+        with pytest.raises(ValueError):
+            grouper.group_many({"pdx": ["J189", "J189"], "age": [30]})
+
 
 class TestManager:
     """Test multi-version manager"""
@@ -101,6 +255,34 @@ class TestManager:
         with pytest.raises(ValueError):
             manager.group("99.99", pdx="J189")
 
+    def test_preload(self, manager):
+        """Test background preloading and load state"""
+        assert not manager.is_ready()
+        assert manager.load_status()["6.3"]["state"] == "not_loaded"
+
+        threads = manager.preload(["6.3"], wait=True)
+        assert len(threads) == 1
+        assert manager.is_ready()
+        status = manager.load_status()["6.3"]
+        assert status["state"] == "ready"
+        assert status["seconds"] > 0
+
+        with pytest.raises(ValueError):
+            manager.preload(["9.9"])
+
+    def test_preload_failure(self, manager, monkeypatch):
+        """Test a failed preload is reported, not raised"""
+
+        def broken(*args, **kwargs):
+            raise OSError("disk gone")
+
+        monkeypatch.setattr("thai_drg_grouper.manager.ThaiDRGGrouper", broken)
+        manager.preload(wait=True)
+        status = manager.load_status()[manager.get_default_version()]
+        assert status["state"] == "failed"
+        assert status["error"] == "disk gone"
+        assert not manager.is_ready()
+
 
 class TestTypes:
     """Test type classes"""
@@ -174,6 +356,21 @@ class TestTypes:
         json_str = result.to_json()
         assert '"drg": "04509"' in json_str
 
+    def test_grouper_result_slots(self):
+        """Test GrouperResult is slotted and serializes like asdict()"""
+        values = {name: [] if name in ("sdx", "cc_list", "errors") else 1 for name in RESULT_FIELDS}
+        values["sdx"] = ["E119"]
+        result = GrouperResult(**values)
+
+        assert not hasattr(result, "__dict__")
+        with pytest.raises(AttributeError):
+            result.extra = 1
+        assert result.to_dict() == dataclasses.asdict(result)
+        assert result.to_dict()["sdx"] is not result.sdx
+        assert json.loads(result.to_json(indent=None)) == result.to_dict()
+        assert dataclasses.replace(result, los=3).los == 3
+        assert pickle.loads(pickle.dumps(result)) == result
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,121 @@
+"""
+Tests for version impact analysis and the impact command
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from thai_drg_grouper import ThaiDRGGrouperManager
+from thai_drg_grouper.cli import main
+from thai_drg_grouper.impact import ImpactReport
+
+CASES = [
+    {"pdx": "S82201D", "sdx": ["E119"], "age": 25, "sex": "M", "los": 5},
+    {"pdx": "J189", "age": 65, "sex": "F", "los": 7},
+    {"pdx": "XXXX", "age": 40, "sex": "F", "los": 2},
+] * 5
+
+
+def _columns(rows):
+    names = ("drg", "mdc", "adjrw", "is_valid")
+    return {name: [row[i] for row in rows] for i, name in enumerate(names)}
+
+
+class TestImpactReport:
+    """Test aggregation of paired results"""
+
+    def test_aggregates(self):
+        report = ImpactReport("5.1", "6.3")
+        report.add_columns(
+            _columns([("04520", "04", 1.0, True), ("08662", "08", 2.0, True)]),
+            _columns([("04521", "04", 1.5, True), ("08662", "08", 2.0, True)]),
+        )
+        report.add_columns(
+            _columns([("04520", "04", 1.0, True), ("26509", "26", 0.0, False)]),
+            _columns([("04521", "04", 1.5, True), ("05010", "05", 0.8, True)]),
+        )
+        data = report.to_dict()
+        assert data["cases"] == 4
+        assert data["drg_changed"] == 3
+        assert data["mdc_changed"] == 1
+        assert (data["invalid_base"], data["invalid_other"]) == (1, 0)
+        assert data["adjrw_base"] == 4.0
+        assert data["adjrw_delta"] == pytest.approx(1.8)
+        assert data["adjrw_delta_pct"] == pytest.approx(45.0)
+        assert data["migrations"] == [
+            {"from": "04520", "to": "04521", "cases": 2, "adjrw_delta": 1.0},
+            {"from": "26509", "to": "05010", "cases": 1, "adjrw_delta": 0.8},
+        ]
+        mdc04 = data["by_mdc"][0]
+        assert mdc04 == {
+            "mdc": "04",
+            "cases": 2,
+            "drg_changed": 2,
+            "adjrw_base": 2.0,
+            "adjrw_other": 3.0,
+            "adjrw_delta": 1.0,
+        }
+        assert report.to_dict(top=1)["migrations"] == data["migrations"][:1]
+        assert "04520 -> 04521" in report.format_text()
+
+    def test_empty(self):
+        data = ImpactReport("5.1", "6.3").to_dict()
+        assert data["cases"] == 0
+        assert data["adjrw_delta_pct"] is None
+
+
+class TestManagerImpact:
+    """Test ThaiDRGGrouperManager.impact"""
+
+    def test_identical_versions(self, versions_path):
+        manager = ThaiDRGGrouperManager(versions_path)
+        report = manager.impact(iter(CASES), "6.3-copy", "6.3", chunk_size=4)
+        assert report.cases == len(CASES)
+        assert report.drg_changed == 0
+        assert report.migrations() == []
+        assert report.adjrw_delta == 0
+        assert report.invalid_base == report.invalid_other == 5
+        expected = sum(manager.group("6.3", **case).adjrw for case in CASES)
+        assert report.adjrw_base == pytest.approx(expected)
+
+    def test_unknown_version(self, versions_path):
+        manager = ThaiDRGGrouperManager(versions_path)
+        with pytest.raises(ValueError):
+            manager.impact(iter(CASES), "9.9")
+
+    def test_cli_impact(self, versions_path, tmp_path, monkeypatch, capsys):
+        source = tmp_path / "cases.jsonl"
+        report = tmp_path / "impact.json"
+        source.write_text("".join(json.dumps(case) + "\n" for case in CASES), encoding="utf-8")
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            ["thai-drg-grouper", "impact", str(source), "--base", "6.3", "--other", "6.3-copy"]
+            + ["-o", str(report), "--path", versions_path],
+        )
+
+        assert main() == 0
+        assert "Impact of v6.3 -> v6.3-copy" in capsys.readouterr().out
+        data = json.loads(report.read_text(encoding="utf-8"))
+        assert data["cases"] == len(CASES)
+        assert data["drg_changed"] == 0
+
+    def test_cli_impact_unwritable_output(self, versions_path, tmp_path, monkeypatch, capsys):
+        source = tmp_path / "cases.jsonl"
+        source.write_text("".join(json.dumps(case) + "\n" for case in CASES), encoding="utf-8")
+        report = tmp_path / "missing" / "impact.json"
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            ["thai-drg-grouper", "impact", str(source), "--base", "6.3", "--other", "6.3-copy"]
+            + ["-o", str(report), "--path", versions_path],
+        )
+
+        assert main() == 1
+        assert "❌" in capsys.readouterr().err
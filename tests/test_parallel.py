@@ -0,0 +1,115 @@
+"""
+Tests for the multiprocess grouping engine
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from thai_drg_grouper import ThaiDRGGrouper, ThaiDRGGrouperManager
+from thai_drg_grouper.cli import main
+from thai_drg_grouper.parallel import ParallelGrouper
+
+# Path to test data
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "versions")
+VERSION_PATH = os.path.join(DATA_PATH, "6.3", "data")
+
+CASES = [
+    {"pdx": "S82201D", "sdx": ["E119", "I10"], "procedures": ["7936"], "age": 25, "sex": "M"},
+    {"pdx": "J189", "sdx": ["E119", "N179"], "age": 65, "sex": "F", "los": 30},
+    {"pdx": "O800", "procedures": ["73.59"], "age": 28, "sex": "F", "los": 0},
+    {"pdx": "INVALID123", "age": 30, "sex": "M", "los": 5},
+    {"pdx": "J189", "age": None, "los": 5},
+] * 7
+
+
+@pytest.fixture(scope="module")
+def grouper():
+    if not os.path.exists(VERSION_PATH):
+        pytest.skip("Test data not available")
+    return ThaiDRGGrouper(VERSION_PATH, "6.3")
+
+
+def _strip(results):
+    rows = [r.to_dict() for r in results]
+    for row in rows:
+        row.pop("grouped_at")
+    return rows
+
+
+class TestParallelGrouper:
+    """Results must equal sequential group() calls, in input order"""
+
+    def test_in_process(self, grouper):
+        with ParallelGrouper(VERSION_PATH, "6.3", workers=1, chunk_size=4) as engine:
+            results = engine.group(CASES)
+        assert _strip(results) == _strip(grouper.group(**case) for case in CASES)
+
+    def test_worker_processes(self, grouper):
+        with ParallelGrouper(VERSION_PATH, "6.3", workers=2, chunk_size=3) as engine:
+            results = list(engine.imap(iter(CASES)))
+        assert _strip(results) == _strip(grouper.group(**case) for case in CASES)
+
+    def test_imap_columns(self):
+        with ParallelGrouper(VERSION_PATH, "6.3", workers=1, chunk_size=10) as engine:
+            chunks = list(engine.imap_columns(CASES))
+        assert [len(chunk["drg"]) for chunk in chunks] == [10, 10, 10, 5]
+
+    def test_invalid_chunk_size(self):
+        with pytest.raises(ValueError):
+            ParallelGrouper(VERSION_PATH, "6.3", chunk_size=0)
+
+
+class TestManagerParallel:
+    """Test manager and CLI entry points"""
+
+    @pytest.fixture
+    def manager(self):
+        if not os.path.exists(DATA_PATH):
+            pytest.skip("Test data not available")
+        return ThaiDRGGrouperManager(DATA_PATH)
+
+    def test_group_parallel(self, manager):
+        results = manager.group_parallel(CASES, workers=2, chunk_size=8)
+        expected = [manager.group_latest(**case) for case in CASES]
+        assert _strip(results) == _strip(expected)
+
+    def test_unknown_version(self, manager):
+        with pytest.raises(ValueError):
+            manager.group_parallel(CASES, version="99.99")
+
+    def test_cli_batch(self, manager, tmp_path, monkeypatch):
+        source = tmp_path / "cases.json"
+        output = tmp_path / "results.json"
+        source.write_text(json.dumps({"cases": CASES}), encoding="utf-8")
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            ["thai-drg-grouper", "batch", str(source), "-o", str(output), "-w", "1"]
+            + ["--path", DATA_PATH],
+        )
+
+        assert main() == 0
+        data = json.loads(output.read_text(encoding="utf-8"))
+        assert data["count"] == len(CASES)
+        assert data["results"][0]["drg"] == manager.group_latest(**CASES[0]).drg
+
+    @pytest.mark.parametrize(
+        "content",
+        [None, "{not json", json.dumps({"cases": [{"age": 30, "los": 1}]}), "[1, 2]"],
+    )
+    def test_cli_batch_bad_input(self, manager, tmp_path, monkeypatch, capsys, content):
+        source = tmp_path / "cases.json"
+        if content is not None:
+            source.write_text(content, encoding="utf-8")
+        monkeypatch.setattr(
+            sys, "argv", ["thai-drg-grouper", "batch", str(source), "-w", "1", "--path", DATA_PATH]
+        )
+
+        assert main() == 1
+        assert "❌" in capsys.readouterr().err
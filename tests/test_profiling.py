@@ -0,0 +1,151 @@
+"""
+Tests for per-stage profiling of ThaiDRGGrouper
+"""
+
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from thai_drg_grouper import ThaiDRGGrouper, ThaiDRGGrouperManager
+from thai_drg_grouper.cli import main
+from thai_drg_grouper.metrics import Histogram, histogram_family, profile_metrics, render
+
+# Path to test data
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "versions")
+
+CASES = [
+    dict(pdx="J189", sdx=["E119", "I10"], age=65, sex="F", los=7),
+    dict(pdx="S82201D", procedures=["7936"], age=25, sex="M", los=3),
+    dict(pdx="XXXX", age=40, sex="M", los=1),
+]
+
+
+@pytest.fixture
+def grouper():
+    path = os.path.join(DATA_PATH, "6.3", "data")
+    if not os.path.exists(path):
+        pytest.skip("Test data not available")
+    return ThaiDRGGrouper(path, "6.3")
+
+
+class TestStageProfiler:
+    """Test enabling, reading and disabling stage profiling"""
+
+    def test_off_by_default(self, grouper):
+        assert grouper.profile_stats() is None
+        assert grouper.get_stats()["profile"] is None
+        assert "_lookup_icd10" not in vars(grouper)
+
+    def test_results_unchanged(self, grouper):
+        plain = [grouper.group(**case).to_dict() for case in CASES]
+        grouper.enable_profiling()
+        profiled = [grouper.group(**case).to_dict() for case in CASES]
+        for a, b in zip(plain, profiled):
+            a.pop("grouped_at")
+            b.pop("grouped_at")
+        assert plain == profiled
+
+    def test_stages_and_counters(self, grouper):
+        grouper.enable_profiling()
+        for case in CASES:
+            grouper.group(**case)
+        profile = grouper.get_stats()["profile"]
+        stages = profile["stages"]
+        assert stages["group"]["calls"] == len(CASES)
+        assert stages["pcl"]["calls"] == 2  # not reached for the invalid PDx
+        assert stages["proc_lookup"]["calls"] >= 1
+        # Nested stages are excluded from the self time of their caller
+        assert stages["group"]["self_seconds"] < stages["group"]["seconds"]
+        counters = profile["counters"]
+        # SDx lists are resolved by one bulk call, counted once per code
+        assert counters["icd10_lookups"] >= stages["icd10_lookup"]["calls"]
+        assert counters["icd10_misses"] >= 1
+        assert counters["exclusion_checks"] >= 1
+
+    def test_group_many(self, grouper):
+        grouper.enable_profiling()
+        grouper.group_many({"pdx": ["J189", "K359"], "age": [65, 30]})
+        stages = grouper.profile_stats()["stages"]
+        assert stages["group_many"]["calls"] == 1
+        assert stages["icd10_lookup"]["calls"] == 1  # every distinct code in one bulk lookup
+        assert grouper.profile_stats()["counters"]["icd10_lookups"] == 2
+
+    def test_threads_merged(self, grouper):
+        grouper.enable_profiling()
+
+        def work():
+            for case in CASES:
+                grouper.group(**case)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert grouper.profile_stats()["stages"]["group"]["calls"] == 4 * len(CASES)
+
+    def test_disable(self, grouper):
+        profiler = grouper.enable_profiling()
+        assert grouper.enable_profiling() is profiler
+        grouper.disable_profiling()
+        assert grouper.profile_stats() is None
+        assert "group" not in vars(grouper)
+        assert grouper.group(**CASES[0]).is_valid
+
+    def test_manager_flag(self):
+        if not os.path.exists(DATA_PATH):
+            pytest.skip("Test data not available")
+        manager = ThaiDRGGrouperManager(DATA_PATH, profile=True)
+        manager.group("6.3", **CASES[0])
+        assert manager.get_stats("6.3")["profile"]["stages"]["group"]["calls"] == 1
+
+
+class TestPrometheus:
+    """Test Prometheus text rendering of stage profiles"""
+
+    def test_profile_metrics(self, grouper):
+        grouper.enable_profiling()
+        grouper.group(**CASES[0])
+        text = render(profile_metrics({"6.3": grouper.profile_stats(), "5.1": None}))
+        assert text.endswith("\n")
+        assert "# HELP thai_drg_stage_calls_total" in text
+        assert 'thai_drg_stage_calls_total{version="6.3",stage="group"} 1\n' in text
+        assert 'version="5.1"' not in text
+
+    def test_histogram(self):
+        histogram = Histogram((0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(("/group",), value)
+        lines = histogram_family("latency_seconds", "Latency", ("route",), histogram)
+        assert lines[1] == "# TYPE latency_seconds histogram"
+        assert 'latency_seconds_bucket{route="/group",le="0.1"} 2' in lines
+        assert 'latency_seconds_bucket{route="/group",le="1.0"} 3' in lines
+        assert 'latency_seconds_bucket{route="/group",le="+Inf"} 4' in lines
+        assert 'latency_seconds_sum{route="/group"} 3.65' in lines
+        assert 'latency_seconds_count{route="/group"} 4' in lines
+
+
+class TestProfileCommand:
+    """Test the profile CLI command"""
+
+    def test_profile_file(self, tmp_path, monkeypatch, capsys):
+        if not os.path.exists(DATA_PATH):
+            pytest.skip("Test data not available")
+        source = tmp_path / "cases.jsonl"
+        source.write_text("\n".join(json.dumps(case) for case in CASES) + "\n", encoding="utf-8")
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            ["thai-drg-grouper", "profile", str(source), "--repeat", "2", "--json"]
+            + ["--path", DATA_PATH],
+        )
+
+        assert main() == 0
+        profile = json.loads(capsys.readouterr().out)
+        assert profile["stages"]["group"]["calls"] == 2 * len(CASES)
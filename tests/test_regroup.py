@@ -0,0 +1,233 @@
+"""
+Tests for incremental regrouping of corrected cases
+"""
+
+import dataclasses
+import os
+import random
+import sys
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from thai_drg_grouper import ThaiDRGGrouper, ThaiDRGGrouperManager
+from thai_drg_grouper.regroup import STAGES, CaseDiff
+
+# Path to test data
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "versions")
+
+CASES = [
+    dict(pdx="J189", sdx=["E119"], age=65, sex="F", los=7),
+    dict(pdx="S82201D", sdx=["E119", "I10"], procedures=["7936"], age=25, sex="M", los=5),
+    dict(pdx="S82201D", sdx=["E119", "I10"], procedures=["9904"], age=25, sex="M", los=5),
+    dict(pdx="K359", sdx=[], age=30, sex="M", los=0),
+    dict(pdx="INVALID123", sdx=["E119"], age=30, sex="M", los=5),
+]
+
+DIFFS = [
+    CaseDiff(add_sdx=["J960"]),
+    CaseDiff(remove_sdx=["E119"]),
+    CaseDiff(remove_sdx=["e11.9"], add_sdx=["N179", "I10"]),
+    CaseDiff(add_procedures=["7936"]),
+    CaseDiff(remove_procedures=["7936"]),
+    CaseDiff(add_procedures=["9904"], remove_procedures=["79.36"]),
+    CaseDiff(los=40),
+    CaseDiff(los=0, sex="X"),
+    CaseDiff(age=200),
+    CaseDiff(age=70, add_sdx=["J960"], los=2),
+]
+
+
+@pytest.fixture
+def grouper():
+    path = os.path.join(DATA_PATH, "6.3", "data")
+    if not os.path.exists(path):
+        pytest.skip("Test data not available")
+    return ThaiDRGGrouper(path, "6.3")
+
+
+def _without_timestamp(result) -> dict:
+    d = result.to_dict()
+    d.pop("grouped_at")
+    return d
+
+
+def _grouped(grouper, result):
+    return grouper.group(
+        pdx=result.pdx,
+        sdx=result.sdx,
+        procedures=result.procedures,
+        age=result.age,
+        sex=result.sex,
+        los=result.los,
+    )
+
+
+class TestRegroup:
+    """Test incremental regrouping against full grouping"""
+
+    @pytest.mark.parametrize("case", CASES)
+    @pytest.mark.parametrize("diff", DIFFS)
+    def test_matches_group(self, grouper, case, diff):
+        update = grouper.regroup(grouper.group(**case), diff)
+        assert _without_timestamp(update.result) == _without_timestamp(
+            _grouped(grouper, update.result)
+        )
+
+    def test_random_edits_match_group(self, grouper):
+        rng = random.Random(3)
+        codes = ["E119", "I10", "J960", "N179", "E871", "D649", "R392", "Z951"]
+        procs = ["7936", "9904", "3893", "8154"]
+        for case in CASES[:4]:
+            previous = grouper.group(**case)
+            for _ in range(25):
+                diff = CaseDiff(
+                    add_sdx=rng.sample(codes, rng.randint(0, 2)),
+                    remove_sdx=rng.sample(previous.sdx, min(len(previous.sdx), rng.randint(0, 2))),
+                    add_procedures=rng.sample(procs, rng.randint(0, 1)),
+                    remove_procedures=previous.procedures[: rng.randint(0, 1)],
+                    los=rng.choice([None, 0, 3, 60]),
+                )
+                update = grouper.regroup(previous, diff)
+                assert _without_timestamp(update.result) == _without_timestamp(
+                    _grouped(grouper, update.result)
+                )
+                previous = update.result
+
+    def test_sdx_change_reruns_pcl_only(self, grouper):
+        previous = grouper.group(**CASES[0])
+        calls = []
+        lookup = grouper._lookup_icd10_many
+        grouper._lookup_icd10_many = lambda codes: calls.append(codes) or lookup(codes)
+
+        update = grouper.regroup(previous, add_sdx=["J960"])
+
+        assert calls == [["J960"]]  # only the added SDx is looked up
+        assert update.stages == ["pcl", "drg", "adjrw"]
+        assert update.result.mcc_list == ["E119", "J960"]
+        assert update.result.pcl == 4
+        assert update.explanation[0] == "SDx J960 added (MCC)"
+        assert "PCL 3 -> 4" in update.explanation
+        assert set(update.changes()) >= {"pcl", "drg", "rw", "adjrw", "mcc_list"}
+
+    def test_los_change_reruns_adjrw_only(self, grouper):
+        previous = grouper.group(**CASES[0])
+
+        update = grouper.regroup(previous, los=60)
+
+        assert update.stages == ["adjrw"]
+        assert update.result.drg == previous.drg
+        assert update.result.los_status == "long_stay"
+        assert update.explanation[0] == "LOS 7 -> 60"
+
+    def test_procedure_change_reruns_dc(self, grouper):
+        previous = grouper.group(**CASES[1])
+
+        update = grouper.regroup(previous, remove_procedures=["7936"])
+
+        assert update.stages == ["dc", "drg", "adjrw"]
+        assert not update.result.has_or_procedure
+        assert update.result.dc != previous.dc
+        assert "OR procedure removed" in update.explanation
+
+    def test_non_or_procedure_keeps_dc(self, grouper):
+        previous = grouper.group(**CASES[1])
+
+        update = grouper.regroup(previous, add_procedures=["9904"])
+
+        assert update.stages == []
+        assert update.result.procedures == ["7936", "9904"]
+        assert update.explanation[-1] == "DRG and AdjRW unchanged"
+
+    def test_unchanged_lists_not_shared(self, grouper):
+        previous = grouper.group(**CASES[0])
+        update = grouper.regroup(previous, los=8)
+        update.result.mcc_list.append("X")
+        assert previous.mcc_list == ["E119"]
+
+    def test_full_regroup_on_invalid_age(self, grouper):
+        update = grouper.regroup(grouper.group(**CASES[0]), age=200)
+        assert update.stages == list(STAGES)
+        assert update.explanation[0] == "Regrouped in full: invalid age 200"
+        assert not update.result.is_valid
+
+    def test_full_regroup_on_invalid_previous(self, grouper):
+        update = grouper.regroup(grouper.group(**CASES[4]), add_sdx=["I10"])
+        assert update.stages == list(STAGES)
+        assert update.result.drg == "26509"
+
+    def test_forged_previous_fields_not_echoed(self, grouper):
+        previous = grouper.group(**CASES[0])
+        forged = dataclasses.replace(previous, rw=99.0, adjrw=99.0, drg_name="Forged")
+
+        update = grouper.regroup(forged, los=8)
+
+        assert update.stages == ["adjrw"]
+        assert update.result.rw == previous.rw
+        assert update.result.drg_name == previous.drg_name
+        assert update.result.adjrw == grouper.group(**dict(CASES[0], los=8)).adjrw
+
+    @pytest.mark.parametrize(
+        "edit",
+        [
+            dict(pcl=4),
+            dict(mcc_list=["E119", "I10"], sdx=["E119", "I10"]),
+            dict(cc_list=["E119"], mcc_list=[]),
+            dict(dc="0451"),
+            dict(mdc="05"),
+            dict(has_or_procedure=True),
+        ],
+    )
+    def test_full_regroup_on_inconsistent_previous(self, grouper, edit):
+        forged = dataclasses.replace(grouper.group(**CASES[0]), **edit)
+
+        update = grouper.regroup(forged, los=8)
+
+        assert update.stages == list(STAGES)
+        assert update.explanation[0] == (
+            "Regrouped in full: previous result does not match the tables"
+        )
+        assert _without_timestamp(update.result) == _without_timestamp(
+            _grouped(grouper, update.result)
+        )
+
+    def test_verify_checks_cc_levels(self, grouper):
+        previous = grouper.group(**CASES[1])
+        forged = dataclasses.replace(previous, cc_list=[], mcc_list=["E119"], pcl=3)
+
+        assert grouper.regroup(forged, los=6).stages == ["adjrw"]
+        update = grouper.regroup(forged, CaseDiff(los=6), verify=True)
+        assert update.stages == list(STAGES)
+        assert update.result.pcl == previous.pcl
+        assert grouper.regroup(previous, CaseDiff(los=6), verify=True).stages == ["adjrw"]
+
+    def test_to_dict(self, grouper):
+        update = grouper.regroup(grouper.group(**CASES[0]), add_sdx=["J960"])
+        d = update.to_dict()
+        assert d["result"]["drg"] == update.result.drg
+        assert d["stages"] == update.stages
+        assert d["changes"]["pcl"] == {"previous": 3, "current": 4}
+        assert d["explanation"] == update.explanation
+
+
+class TestManagerRegroup:
+    """Test regrouping through the manager"""
+
+    @pytest.fixture
+    def manager(self):
+        if not os.path.exists(DATA_PATH):
+            pytest.skip("Test data not available")
+        return ThaiDRGGrouperManager(DATA_PATH)
+
+    def test_regroup(self, manager):
+        previous = manager.group("6.3", **CASES[0])
+        update = manager.regroup(previous, CaseDiff(los=60))
+        assert update.result.version == "6.3"
+        assert update.stages == ["adjrw"]
+
+    def test_unknown_version(self, manager):
+        previous = manager.group("6.3", **CASES[0])
+        with pytest.raises(ValueError):
+            manager.regroup(previous, version="0.0", los=3)
@@ -0,0 +1,147 @@
+"""
+Tests for hot reload of version tables
+"""
+
+import asyncio
+import os
+import shutil
+import sys
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from thai_drg_grouper import ThaiDRGGrouperManager
+from thai_drg_grouper import manager as manager_module
+from thai_drg_grouper.aio import AsyncGrouper
+
+# A writable copy of version 6.3 (see versions_path)
+VERSIONS = ("6.3",)
+
+CASE = dict(pdx="J189", sdx=["E119"], age=65, sex="F", los=7)
+
+
+@pytest.fixture
+def manager(versions_path):
+    return ThaiDRGGrouperManager(versions_path)
+
+
+def _touch_dbf(versions_path, version="6.3"):
+    """Change a .dbf file's mtime, as a copied-in update would"""
+    data = Path(versions_path) / version / "data"
+    dbf = sorted(p for p in data.iterdir() if p.suffix.lower() == ".dbf")[0]
+    st = dbf.stat()
+    os.utime(dbf, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+class TestReloadVersion:
+    """Test ThaiDRGGrouperManager.reload_version"""
+
+    def test_swaps_grouper(self, manager):
+        old = manager._get_grouper("6.3")
+        assert manager.reload_version("6.3") == "reloaded"
+        new = manager._get_grouper("6.3")
+        assert new is not old
+        # Holders of the old grouper keep working on the old tables
+        assert old.group(**CASE).drg == new.group(**CASE).drg
+        assert manager.residency_stats()["reloads"] == 1
+        assert manager.load_status()["6.3"]["state"] == "ready"
+
+    def test_not_loaded(self, manager):
+        assert manager.reload_version("6.3") == "not_loaded"
+        assert "6.3" not in manager._groupers
+
+    def test_unknown_version(self, manager):
+        with pytest.raises(ValueError):
+            manager.reload_version("9.9")
+
+    def test_failed_reload_keeps_old_tables(self, manager, monkeypatch):
+        old = manager._get_grouper("6.3")
+
+        def broken(*args, **kwargs):
+            raise OSError("disk on fire")
+
+        monkeypatch.setattr(manager_module, "ThaiDRGGrouper", broken)
+        with pytest.raises(OSError):
+            manager.reload_version("6.3")
+        assert manager._get_grouper("6.3") is old
+        status = manager.load_status()["6.3"]
+        assert status["state"] == "ready"
+        assert "disk on fire" in status["error"]
+
+
+class TestRefresh:
+    """Test rescanning and change detection"""
+
+    def test_unchanged(self, manager):
+        manager._get_grouper("6.3")
+        assert manager.refresh() == {"added": [], "removed": [], "reloaded": [], "failed": {}}
+
+    def test_changed_dbf(self, manager, versions_path):
+        old = manager._get_grouper("6.3")
+        _touch_dbf(versions_path)
+        assert manager.refresh()["reloaded"] == ["6.3"]
+        assert manager._get_grouper("6.3") is not old
+        assert manager.refresh()["reloaded"] == []
+
+    def test_loaded_versions_read_under_lock(self, manager):
+        manager._get_grouper("6.3")
+        held = []
+
+        class Groupers(OrderedDict):
+            def __iter__(self):
+                held.append(manager._residency_lock.locked())
+                return super().__iter__()
+
+        manager._groupers = Groupers(manager._groupers)
+        manager.refresh()
+        assert held and all(held)
+
+    def test_added_and_removed(self, manager, versions_path):
+        manager._get_grouper("6.3")
+        root = Path(versions_path)
+        shutil.copytree(root / "6.3", root / "6.4")
+        assert manager.refresh()["added"] == ["6.4"]
+        shutil.rmtree(root / "6.3")
+        result = manager.refresh()
+        assert result["removed"] == ["6.3"]
+        assert "6.3" not in manager._groupers
+
+    def test_watch(self, manager, versions_path):
+        old = manager._get_grouper("6.3")
+        manager.watch(interval=0.05)
+        try:
+            _touch_dbf(versions_path)
+            deadline = time.monotonic() + 10
+            while manager._groupers.get("6.3") is old and time.monotonic() < deadline:
+                time.sleep(0.05)
+        finally:
+            manager.stop_watching()
+        assert manager._groupers["6.3"] is not old
+
+
+class TestAsyncReload:
+    """Test that the async front-end picks up reloaded tables"""
+
+    def test_process_engine_replaced(self, manager):
+        service = AsyncGrouper(manager, executor="process", workers=1)
+
+        async def run():
+            first = await service.group("6.3", CASE)
+            engine = service._engines["6.3"]
+            manager.reload_version("6.3")
+            second = await service.group("6.3", CASE)
+            return first, second, engine
+
+        try:
+            first, second, engine = asyncio.run(run())
+        finally:
+            service.close()
+        assert first.drg == second.drg
+        assert engine._pool is None
+        assert not service._retired
+        assert service._users == {}
@@ -0,0 +1,142 @@
+"""
+Tests for bounded version residency in ThaiDRGGrouperManager
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from thai_drg_grouper import ThaiDRGGrouper, ThaiDRGGrouperManager
+
+# Path to test data
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "versions")
+
+# Installed copies of version 6.3 (see versions_path)
+VERSIONS = ("6.3", "6.3-a", "6.3-b")
+
+
+def _manager(versions_path, **kwargs):
+    manager = ThaiDRGGrouperManager(versions_path, **kwargs)
+    manager.set_default_version("6.3")
+    return manager
+
+
+def _touch(manager, version):
+    return manager.group(version, pdx="J189", age=65, sex="F", los=7)
+
+
+class TestMemoryUsage:
+    """Test ThaiDRGGrouper.memory_usage"""
+
+    def test_memory_backend(self):
+        path = os.path.join(DATA_PATH, "6.3", "data")
+        if not os.path.exists(path):
+            pytest.skip("Test data not available")
+        usage = ThaiDRGGrouper(path, "6.3").memory_usage()
+        assert usage["mapped"] == 0
+        assert usage["heap"] > 1_000_000
+
+    def test_mmap_backend(self):
+        path = os.path.join(DATA_PATH, "6.3", "data")
+        if not os.path.exists(path):
+            pytest.skip("Test data not available")
+        memory = ThaiDRGGrouper(path, "6.3").memory_usage()
+        mapped = ThaiDRGGrouper(path, "6.3", backend="mmap").memory_usage()
+        assert mapped["mapped"] > 0
+        assert mapped["heap"] < memory["heap"]
+
+
+class TestResidency:
+    """Test LRU eviction, pinning and residency stats"""
+
+    def test_unlimited_by_default(self, versions_path):
+        manager = _manager(versions_path)
+        for version in VERSIONS:
+            _touch(manager, version)
+        stats = manager.residency_stats()
+        assert set(stats["resident"]) == set(VERSIONS)
+        assert stats["evictions"] == 0
+        assert stats["loads"] == 3
+
+    def test_lru_eviction(self, versions_path):
+        manager = _manager(versions_path, max_versions=2)
+        _touch(manager, "6.3-a")
+        _touch(manager, "6.3-b")
+        _touch(manager, "6.3-a")  # 6.3-b is now least recently used
+        _touch(manager, "6.3")
+        assert list(manager._groupers) == ["6.3-a", "6.3"]
+        assert manager.load_status()["6.3-b"]["state"] == "evicted"
+
+        # An evicted version reloads on next use
+        assert _touch(manager, "6.3-b").drg == _touch(manager, "6.3").drg
+        stats = manager.residency_stats()
+        assert stats["loads"] == 4
+        assert stats["evictions"] == 2
+        assert "6.3-b" in stats["resident"]
+
+    def test_default_version_pinned(self, versions_path):
+        manager = _manager(versions_path, max_versions=1)
+        _touch(manager, "6.3")
+        _touch(manager, "6.3-a")
+        _touch(manager, "6.3-b")
+        # The default stays; unpinned versions replace each other
+        assert list(manager._groupers) == ["6.3", "6.3-b"]
+        assert manager.residency_stats()["pinned"] == ["6.3"]
+
+    def test_explicit_pin(self, versions_path):
+        manager = _manager(versions_path, max_versions=1, pinned=["6.3-a"])
+        _touch(manager, "6.3-a")
+        _touch(manager, "6.3-b")
+        _touch(manager, "6.3")
+        assert "6.3-a" in manager._groupers
+        manager.unpin_version("6.3-a")
+        _touch(manager, "6.3-b")
+        assert "6.3-a" not in manager._groupers
+
+    def test_max_bytes(self, versions_path):
+        manager = _manager(versions_path, max_bytes=1)
+        _touch(manager, "6.3-a")
+        _touch(manager, "6.3-b")
+        stats = manager.residency_stats()
+        assert stats["resident"] == ["6.3-b"]
+        assert stats["total_bytes"] == stats["bytes"]["6.3-b"] > 0
+
+    def test_size_measured_outside_lock(self, versions_path, monkeypatch):
+        manager = _manager(versions_path, max_bytes=10**12)
+        held = []
+        measure = ThaiDRGGrouper.memory_usage
+
+        def memory_usage(grouper):
+            held.append(manager._residency_lock.locked())
+            return measure(grouper)
+
+        monkeypatch.setattr(ThaiDRGGrouper, "memory_usage", memory_usage)
+        _touch(manager, "6.3-a")
+        assert held == [False]
+        assert manager._bytes["6.3-a"] > 0
+
+    def test_stats_of_resident_versions_only(self, versions_path):
+        manager = _manager(versions_path, max_versions=2)
+        _touch(manager, "6.3-a")
+
+        stats = manager.get_stats()
+
+        assert list(stats) == ["6.3-a"]
+        assert manager.residency_stats()["loads"] == 1
+        assert manager.residency_stats()["evictions"] == 0
+
+    def test_evicted_versions_stay_ready(self, versions_path):
+        manager = _manager(versions_path, max_versions=1)
+        manager.preload(["6.3-a"], wait=True, warmup=False)
+        assert manager.is_ready()
+        _touch(manager, "6.3-b")
+        assert "6.3-a" not in manager._groupers
+        assert manager.is_ready()
+
+    def test_invalid_limits(self, versions_path):
+        with pytest.raises(ValueError):
+            ThaiDRGGrouperManager(versions_path, max_versions=0)
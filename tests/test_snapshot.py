@@ -0,0 +1,135 @@
+"""
+Tests for compiled table snapshots
+"""
+
+import os
+import shutil
+import sys
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from thai_drg_grouper import ThaiDRGGrouper, ThaiDRGGrouperManager, snapshot
+from thai_drg_grouper.snapshot import (
+    SNAPSHOT_NAME,
+    compile_snapshot,
+    is_snapshot_fresh,
+    load_snapshot,
+    read_dbf_tables,
+)
+
+# Path to test data
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "versions")
+
+
+@pytest.fixture
+def dbf_path(tmp_path):
+    """Private copy of the 6.3 .dbf files so snapshots can be written freely"""
+    source = os.path.join(DATA_PATH, "6.3", "data")
+    if not os.path.exists(source):
+        pytest.skip("Test data not available")
+    target = tmp_path / "6.3" / "data"
+    target.mkdir(parents=True)
+    for name in os.listdir(source):
+        if name.lower().endswith(".dbf"):
+            shutil.copy2(os.path.join(source, name), target / name)
+    return str(target)
+
+
+class TestSnapshot:
+    """Test snapshot compile/load round trip and freshness"""
+
+    def test_round_trip(self, dbf_path):
+        """Snapshot tables decode to exactly what the .dbf parser produced"""
+        tables = read_dbf_tables(dbf_path)
+        compile_snapshot(dbf_path)
+
+        assert load_snapshot(dbf_path) == tables
+
+    def test_missing_snapshot(self, dbf_path):
+        assert load_snapshot(dbf_path) is None
+        assert not is_snapshot_fresh(dbf_path)
+
+    def test_grouper_writes_snapshot(self, dbf_path):
+        """First construction compiles the snapshot; the next one loads it"""
+        from_dbf = ThaiDRGGrouper(dbf_path, "6.3")
+        assert os.path.exists(os.path.join(dbf_path, SNAPSHOT_NAME))
+        assert is_snapshot_fresh(dbf_path)
+
+        from_snapshot = ThaiDRGGrouper(dbf_path, "6.3")
+        assert from_snapshot.get_stats() == from_dbf.get_stats()
+
+        case = dict(pdx="S82201D", sdx=["E119", "I10"], procedures=["7936"], age=25, sex="M", los=5)
+        a, b = from_dbf.group(**case), from_snapshot.group(**case)
+        assert (a.drg, a.rw, a.adjrw, a.pcl) == (b.drg, b.rw, b.adjrw, b.pcl)
+
+    def test_use_snapshot_disabled(self, dbf_path):
+        ThaiDRGGrouper(dbf_path, "6.3", use_snapshot=False)
+        assert not os.path.exists(os.path.join(dbf_path, SNAPSHOT_NAME))
+
+    def test_stale_after_dbf_change(self, dbf_path):
+        """A changed .dbf invalidates the snapshot; a touch alone does not"""
+        compile_snapshot(dbf_path)
+        drg_file = next(f for f in os.listdir(dbf_path) if "drg" in f.lower())
+        full = os.path.join(dbf_path, drg_file)
+
+        st = os.stat(full)
+        os.utime(full, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        assert is_snapshot_fresh(dbf_path)
+
+        with open(full, "r+b") as f:
+            f.seek(-2, os.SEEK_END)
+            f.write(b"  ")
+        assert not is_snapshot_fresh(dbf_path)
+        assert load_snapshot(dbf_path) is None
+
+    @pytest.mark.parametrize("check", [is_snapshot_fresh, load_snapshot])
+    def test_touched_dbf_hashed_once(self, dbf_path, monkeypatch, check):
+        """After a hash match the new mtime is recorded, so the fast path returns"""
+        compile_snapshot(dbf_path)
+        expected = load_snapshot(dbf_path)
+        for name in os.listdir(dbf_path):
+            if name.lower().endswith(".dbf"):
+                full = os.path.join(dbf_path, name)
+                st = os.stat(full)
+                os.utime(full, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        hashed = []
+        sha256 = snapshot._sha256
+        monkeypatch.setattr(snapshot, "_sha256", lambda path: hashed.append(path) or sha256(path))
+
+        assert check(dbf_path)
+        assert hashed
+        hashed.clear()
+        assert check(dbf_path)
+        assert hashed == []
+        assert load_snapshot(dbf_path) == expected
+
+    def test_corrupt_snapshot_ignored(self, dbf_path):
+        with open(os.path.join(dbf_path, SNAPSHOT_NAME), "wb") as f:
+            f.write(b"not a snapshot")
+        assert load_snapshot(dbf_path) is None
+
+        grouper = ThaiDRGGrouper(dbf_path, "6.3")
+        assert grouper.get_stats()["icd10_count"] > 0
+        assert is_snapshot_fresh(dbf_path)
+
+    def test_mmap_read_only_folder(self, dbf_path, monkeypatch):
+        """The mmap backend names the missing snapshot instead of a bare OSError"""
+
+        def read_only(path):
+            raise PermissionError(13, "Read-only file system")
+
+        monkeypatch.setattr("thai_drg_grouper.grouper.compile_snapshot", read_only)
+        with pytest.raises(OSError, match="thai-drg-grouper compile"):
+            ThaiDRGGrouper(dbf_path, "6.3", backend="mmap")
+
+    def test_manager_compile(self, dbf_path):
+        manager = ThaiDRGGrouperManager(os.path.dirname(os.path.dirname(dbf_path)))
+
+        assert manager.compile_snapshots() == {"6.3": "compiled"}
+        assert manager.compile_snapshots("6.3") == {"6.3": "fresh"}
+        assert manager.compile_snapshots("6.3", force=True) == {"6.3": "compiled"}
+        with pytest.raises(ValueError):
+            manager.compile_snapshots("9.9")
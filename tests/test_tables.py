@@ -0,0 +1,217 @@
+"""
+Tests for the compact in-memory and memory-mapped table backends
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from thai_drg_grouper import ThaiDRGGrouper, ThaiDRGGrouperManager
+from thai_drg_grouper.tables import (
+    CCExclusionIndex,
+    CompactICD10Table,
+    CompactProcTable,
+    MappedTables,
+)
+
+# Path to test data
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "versions")
+VERSION_PATH = os.path.join(DATA_PATH, "6.3", "data")
+
+
+@pytest.fixture(scope="module")
+def groupers():
+    """Memory and mmap groupers over the same 6.3 data"""
+    if not os.path.exists(VERSION_PATH):
+        pytest.skip("Test data not available")
+    return (
+        ThaiDRGGrouper(VERSION_PATH, "6.3"),
+        ThaiDRGGrouper(VERSION_PATH, "6.3", backend="mmap"),
+    )
+
+
+class TestCompactTables:
+    """Compact in-memory tables behave like dicts of info dicts"""
+
+    def test_icd10_rows(self):
+        table = CompactICD10Table(
+            [
+                ("E119", "10", "10", True, "E119", "1001", False, 2),
+                ("J189", "04", "04", False, "J189", "0401", False, 0),
+            ],
+            aliases=[("E11", 0)],
+        )
+        info = table["E119"]
+        assert info == {
+            "mdc": "10",
+            "pdc": "10",
+            "cc": True,
+            "maincc": "E119",
+            "dclmain": "1001",
+            "trauma": False,
+            "ccrow": 2,
+        }
+        assert info["cc"] is True and table["J189"]["cc"] is False
+        assert table["E11"] == info
+        assert table.get("Z999") is None
+        assert info.get("missing", "default") == "default"
+        assert len(table) == 3 and set(table) == {"E119", "J189", "E11"}
+
+    def test_prefix_trie(self):
+        row = ("E1190", "10", "10", True, "E1190", "1001", False, 2)
+        table = CompactICD10Table([row], aliases=[("E119", 0)])
+        # "E11" is only an index node: not a key, and not a truncation target
+        assert "E11" not in table and table.get("E11") is None
+        assert len(table) == 2 and list(table) == ["E1190", "E119"]
+        assert table.lookup("E11") is None
+        assert table.lookup("E1190XY") == table["E1190"]
+        assert table.lookup("E119Z") == table["E119"]
+        assert table.lookup("K359") is None
+        assert table.lookup_many(["E1190", "E11", "E119Z"]) == [table["E1190"], None, table["E119"]]
+
+    def test_lookup_matches_prefix_probes(self, groupers):
+        """Trie walk agrees with probing the 6/5/4/3-character truncations"""
+        memory, mapped = groupers
+
+        def probe(code):
+            info = memory._icd10_data.get(code)
+            for length in (6, 5, 4, 3):
+                if info is None and len(code) >= length:
+                    info = memory._icd10_data.get(code[:length])
+            return info
+
+        codes = sorted(memory._icd10_data)[::7]
+        inputs = codes + [c + "X" for c in codes] + [c + "9ZZ" for c in codes[::5]]
+        inputs += [c[:-1] for c in codes] + ["", "A", "Z99999X", "S82201D"]
+        for code in inputs:
+            expected = probe(code)
+            assert memory._icd10_data.lookup(code) == expected, code
+            assert mapped._icd10_data.lookup(code) == expected, code
+        assert memory._icd10_data.lookup_many(inputs) == [probe(c) for c in inputs]
+
+    def test_proc_rows(self):
+        table = CompactProcTable([("7936", True, "Open reduction"), ("9904", False, "")])
+        assert dict(table["7936"]) == {"orp": True, "desc": "Open reduction"}
+        assert table["79.36"] == table["7936"]
+        assert table["9904"]["desc"] == ""
+        assert "99.04" in table and "7.936" not in table
+
+    def test_exclusion_index_mapping(self):
+        index = CCExclusionIndex({"E119": ["E11", "K", "E11"], "I10": ["I1"]})
+        assert sorted(index) == ["E119", "I10"]
+        assert sorted(index["E119"]) == ["E11", "K"]
+        assert index.get("ZZZ") is None
+        assert CCExclusionIndex({}).excludes("E119", "E119") is False
+
+    def test_compact_memory(self, groupers):
+        memory, _ = groupers
+        assert isinstance(memory._icd10_data, CompactICD10Table)
+        assert memory.memory_usage()["heap"] < 16 * 2**20
+
+
+class TestMappedTables:
+    """Mapped lookups must match the in-memory dicts exactly"""
+
+    def test_icd10_lookups(self, groupers):
+        memory, mapped = groupers
+        assert len(mapped._icd10_data) == len(memory._icd10_data)
+        for code, info in memory._icd10_data.items():
+            assert mapped._icd10_data[code] == info
+
+    def test_procedure_lookups(self, groupers):
+        memory, mapped = groupers
+        assert len(mapped._proc_data) == len(memory._proc_data)
+        for code, info in memory._proc_data.items():
+            assert mapped._proc_data[code] == info
+
+    def test_cc_exclusions(self, groupers):
+        memory, mapped = groupers
+        assert len(mapped._cc_exclusions) == len(memory._cc_exclusions)
+        for cc, excl in memory._cc_exclusions.items():
+            assert set(mapped._cc_exclusions[cc]) == set(excl)
+
+    def test_cc_exclusion_index(self, groupers):
+        """Indexed exclusion checks agree with a scan over every exclusion code"""
+        memory, mapped = groupers
+
+        def scan(cc, pdx):
+            excl = memory._cc_exclusions.get(cc, ())
+            return any(pdx.startswith(e) or e.startswith(pdx[:3]) for e in excl)
+
+        pdx_codes = sorted(memory._icd10_data)[::50] + ["", "A", "S82", "Z99999X"]
+        for cc in sorted(memory._cc_exclusions)[::20] + ["ZZZ"]:
+            candidates = pdx_codes + sorted(memory._cc_exclusions.get(cc, ()))[:20]
+            for pdx in candidates:
+                expected = scan(cc, pdx)
+                assert memory._cc_index.excludes(cc, pdx) == expected, (cc, pdx)
+                assert mapped._cc_index.excludes(cc, pdx) == expected, (cc, pdx)
+
+    def test_cc_exclusion_index_rules(self):
+        index = CCExclusionIndex({"E119": {"E11", "E1190", "K"}})
+        assert index.excludes("E119", "E119")  # "E11" is a prefix of the PDx
+        assert index.excludes("E119", "K359")  # "K" is a prefix of the PDx
+        assert index.excludes("E119", "E11")  # "E1190" starts with the PDx head
+        assert not index.excludes("E119", "E10")
+        assert not index.excludes("I10", "E119")
+
+    def test_dc_table(self, groupers):
+        """Precomputed DC resolution and sorted DRG lists agree for both backends"""
+        memory, mapped = groupers
+        assert memory._dc_table
+        for (mdc, pdc, has_or), dc in memory._dc_table.items():
+            info = {"mdc": mdc, "pdc": pdc}
+            assert memory._search_dc(mdc, pdc, has_or) == dc
+            assert mapped._resolve_dc(info, has_or) == dc
+        for dc, drgs in memory._drg_data.items():
+            assert [d["drg"] for d in drgs] == sorted(d["drg"] for d in drgs)
+            assert mapped._drg_data[dc] == drgs
+            assert memory._find_drg(dc, 99) is drgs[-1]
+
+    def test_missing_codes(self, groupers):
+        _, mapped = groupers
+        assert mapped._icd10_data.get("ZZZZ99") is None
+        assert "TOOLONGCODE" not in mapped._icd10_data
+        assert mapped._proc_data.get("ก") is None
+        assert mapped._cc_exclusions.get("ZZZ") is None
+
+    def test_stats_match(self, groupers):
+        memory, mapped = groupers
+        expected = dict(memory.get_stats(), backend="mmap")
+        assert mapped.get_stats() == expected
+
+    @pytest.mark.parametrize(
+        "case",
+        [
+            dict(pdx="S82201D", sdx=["E119", "I10"], procedures=["7936"], age=25, sex="M", los=5),
+            dict(pdx="J189", sdx=["E119", "N179", "J960"], age=65, sex="F", los=30),
+            dict(pdx="O800", procedures=["73.59"], age=28, sex="F", los=0),
+            dict(pdx="INVALID", age=30, sex="M", los=1),
+        ],
+    )
+    def test_grouping_matches(self, groupers, case):
+        memory, mapped = groupers
+        a, b = memory.group(**case).to_dict(), mapped.group(**case).to_dict()
+        a.pop("grouped_at")
+        b.pop("grouped_at")
+        assert a == b
+
+    def test_invalid_snapshot_rejected(self, tmp_path):
+        with pytest.raises(OSError):
+            MappedTables(str(tmp_path))
+        (tmp_path / "tables.snap").write_bytes(b"not a snapshot")
+        with pytest.raises(ValueError):
+            MappedTables(str(tmp_path))
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            ThaiDRGGrouper(VERSION_PATH, "6.3", backend="redis")
+
+    def test_manager_backend(self):
+        if not os.path.exists(DATA_PATH):
+            pytest.skip("Test data not available")
+        manager = ThaiDRGGrouperManager(DATA_PATH, backend="mmap")
+        assert manager.get_stats("6.3")["backend"] == "mmap"